@@ -0,0 +1,388 @@
+# analytics.py
+"""Колонкова аналітика замовлень на NumPy.
+
+Замовлення потоково читаються з OrderStore (або ShardedOrderStore) у
+колонки — по рядку на позицію замовлення: id замовлення, код клієнта, код
+страви, ціна в копійках, час створення та прапорець special. Групування,
+перцентилі та гістограми за часом рахуються векторно над цими масивами.
+
+Колонки можна зберегти в каталог як .npy і відкривати через memmap; тоді
+refresh дочитує з бази лише замовлення, яких ще немає в колонках, а save
+дописує нові рядки в кінець файлів колонок, не перезаписуючи наявних.
+
+Запуск:
+    python manage.py analytics --cache analytics_cache
+"""
+
+import json
+import os
+import struct
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from refactored_code import AGGREGATE_BUCKET_SECONDS, KOPECKS_PER_UAH
+
+EXPORT_CHUNK_SIZE = 65536
+META_FILE = "meta.json"
+NO_DISH = -1
+# ShardedOrderStore видає id до того, як шарди паралельно закомітять пачки, тож у колонках
+# бувають пропуски id. Пропуск, старший за останній експортований id більш ніж на стільки
+# замовлень, вважається остаточним (id видано, але замовлення так і не збережено).
+REFRESH_WINDOW = 10000
+# Розмір заголовка .npy у файлах колонок: із запасом, щоб кількість рядків оновлювалася на місці.
+NPY_HEADER_SIZE = 128
+# Колонки та їх типи; порядок збігається з порядком файлів у кеші.
+COLUMNS = (
+    ("order_id", np.int64),
+    ("client", np.int32),
+    ("dish", np.int32),
+    ("price", np.int64),
+    ("created_at", np.float64),
+    ("special", np.bool_),
+)
+
+
+def _npy_header(dtype, rows: int, size: int = NPY_HEADER_SIZE) -> Optional[bytes]:
+    """Повертає заголовок .npy версії 1.0 рівно на ``size`` байтів або None, якщо він не вміщується."""
+    header = repr({"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False,
+                   "shape": (rows,)})
+    prefix = np.lib.format.magic(1, 0)
+    padding = size - len(prefix) - 2 - len(header) - 1
+    if padding < 0:
+        return None
+    body = (header + " " * padding + "\n").encode("latin1")
+    return prefix + struct.pack("<H", len(body)) + body
+
+
+def _write_column(path: str, dtype, parts: Iterable[np.ndarray], rows: int) -> None:
+    """Записує колонку з частин у новий файл і атомарно підміняє ним старий."""
+    with open(path + ".tmp", "wb") as file:
+        file.write(_npy_header(dtype, rows))
+        for part in parts:
+            file.write(np.ascontiguousarray(part, dtype=dtype).tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def _append_column(path: str, dtype, committed: int, parts: Iterable[np.ndarray], rows: int) -> bool:
+    """Дописує частини в кінець файлу колонки й оновлює кількість рядків у заголовку.
+
+    Рядки після ``committed`` (залишок перерваного дописування) спершу відрізаються.
+    Повертає False, якщо файл не має заголовка 1.0, куди вміщується нова кількість рядків.
+    """
+    with open(path, "r+b") as file:
+        if np.lib.format.read_magic(file) != (1, 0):
+            return False
+        np.lib.format.read_array_header_1_0(file)
+        end = file.tell() + committed * np.dtype(dtype).itemsize
+        header = _npy_header(dtype, rows, file.tell())
+        if header is None:
+            return False
+        if os.fstat(file.fileno()).st_size > end:
+            file.truncate(end)
+        file.seek(end)
+        for part in parts:
+            file.write(np.ascontiguousarray(part, dtype=dtype).tobytes())
+        file.seek(0)
+        file.write(header)
+    return True
+
+
+class _Dictionary:
+    """Словникове кодування рядків: значення -> послідовний код."""
+    def __init__(self, values: Iterable[str] = ()):
+        self._codes: Dict[str, int] = {}
+        for value in values:
+            self._codes.setdefault(value, len(self._codes))
+
+    def encode(self, values: Iterable[Optional[str]], missing: int = NO_DISH) -> List[int]:
+        """Кодує значення, додаючи нові до словника; None отримує код ``missing``."""
+        codes = self._codes
+        return [missing if value is None else codes.setdefault(value, len(codes)) for value in values]
+
+    def values(self) -> List[str]:
+        return list(self._codes)
+
+
+class OrderColumns:
+    """Замовлення у вигляді колонок NumPy з довідниками клієнтів і страв."""
+
+    def __init__(self, arrays: Optional[Dict[str, np.ndarray]] = None, clients: Iterable[str] = (),
+                 dishes: Iterable[str] = (), categories: Iterable[str] = (), watermark: int = 0,
+                 exported: Iterable[Tuple[int, int]] = ()):
+        self._arrays = arrays or {name: np.empty(0, dtype) for name, dtype in COLUMNS}
+        # Порції, дочитані refresh: доклеюються до колонок лише під час першого запиту до них.
+        self._pending: Dict[str, List[np.ndarray]] = {name: [] for name, _ in COLUMNS}
+        self._clients = _Dictionary(clients)
+        self._dishes = _Dictionary(dishes)
+        self._categories = list(categories)
+        # Усі замовлення з id <= _watermark уже в колонках; вище — експортовані проміжки id [start, end].
+        self._watermark = watermark
+        self._exported = [(start, end) for start, end in exported]
+        # Каталог кешу, з яким збігаються перші rows рядків колонок: (каталог, rows).
+        self._cache: Optional[Tuple[str, int]] = None
+
+    @classmethod
+    def from_store(cls, store, chunk_size: int = EXPORT_CHUNK_SIZE) -> "OrderColumns":
+        """Будує колонки з усіх замовлень сховища."""
+        columns = cls()
+        columns.refresh(store, chunk_size)
+        return columns
+
+    @property
+    def last_order_id(self) -> int:
+        """Повертає найбільший id експортованого замовлення."""
+        return self._exported[-1][1] if self._exported else self._watermark
+
+    @property
+    def clients(self) -> List[str]:
+        return self._clients.values()
+
+    @property
+    def dishes(self) -> List[str]:
+        return self._dishes.values()
+
+    def column(self, name: str) -> np.ndarray:
+        """Повертає колонку за назвою (тільки для читання)."""
+        return self._column(name)
+
+    def _column(self, name: str) -> np.ndarray:
+        """Повертає колонку, спершу доклеївши до колонок порції, дочитані refresh."""
+        if self._pending["order_id"]:
+            self._arrays = {column: np.concatenate([self._arrays[column], *self._pending[column]])
+                            for column, _ in COLUMNS}
+            self._pending = {column: [] for column, _ in COLUMNS}
+        return self._arrays[name]
+
+    def __len__(self):
+        return len(self._arrays["order_id"]) + sum(len(part) for part in self._pending["order_id"])
+
+    def refresh(self, store, chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+        """Дочитує замовлення, яких ще немає в колонках, і повертає кількість нових рядків.
+
+        Читання починається від водяного знака — id, до якого всі замовлення вже
+        експортовані, а вже експортовані замовлення вище за нього пропускаються.
+        Так замовлення шарду, закомічене пізніше за замовлення з більшими id,
+        теж потрапить у колонки (у межах REFRESH_WINDOW).
+        """
+        if chunk_size <= 0:
+            raise ValueError("Розмір порції повинен бути більше 0.")
+        starts = np.array([start for start, _ in self._exported], dtype=np.int64)
+        ends = np.array([end for _, end in self._exported], dtype=np.int64)
+        rows = store.iter_order_items(after_id=self._watermark or None)
+        new_ids = []
+        added = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if len(starts):
+                ids = np.array([row[0] for row in chunk], dtype=np.int64)
+                slot = np.searchsorted(starts, ids, side="right") - 1
+                seen = (slot >= 0) & (ids <= ends[np.maximum(slot, 0)])
+                chunk = [row for row, old in zip(chunk, seen) if not old]
+                if not chunk:
+                    continue
+            for name, values in self._encode(chunk).items():
+                self._pending[name].append(values)
+            new_ids.append(self._pending["order_id"][-1])
+            added += len(chunk)
+        if added:
+            self._mark_exported(np.unique(np.concatenate(new_ids)))
+        return added
+
+    def _mark_exported(self, ids: np.ndarray) -> None:
+        """Додає відсортовані id до експортованих проміжків і просуває водяний знак."""
+        runs = np.split(ids, np.flatnonzero(np.diff(ids) != 1) + 1)
+        merged: List[Tuple[int, int]] = []
+        for start, end in sorted(self._exported + [(int(run[0]), int(run[-1])) for run in runs]):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        watermark = max(self._watermark, merged[-1][1] - REFRESH_WINDOW)
+        exported = []
+        for start, end in merged:
+            if end <= watermark:
+                continue
+            if start <= watermark + 1:
+                watermark = end
+            else:
+                exported.append((start, end))
+        self._watermark, self._exported = watermark, exported
+
+    def _encode(self, chunk: List[tuple]) -> Dict[str, np.ndarray]:
+        """Перетворює порцію рядків iter_order_items на масиви колонок."""
+        order_ids, clients, created_at, special, names, categories, prices = zip(*chunk)
+        dishes = self._dishes.encode(names)
+        for code, category in zip(dishes, categories):
+            if code == NO_DISH:
+                continue
+            # Нові коди з'являються по порядку, тож їх категорія дописується в кінець.
+            if code == len(self._categories):
+                self._categories.append(category)
+            else:
+                self._categories[code] = category
+        return {
+            "order_id": np.array(order_ids, dtype=np.int64),
+            "client": np.array(self._clients.encode(clients), dtype=np.int32),
+            "dish": np.array(dishes, dtype=np.int32),
+            "price": np.array([price or 0 for price in prices], dtype=np.int64),
+            "created_at": np.array(created_at, dtype=np.float64),
+            "special": np.array(special, dtype=np.bool_),
+        }
+
+    def save(self, directory: str) -> None:
+        """Зберігає колонки в каталог як .npy; meta.json записується останнім і фіксує експорт.
+
+        Якщо колонки відкрито з цього самого каталогу, нові рядки дописуються в
+        кінець файлів колонок; рядки, яких meta.json ще не зафіксував, не читаються.
+        """
+        os.makedirs(directory, exist_ok=True)
+        rows = len(self)
+        committed = self._committed_rows(directory)
+        for name, dtype in COLUMNS:
+            path = os.path.join(directory, f"{name}.npy")
+            if committed is None or not _append_column(path, dtype, committed, self._parts(name, committed), rows):
+                _write_column(path, dtype, self._parts(name, 0), rows)
+        meta = {"rows": rows, "last_order_id": self.last_order_id, "watermark": self._watermark,
+                "exported": self._exported, "clients": self.clients, "dishes": self.dishes,
+                "categories": self._categories}
+        with open(os.path.join(directory, META_FILE + ".tmp"), "w", encoding="utf-8") as file:
+            json.dump(meta, file, ensure_ascii=False)
+        os.replace(os.path.join(directory, META_FILE + ".tmp"), os.path.join(directory, META_FILE))
+        self._cache = (os.path.abspath(directory), rows)
+
+    def _parts(self, name: str, start: int) -> List[np.ndarray]:
+        """Повертає рядки колонки, починаючи з ``start``, частинами без склеювання."""
+        parts = []
+        for part in [self._arrays[name], *self._pending[name]]:
+            if start < len(part):
+                parts.append(part[start:])
+            start = max(0, start - len(part))
+        return parts
+
+    def _committed_rows(self, directory: str) -> Optional[int]:
+        """Повертає кількість рядків кешу в каталозі, з якими збігаються колонки, або None."""
+        if self._cache is None or self._cache[0] != os.path.abspath(directory):
+            return None
+        try:
+            with open(os.path.join(directory, META_FILE), encoding="utf-8") as file:
+                rows = json.load(file)["rows"]
+        except (OSError, ValueError, KeyError):
+            return None
+        return rows if rows == self._cache[1] else None
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "OrderColumns":
+        """Відкриває збережені колонки; за замовчуванням через memmap, без читання в пам'ять."""
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as file:
+            meta = json.load(file)
+        rows = meta["rows"]
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name, _ in COLUMNS}
+        # Рядки після rows лишаються від перерваного дописування; наступний save їх відріже.
+        if any(len(array) < rows for array in arrays.values()):
+            raise ValueError(f"Кеш аналітики в {directory} пошкоджено: колонки коротші, ніж у {META_FILE}.")
+        columns = cls({name: array[:rows] for name, array in arrays.items()}, meta["clients"], meta["dishes"],
+                      meta["categories"], meta.get("watermark", meta["last_order_id"]), meta.get("exported", ()))
+        columns._cache = (os.path.abspath(directory), rows)
+        return columns
+
+    def _mask(self, since: Optional[float], until: Optional[float]) -> np.ndarray:
+        """Повертає маску рядків за проміжок часу [since, until)."""
+        created_at = self._column("created_at")
+        mask = np.ones(len(created_at), dtype=np.bool_)
+        if since is not None:
+            mask &= created_at >= since
+        if until is not None:
+            mask &= created_at < until
+        return mask
+
+    def _order_starts(self, mask: np.ndarray) -> np.ndarray:
+        """Повертає маску перших рядків кожного замовлення серед відібраних рядків."""
+        order_ids = self._column("order_id")[mask]
+        return np.concatenate(([True], order_ids[1:] != order_ids[:-1])) if len(order_ids) else \
+            np.zeros(0, dtype=np.bool_)
+
+    @staticmethod
+    def _ranked(names: List[str], quantities: np.ndarray, revenues: np.ndarray,
+                limit: Optional[int] = None) -> List[Tuple[str, int, float]]:
+        """Сортує групи як OrderStore: за виручкою спадно, далі за назвою."""
+        present = np.flatnonzero(quantities)
+        order = sorted(present, key=lambda code: (-revenues[code], names[code]))[:limit]
+        return [(names[code], int(quantities[code]), int(revenues[code]) / KOPECKS_PER_UAH) for code in order]
+
+    def revenue_by_dish(self, since: Optional[float] = None, until: Optional[float] = None):
+        """Повертає (назва, кількість, виручка в грн) по стравах."""
+        mask = self._mask(since, until) & (self._column("dish") != NO_DISH)
+        dishes = self._column("dish")[mask]
+        size = len(self.dishes)
+        quantities = np.bincount(dishes, minlength=size)
+        revenues = np.bincount(dishes, weights=self._column("price")[mask], minlength=size).round().astype(np.int64)
+        return self._ranked(self.dishes, quantities, revenues)
+
+    def revenue_by_category(self, since: Optional[float] = None, until: Optional[float] = None):
+        """Повертає (категорія, кількість, виручка в грн) за поточними категоріями страв."""
+        mask = self._mask(since, until) & (self._column("dish") != NO_DISH)
+        names = sorted(set(self._categories))
+        positions = {category: code for code, category in enumerate(names)}
+        category_of_dish = np.array([positions[category] for category in self._categories], dtype=np.int32)
+        codes = category_of_dish[self._column("dish")[mask]]
+        quantities = np.bincount(codes, minlength=len(names))
+        revenues = np.bincount(codes, weights=self._column("price")[mask], minlength=len(names))
+        return self._ranked(names, quantities, revenues.round().astype(np.int64))
+
+    def top_clients(self, since: Optional[float] = None, until: Optional[float] = None, limit: int = 10):
+        """Повертає (клієнт, кількість замовлень, виручка в грн) для найкращих клієнтів."""
+        mask = self._mask(since, until)
+        clients = self._column("client")[mask]
+        size = len(self.clients)
+        orders = np.bincount(clients[self._order_starts(mask)], minlength=size)
+        revenues = np.bincount(clients, weights=self._column("price")[mask], minlength=size)
+        return self._ranked(self.clients, orders, revenues.round().astype(np.int64), limit)
+
+    def order_totals(self, since: Optional[float] = None, until: Optional[float] = None) -> np.ndarray:
+        """Повертає суми замовлень у копійках."""
+        mask = self._mask(since, until)
+        prices = self._column("price")[mask]
+        if not len(prices):
+            return np.zeros(0, dtype=np.int64)
+        return np.add.reduceat(prices, np.flatnonzero(self._order_starts(mask)))
+
+    def order_total_percentiles(self, percentiles: Iterable[float] = (50, 90, 95, 99),
+                                since: Optional[float] = None, until: Optional[float] = None) -> Dict[float, float]:
+        """Повертає перцентилі суми замовлення в гривнях."""
+        percentiles = list(percentiles)
+        totals = self.order_totals(since, until)
+        if not len(totals):
+            return {percentile: 0.0 for percentile in percentiles}
+        values = np.percentile(totals, percentiles, method="nearest")
+        return {percentile: float(value) / KOPECKS_PER_UAH for percentile, value in zip(percentiles, values)}
+
+    def histogram(self, bucket_seconds: int = AGGREGATE_BUCKET_SECONDS, since: Optional[float] = None,
+                  until: Optional[float] = None) -> List[Tuple[int, int, float]]:
+        """Повертає (початок кошика, кількість замовлень, виручка в грн) по часових кошиках.
+
+        Замовлення без часу створення (перенесені зі старої схеми) не враховуються.
+        """
+        if bucket_seconds <= 0:
+            raise ValueError("Розмір кошика повинен бути більше 0.")
+        mask = self._mask(since, until) & ~np.isnan(self._column("created_at"))
+        buckets = (self._column("created_at")[mask] // bucket_seconds).astype(np.int64) * bucket_seconds
+        starts, codes = np.unique(buckets, return_inverse=True)
+        orders = np.bincount(codes[self._order_starts(mask)], minlength=len(starts))
+        revenues = np.bincount(codes, weights=self._column("price")[mask], minlength=len(starts))
+        return [(int(start), int(count), int(round(revenue)) / KOPECKS_PER_UAH)
+                for start, count, revenue in zip(starts, orders, revenues)]
+
+
+def load_or_refresh(store, directory: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> OrderColumns:
+    """Відкриває кеш колонок у каталозі, дочитує нові замовлення та зберігає кеш, якщо вони були."""
+    exists = os.path.exists(os.path.join(directory, META_FILE))
+    columns = OrderColumns.load(directory) if exists else OrderColumns()
+    if columns.refresh(store, chunk_size) or not exists:
+        columns.save(directory)
+        columns = OrderColumns.load(directory)
+    return columns
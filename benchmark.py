@@ -0,0 +1,397 @@
+# benchmark.py
+"""Бенчмарки для порівняння main.py та refactored_code.py.
+
+Запуск:
+    python benchmark.py run --sizes 100 1000 10000 --save baseline.json
+    python benchmark.py run --compare baseline.json
+    python benchmark.py run --db-dir /tmp --only save_order get_all_orders
+    python benchmark.py memory --orders 100000
+    python benchmark.py search --dishes 100000
+
+Кожен випадок отримує новий порожній файл SQLite у тимчасовому каталозі
+(системному або з --db-dir), тож обидві реалізації працюють з однаковим
+сховищем. Режим журналу лишається своїм: main.py — типовий rollback-журнал,
+refactored_code.py — WAL. Звіт показує, де лежали бази.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from itertools import count
+from typing import Callable, Dict, List, Optional, Tuple
+
+import main
+import refactored_code
+
+DEFAULT_SIZES = (100, 1000, 10000)
+REGRESSION_THRESHOLD = 0.2
+ITEMS_PER_ORDER = 3
+# Скільки вимірів потрібно, щоб перцентиль не збігався з максимумом: p95 — 20, p99 — 100.
+TAIL_SAMPLES = {0.95: 20, 0.99: 100}
+
+# Пошук по меню: часті слова та короткі префікси — найгірший випадок для підказок під час введення.
+SEARCH_QUERIES = ("б", "к", "до", "борщ", "домашній бор", "з кап", "суп з")
+SEARCH_REPEATS = 200
+_SEARCH_ADJECTIVES = ("домашній", "класичний", "київський", "карпатський", "бабусин", "весняний", "зелений",
+                      "український", "курячий", "картопляний")
+_SEARCH_DISHES = ("борщ", "суп", "вареники", "деруни", "котлета", "салат", "каша", "пиріг", "компот", "голубці",
+                  "банош", "бульйон", "книш", "кулеша", "крученики", "млинці")
+_SEARCH_DESCRIPTION = ("з", "картоплею", "капустою", "буряком", "сметаною", "кропом", "цибулею", "морквою",
+                       "квасолею", "куркою", "беконом", "часником", "грибами", "сиром", "вишнею", "домашній")
+
+# Кожен бенчмарк — це пара (setup, op): setup(n) готує стан, op(state, i) — одна вимірювана операція.
+Case = Tuple[Callable[[int], object], Callable[[object, int], object]]
+
+
+def _fresh_legacy_db(path: str):
+    """Перестворює singleton main.I з порожньою базою у файлі path."""
+    _close_legacy_db()
+    db = main.I()
+    # main.I завжди відкриває ":memory:", тож з'єднання підміняється файловим.
+    db.a.close()
+    db.a = sqlite3.connect(path)
+    db.b = db.a.cursor()
+    db.t()
+    return db
+
+
+def _close_legacy_db() -> None:
+    if main.I._i is not None:
+        main.I._i.a.close()
+        main.I._i = None
+
+
+def _fresh_refactored_db(path: str):
+    """Перестворює singleton Database з порожньою базою у файлі path."""
+    refactored_code.Database.reset()
+    refactored_code.Database.configure(path=path)
+    return refactored_code.Database()
+
+
+def _legacy_cases(database_path: Callable[[], str]) -> Dict[str, Case]:
+    """Гарячі шляхи класів B/C/D/E/F/G/H/I з main.py."""
+    def dishes(n):
+        return [main.B(f"Страва {i}", 10 + i % 90) for i in range(n)]
+
+    def order_state(n):
+        client = main.D("Іван")
+        items = dishes(ITEMS_PER_ORDER)
+        notifier = main.G()
+        notifier.a(main.H())
+        return client, items, _fresh_legacy_db(database_path()), notifier
+
+    def orders(n):
+        client, items, db, notifier = order_state(n)
+        return [main.F.f("normal", client, items) for _ in range(n)], client, db, notifier
+
+    def menu_state(n):
+        return main.C(), dishes(n)
+
+    def menu_remove_state(n):
+        menu, items = menu_state(n)
+        for item in items:
+            menu.f1(item)
+        return menu, items
+
+    def get_all_state(n):
+        state = orders(n)
+        for order in state[0]:
+            state[2].k(order)
+        return state[2]
+
+    return {
+        "create_order": (order_state, lambda s, i: main.F.f("special" if i % 10 == 0 else "normal", s[0], s[1])),
+        "place_order": (orders, lambda s, i: s[1].g(s[0][i], s[2], s[3])),
+        "notify": (orders, lambda s, i: s[3].b(s[0][i])),
+        "save_order": (orders, lambda s, i: s[2].k(s[0][i])),
+        "get_all_orders": (get_all_state, lambda db, i: db.j()),
+        "menu_add": (menu_state, lambda s, i: s[0].f1(s[1][i])),
+        "menu_remove": (menu_remove_state, lambda s, i: s[0].f2(s[1][i])),
+    }
+
+
+def _refactored_cases(database_path: Callable[[], str]) -> Dict[str, Case]:
+    """Гарячі шляхи класів з refactored_code.py."""
+    def dishes(n):
+        return [refactored_code.Strava(f"Страва {i}", 10 + i % 90) for i in range(n)]
+
+    def order_state(n):
+        client = refactored_code.Client("Іван")
+        items = dishes(ITEMS_PER_ORDER)
+        notifier = refactored_code.KitchenNotifier()
+        notifier.subscribe(refactored_code.Kitchen())
+        return client, items, _fresh_refactored_db(database_path()), notifier
+
+    def orders(n):
+        client, items, db, notifier = order_state(n)
+        return ([refactored_code.OrderFactory.create_order("normal", client, items) for _ in range(n)],
+                client, db, notifier)
+
+    def menu_state(n):
+        return refactored_code.Menu(), dishes(n)
+
+    def menu_remove_state(n):
+        menu, items = menu_state(n)
+        with menu.batch():
+            for item in items:
+                menu.add_item(item)
+        return menu, items
+
+    def get_all_state(n):
+        state = orders(n)
+        state[2].save_orders(state[0])
+        return state[2]
+
+    return {
+        "create_order": (order_state, lambda s, i: refactored_code.OrderFactory.create_order(
+            "special" if i % 10 == 0 else "normal", s[0], s[1])),
+        "place_order": (orders, lambda s, i: s[1].place_order(s[0][i], s[2], s[3])),
+        "notify": (orders, lambda s, i: s[3].notify(s[0][i])),
+        "save_order": (orders, lambda s, i: s[2].save_order(s[0][i])),
+        "get_all_orders": (get_all_state, lambda db, i: db.get_all_orders()),
+        "menu_add": (menu_state, lambda s, i: s[0].add_item(s[1][i])),
+        "menu_remove": (menu_remove_state, lambda s, i: s[0].remove_item(s[1][i])),
+    }
+
+
+IMPLEMENTATIONS = {"main": _legacy_cases, "refactored": _refactored_cases}
+# get_all_orders читає всю таблицю, тому повторів менше, але досить для p99.
+REPEATS = {"get_all_orders": TAIL_SAMPLES[0.99]}
+
+
+def _percentile(sorted_values: List[int], fraction: float) -> int:
+    """Повертає перцентиль відсортованого списку (метод найближчого рангу)."""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _tail_us(sorted_values: List[int], fraction: float) -> Optional[float]:
+    """Повертає хвостовий перцентиль у мкс або None, якщо вимірів замало, щоб його оцінити."""
+    if len(sorted_values) < TAIL_SAMPLES[fraction]:
+        return None
+    return _percentile(sorted_values, fraction) / 1000
+
+
+def _measure(case: Case, size: int, operations: int) -> dict:
+    """Виконує бенчмарк: спочатку вимірює час кожної операції, потім — пікову пам'ять."""
+    setup, op = case
+    state = setup(size)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(operations):
+        op_started = time.perf_counter_ns()
+        op(state, i)
+        latencies.append(time.perf_counter_ns() - op_started)
+    elapsed = time.perf_counter() - started
+
+    state = setup(size)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for i in range(operations):
+            op(state, i)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "ops_per_sec": operations / elapsed if elapsed else float("inf"),
+        "p50_us": _percentile(latencies, 0.50) / 1000,
+        "p95_us": _tail_us(latencies, 0.95),
+        "p99_us": _tail_us(latencies, 0.99),
+        "peak_memory_bytes": peak,
+    }
+
+
+def run_suite(sizes=DEFAULT_SIZES, implementations=tuple(IMPLEMENTATIONS), benchmarks=None,
+              db_dir: Optional[str] = None) -> dict:
+    """Запускає всі бенчмарки для всіх розмірів і повертає результати за ключем impl.benchmark.size.
+
+    Бази випадків — нові файли в тимчасовому каталозі всередині ``db_dir``
+    (або системного тимчасового каталогу), який видаляється після прогону.
+    """
+    results = {}
+    scratch = tempfile.TemporaryDirectory(prefix="benchmark-", dir=db_dir)
+    case_ids = count()
+
+    def database_path() -> str:
+        return os.path.join(scratch.name, f"case-{next(case_ids)}.db")
+
+    try:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            for implementation in implementations:
+                for name, case in IMPLEMENTATIONS[implementation](database_path).items():
+                    if benchmarks and name not in benchmarks:
+                        continue
+                    for size in sizes:
+                        operations = REPEATS.get(name, size)
+                        results[f"{implementation}.{name}.{size}"] = _measure(case, size, operations)
+    finally:
+        _close_legacy_db()
+        refactored_code.Database.reset()
+        scratch.cleanup()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Повертає список регресій: бенчмарки, що стали повільнішими за поріг."""
+    regressions = []
+    for key, metrics in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        ratio = metrics["ops_per_sec"] / previous["ops_per_sec"]
+        if ratio < 1 - threshold:
+            regressions.append(f"{key}: {previous['ops_per_sec']:.0f} -> {metrics['ops_per_sec']:.0f} ops/s "
+                               f"({(1 - ratio) * 100:.0f}% повільніше)")
+    return regressions
+
+
+def _format_us(value: Optional[float]) -> str:
+    return f"{'—':>10}" if value is None else f"{value:>10.1f}"
+
+
+def format_results(results: dict, storage: Optional[str] = None) -> str:
+    """Форматує результати у вигляді таблиці; "—" означає, що вимірів замало для перцентиля."""
+    lines = [f"Сховище: файли SQLite у {storage}"] if storage else []
+    lines.append(f"{'бенчмарк':<40} {'ops/s':>12} {'p50 мкс':>10} {'p95 мкс':>10} {'p99 мкс':>10} {'пік, КБ':>10}")
+    for key, metrics in results.items():
+        lines.append(f"{key:<40} {metrics['ops_per_sec']:>12.0f} {metrics['p50_us']:>10.1f} "
+                     f"{_format_us(metrics['p95_us'])} {_format_us(metrics['p99_us'])} "
+                     f"{metrics['peak_memory_bytes'] / 1024:>10.1f}")
+    return "\n".join(lines)
+
+
+def _bytes_per_object(build, count: int) -> float:
+    """Вимірює, скільки байтів пам'яті в середньому займає один об'єкт, створений build."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = build(count)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def _legacy_orders(count: int):
+    """Створює замовлення класами з main.py (об'єкти з __dict__ та ціною float)."""
+    client = main.D("Іван")
+    dishes = [main.B("Суп", 50.5), main.B("Вареники", 60)]
+    return [main.F.build_order("special" if i % 10 == 0 else "normal", client, list(dishes))
+            for i in range(count)]
+
+
+def _refactored_orders(count: int):
+    """Створює замовлення класами з refactored_code.py (__slots__, копійки, бітові опції)."""
+    client = refactored_code.Client("Іван")
+    dishes = [refactored_code.Strava("Суп", 50.5), refactored_code.Strava("Вареники", 60)]
+    return [refactored_code.OrderFactory.create_order("special" if i % 10 == 0 else "normal", client,
+                                                      list(dishes))
+            for i in range(count)]
+
+
+def run_memory(count: int) -> dict:
+    """Порівнює пам'ять на одне замовлення та одну страву до і після переходу на __slots__."""
+    results = {
+        "order_bytes_before": _bytes_per_object(_legacy_orders, count),
+        "order_bytes_after": _bytes_per_object(_refactored_orders, count),
+        "dish_bytes_before": _bytes_per_object(
+            lambda n: [main.B(f"Страва {i}", 10.5) for i in range(n)], count),
+        "dish_bytes_after": _bytes_per_object(
+            lambda n: [refactored_code.Strava(f"Страва {i}", 10.5) for i in range(n)], count),
+    }
+    print(f"Замовлення: {results['order_bytes_before']:.0f} -> {results['order_bytes_after']:.0f} байт")
+    print(f"Страва:     {results['dish_bytes_before']:.0f} -> {results['dish_bytes_after']:.0f} байт")
+    return results
+
+
+def build_search_menu(count: int, seed: int = 1) -> "refactored_code.Menu":
+    """Створює меню з ``count`` страв, назви й описи яких складені з кількох десятків частих слів."""
+    rng = random.Random(seed)
+    menu = refactored_code.Menu()
+    with menu.batch():
+        for i in range(count):
+            words = [rng.choice(_SEARCH_ADJECTIVES), rng.choice(_SEARCH_DISHES)]
+            rng.shuffle(words)
+            description = " ".join(rng.choice(_SEARCH_DESCRIPTION) for _ in range(5))
+            menu.add_item(refactored_code.Strava(f"{' '.join(words).capitalize()} {i}", 20 + i % 300,
+                                                 description=description))
+    return menu
+
+
+def run_search(count: int, limit: int = 10) -> dict:
+    """Вимірює MenuSearchIndex.search на меню з ``count`` страв для запитів SEARCH_QUERIES."""
+    index = build_search_menu(count)._search
+    results = {}
+    for query in SEARCH_QUERIES:
+        latencies = []
+        for _ in range(SEARCH_REPEATS):
+            started = time.perf_counter_ns()
+            index.search(query, limit)
+            latencies.append(time.perf_counter_ns() - started)
+        latencies.sort()
+        results[query] = {"p50_us": _percentile(latencies, 0.50) / 1000, "p99_us": _tail_us(latencies, 0.99)}
+    print(f"Пошук у меню з {count} страв, limit={limit}")
+    print(f"{'запит':<20} {'p50 мкс':>10} {'p99 мкс':>10}")
+    for query, metrics in results.items():
+        print(f"{query!r:<20} {metrics['p50_us']:>10.1f} {_format_us(metrics['p99_us'])}")
+    return results
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser("run", help="час, перцентилі та пікова пам'ять гарячих шляхів")
+    run.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    run.add_argument("--impl", choices=sorted(IMPLEMENTATIONS), nargs="+", default=sorted(IMPLEMENTATIONS))
+    run.add_argument("--only", nargs="+", help="запустити лише вказані бенчмарки")
+    run.add_argument("--save", metavar="PATH", help="зберегти результати як JSON-базу для порівняння")
+    run.add_argument("--compare", metavar="PATH", help="порівняти з раніше збереженою базою")
+    run.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    run.add_argument("--db-dir", metavar="DIR", help="каталог для файлів баз випадків (типово — системний тимчасовий)")
+    memory = subparsers.add_parser("memory", help="пам'ять на одне замовлення до і після")
+    memory.add_argument("--orders", type=int, default=100_000)
+    search = subparsers.add_parser("search", help="затримка пошуку по меню з частими словами")
+    search.add_argument("--dishes", type=int, default=100_000)
+    search.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "memory":
+        run_memory(args.orders)
+        return 0
+    if args.command == "search":
+        run_search(args.dishes, args.limit)
+        return 0
+
+    results = run_suite(args.sizes, args.impl, args.only, args.db_dir)
+    storage = args.db_dir or tempfile.gettempdir()
+    print(format_results(results, storage))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump({"python": platform.python_version(), "storage": storage, "results": results},
+                      file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"РЕГРЕСІЯ {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,236 @@
+# loadgen.py
+"""Генератор навантаження, що відтворює трафік години пік.
+
+Синтезує меню та клієнтів, будує розклад надходження замовлень за кривою
+години пік (пуассонівський потік зі змінною інтенсивністю) і проганяє
+кожне замовлення повним шляхом: OrderFactory.create_order ->
+Client.place_order -> Database.save_order -> KitchenNotifier.notify ->
+Kitchen.update. Затримка рахується від запланованого моменту надходження,
+тож черга перед вільним потоком теж потрапляє в хвіст розподілу.
+
+Запуск:
+    python loadgen.py --db loadgen.db --duration 60 --peak-rate 300 --clients 5000 --dishes 400
+    python loadgen.py --db :memory: --duration 10 --group-commit --async-notifier --json report.json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import List, NamedTuple, Optional
+
+from refactored_code import (METRICS, ORDER_TYPE_NORMAL, ORDER_TYPE_SPECIAL, AsyncKitchenNotifier, Client,
+                             Database, Kitchen, KitchenNotifier, Menu, OrderFactory, Strava)
+
+DEFAULT_DB_PATH = "loadgen.db"
+MENU_CATEGORIES = ("Перші страви", "Гриль", "Салати", "Гарніри", "Десерти", "Напої")
+# Ширина піку як частка тривалості прогону (стандартне відхилення гауссового горба).
+PEAK_WIDTH = 0.15
+
+
+class Arrival(NamedTuple):
+    """Одне заплановане замовлення."""
+    at: float
+    client: int
+    order_type: str
+    dishes: tuple
+
+
+def rush_hour_rate(moment: float, duration: float, base_rate: float, peak_rate: float,
+                   peak_at: float = 0.5) -> float:
+    """Повертає інтенсивність (замовлень/с) у момент часу: базовий рівень плюс гауссів горб піку."""
+    offset = (moment / duration - peak_at) / PEAK_WIDTH
+    return base_rate + (peak_rate - base_rate) * math.exp(-0.5 * offset * offset)
+
+
+def build_schedule(rng: random.Random, duration: float, base_rate: float, peak_rate: float, clients: int,
+                   dishes: int, special_ratio: float, max_items: int, peak_at: float = 0.5) -> List[Arrival]:
+    """Будує розклад надходжень методом проріджування пуассонівського потоку з інтенсивністю піку."""
+    if peak_rate <= 0 or not 0 <= base_rate <= peak_rate:
+        raise ValueError("Потрібно 0 <= base_rate <= peak_rate і peak_rate > 0.")
+    schedule = []
+    moment = 0.0
+    while True:
+        moment += rng.expovariate(peak_rate)
+        if moment >= duration:
+            return schedule
+        if rng.random() * peak_rate > rush_hour_rate(moment, duration, base_rate, peak_rate, peak_at):
+            continue
+        order_type = ORDER_TYPE_SPECIAL if rng.random() < special_ratio else ORDER_TYPE_NORMAL
+        items = tuple(rng.randrange(dishes) for _ in range(rng.randint(1, max_items)))
+        schedule.append(Arrival(moment, rng.randrange(clients), order_type, items))
+
+
+def build_menu(rng: random.Random, size: int) -> Menu:
+    """Створює меню зі ``size`` страв, рівномірно розкладених по категоріях."""
+    menu = Menu()
+    with menu.batch():
+        for i in range(size):
+            category = MENU_CATEGORIES[i % len(MENU_CATEGORIES)]
+            menu.add_item(Strava(f"{category} {i}", rng.randint(20, 400) + rng.choice((0, 0.5)),
+                                 category=category))
+    return menu
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    """Повертає перцентиль відсортованого списку (метод найближчого рангу)."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _latency_summary(values: List[float]) -> dict:
+    """Повертає p50/p95/p99/p99.9/max у мілісекундах."""
+    values = sorted(values)
+    summary = {f"p{label}_ms": _percentile(values, fraction) * 1000
+               for label, fraction in (("50", 0.50), ("95", 0.95), ("99", 0.99), ("99.9", 0.999))}
+    summary["max_ms"] = (values[-1] if values else 0.0) * 1000
+    return summary
+
+
+def run_load(db_path: str = DEFAULT_DB_PATH, duration: float = 30.0, peak_rate: float = 200.0,
+             base_rate: Optional[float] = None, clients: int = 1000, dishes: int = 200,
+             special_ratio: float = 0.1, max_items: int = 4, concurrency: int = 32, pool_size: int = 8,
+             group_commit: bool = False, async_notifier: bool = False, seed: int = 1) -> dict:
+    """Проганяє розклад надходжень через повний шлях замовлення і повертає звіт."""
+    if concurrency <= 0:
+        raise ValueError("Кількість потоків повинна бути більше 0.")
+    rng = random.Random(seed)
+    base_rate = peak_rate / 5 if base_rate is None else base_rate
+    menu_items = build_menu(rng, dishes).get_menu_items()
+    customers = [Client(f"Клієнт {i}") for i in range(clients)]
+    # Клієнт розміщує замовлення по одному, як і в залі; LRU-історія Client не потокобезпечна.
+    customer_locks = [threading.Lock() for _ in range(clients)]
+    schedule = build_schedule(rng, duration, base_rate, peak_rate, clients, dishes, special_ratio, max_items)
+
+    Database.reset()
+    Database.configure(path=db_path, pool_size=pool_size)
+    db = Database()
+    if group_commit:
+        db.enable_group_commit()
+    notifier = AsyncKitchenNotifier() if async_notifier else KitchenNotifier()
+    notifier.subscribe(Kitchen())
+    size_before, orders_before = db.size_bytes(), db.last_order_id()
+
+    lock = threading.Lock()
+    latencies: List[float] = []
+    service_times: List[float] = []
+    completed_at: List[float] = []
+    errors: List[str] = []
+
+    def place(arrival: Arrival, due: float):
+        started = time.perf_counter()
+        try:
+            client = customers[arrival.client]
+            order = OrderFactory.create_order(arrival.order_type, client,
+                                              [menu_items[dish] for dish in arrival.dishes])
+            with customer_locks[arrival.client]:
+                client.place_order(order, db, notifier)
+        except Exception as error:
+            with lock:
+                errors.append(repr(error))
+            return
+        finished = time.perf_counter()
+        with lock:
+            latencies.append(finished - due)
+            service_times.append(finished - started)
+            completed_at.append(finished)
+
+    # Kitchen.update друкує кожне замовлення; під навантаженням це лише шум.
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="loadgen")
+        start = time.perf_counter()
+        for arrival in schedule:
+            due = start + arrival.at
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(place, arrival, due)
+        executor.shutdown(wait=True)
+        if async_notifier:
+            notifier.close()
+        db.disable_group_commit()
+        elapsed = time.perf_counter() - start
+
+    per_second = [0] * (int(elapsed) + 1)
+    for moment in completed_at:
+        per_second[int(moment - start)] += 1
+    saved = db.last_order_id() - orders_before
+    growth = db.size_bytes() - size_before
+    Database.reset()
+    return {
+        "offered": len(schedule),
+        "completed": len(latencies),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "elapsed_s": elapsed,
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "peak_second_throughput": max(per_second),
+        "latency": _latency_summary(latencies),
+        "service_time": _latency_summary(service_times),
+        "db_orders_added": saved,
+        "db_growth_bytes": growth,
+        "db_bytes_per_order": growth / saved if saved else 0.0,
+    }
+
+
+def format_report(report: dict) -> str:
+    """Форматує звіт для термінала."""
+    lines = [
+        f"Замовлень: заплановано {report['offered']}, виконано {report['completed']}, помилок {report['errors']}",
+        f"Тривалість: {report['elapsed_s']:.1f} с, пропускна здатність: {report['throughput_per_s']:.1f} замовлень/с "
+        f"(пік за секунду: {report['peak_second_throughput']})",
+    ]
+    for title, key in (("Затримка від надходження", "latency"), ("Час обслуговування", "service_time")):
+        summary = report[key]
+        lines.append(f"{title}, мс: " + ", ".join(f"{name[:-3]}={value:.2f}" for name, value in summary.items()))
+    lines.append(f"Ріст бази: {report['db_growth_bytes'] / 1024:.1f} КБ на {report['db_orders_added']} замовлень "
+                 f"({report['db_bytes_per_order']:.0f} байт/замовлення)")
+    lines.extend(f"  {error}" for error in report["first_errors"])
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="файл SQLite для прогону (або :memory:)")
+    parser.add_argument("--duration", type=float, default=30.0, help="тривалість прогону, с")
+    parser.add_argument("--peak-rate", type=float, default=200.0, help="інтенсивність у пік, замовлень/с")
+    parser.add_argument("--base-rate", type=float, help="інтенсивність поза піком (за замовчуванням peak/5)")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--dishes", type=int, default=200)
+    parser.add_argument("--special-ratio", type=float, default=0.1, help="частка особливих замовлень")
+    parser.add_argument("--max-items", type=int, default=4, help="найбільша кількість страв у замовленні")
+    parser.add_argument("--concurrency", type=int, default=32, help="кількість одночасних потоків-клієнтів")
+    parser.add_argument("--pool-size", type=int, default=8, help="розмір пулу з'єднань SQLite")
+    parser.add_argument("--group-commit", action="store_true", help="увімкнути group commit у Database")
+    parser.add_argument("--async-notifier", action="store_true", help="використати AsyncKitchenNotifier")
+    parser.add_argument("--stages", action="store_true", help="зібрати й показати метрики етапів (METRICS)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="зберегти звіт як JSON")
+    args = parser.parse_args(argv)
+
+    if args.stages:
+        METRICS.reset()
+        METRICS.enable()
+    report = run_load(args.db, args.duration, args.peak_rate, args.base_rate, args.clients, args.dishes,
+                      args.special_ratio, args.max_items, args.concurrency, args.pool_size,
+                      args.group_commit, args.async_notifier, args.seed)
+    print(format_report(report))
+    if args.stages:
+        METRICS.disable()
+        print(METRICS.snapshot())
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# manage.py
+"""Службові команди для бази замовлень.
+
+Запуск:
+    python manage.py rebuild-aggregates
+    python manage.py --db /var/lib/orders.db rebuild-aggregates
+    python manage.py analytics --cache analytics_cache
+"""
+
+import argparse
+import sys
+
+from refactored_code import DATABASE_PATH, Database
+
+
+def rebuild_aggregates(args) -> int:
+    """Перераховує агрегати продажів із сирих замовлень."""
+    db = Database()
+    db.rebuild_aggregates()
+    print("Агрегати продажів перераховано.")
+    return 0
+
+
+def analytics_report(args) -> int:
+    """Оновлює колонковий кеш замовлень і друкує звіт."""
+    # NumPy потрібен лише для цієї команди.
+    from analytics import load_or_refresh
+
+    columns = load_or_refresh(Database(), args.cache)
+    print(f"Позицій у кеші: {len(columns)}, останнє замовлення: #{columns.last_order_id}")
+    for name, quantity, revenue in columns.revenue_by_dish()[:args.top]:
+        print(f"{name:<30} {quantity:>8} {revenue:>12.2f} грн")
+    percentiles = ", ".join(f"p{percentile:g}={value:.2f}" for percentile, value
+                            in columns.order_total_percentiles().items())
+    print(f"Сума замовлення, грн: {percentiles}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DATABASE_PATH, help=f"шлях до бази замовлень (за замовчуванням {DATABASE_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild = subparsers.add_parser("rebuild-aggregates", help="перерахувати агрегати продажів")
+    rebuild.set_defaults(handler=rebuild_aggregates)
+    analytics = subparsers.add_parser("analytics", help="колонковий звіт по замовленнях (потрібен NumPy)")
+    analytics.add_argument("--cache", default="analytics_cache", help="каталог кешу колонок .npy")
+    analytics.add_argument("--top", type=int, default=10, help="скільки страв показати")
+    analytics.set_defaults(handler=analytics_report)
+    args = parser.parse_args(argv)
+    Database.configure(path=args.db)
+    try:
+        return args.handler(args)
+    finally:
+        Database.reset()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
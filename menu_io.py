@@ -0,0 +1,175 @@
+# menu_io.py
+"""Потоковий імпорт та експорт меню у форматах CSV та JSON Lines.
+
+Файл читається порціями, тож пам'ять не залежить від його розміру. Рядки
+перевіряються тими самими правилами, що й у Strava, і застосовуються до
+наявного меню як різниця: нові страви додаються, змінені оновлюються,
+однакові пропускаються.
+"""
+
+import csv
+import json
+import os
+from itertools import islice
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from refactored_code import Menu, Strava
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+MENU_FIELDS = ("name", "price", "description", "category")
+IMPORT_BATCH_SIZE = 1000
+
+
+class RowError(NamedTuple):
+    """Помилка в рядку файлу меню."""
+    line: int
+    message: str
+
+
+class ImportReport:
+    """Підсумок імпорту меню."""
+    def __init__(self, max_errors: int):
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.error_count = 0
+        self.errors: List[RowError] = []
+        self._max_errors = max_errors
+
+    def add_error(self, line: int, message: str) -> None:
+        """Рахує помилку; зберігає не більше max_errors перших помилок."""
+        self.error_count += 1
+        if len(self.errors) < self._max_errors:
+            self.errors.append(RowError(line, message))
+
+    def __str__(self):
+        return (f"Додано: {self.added}, оновлено: {self.updated}, без змін: {self.unchanged}, "
+                f"видалено: {self.removed}, помилок: {self.error_count}")
+
+
+def _detect_format(path: str, fmt: Optional[str]) -> str:
+    """Визначає формат файлу за параметром або розширенням."""
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip(".").lower()
+        if fmt == "json":
+            fmt = FORMAT_JSONL
+    if fmt not in (FORMAT_CSV, FORMAT_JSONL):
+        raise ValueError(f"Невідомий формат меню: {fmt}")
+    return fmt
+
+
+def iter_rows(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[int, object]]:
+    """Поступово читає рядки файлу меню як пари (номер рядка, словник полів).
+
+    Рядок JSON Lines, який не вдалося розібрати, віддається як виняток ValueError.
+    """
+    fmt = _detect_format(path, fmt)
+    with open(path, encoding="utf-8", newline="") as file:
+        if fmt == FORMAT_CSV:
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield line_number, ValueError(f"Некоректний JSON: {error.msg}")
+                continue
+            yield line_number, row if isinstance(row, dict) else ValueError("Рядок повинен бути об'єктом JSON")
+
+
+def _text_field(row: dict, field: str) -> str:
+    """Повертає текстове поле рядка; у JSON Lines воно може бути не рядком."""
+    value = row.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"Поле {field} повинне бути рядком: {value!r}")
+    return value
+
+
+def _parse_row(row) -> Strava:
+    """Перетворює словник полів на страву, перевіряючи його правилами Strava."""
+    if isinstance(row, Exception):
+        raise row
+    name = _text_field(row, "name").strip()
+    try:
+        price = float(row.get("price"))
+    except (TypeError, ValueError):
+        raise ValueError(f"Некоректна ціна: {row.get('price')!r}") from None
+    return Strava(name, price, _text_field(row, "description"), _text_field(row, "category"))
+
+
+def _apply(menu: Menu, dish: Strava, report: ImportReport) -> None:
+    """Застосовує одну страву до меню як різницю з поточним станом."""
+    current = menu.get(dish.name)
+    if current is None:
+        menu.add_item(dish)
+        report.added += 1
+    elif (current.price_kop, current.description, current.category) == \
+            (dish.price_kop, dish.description, dish.category):
+        report.unchanged += 1
+    else:
+        menu.replace_item(dish)
+        report.updated += 1
+
+
+def import_menu(menu: Menu, path: str, fmt: Optional[str] = None, batch_size: int = IMPORT_BATCH_SIZE,
+                prune: bool = False, max_errors: int = 100) -> ImportReport:
+    """Імпортує страви з файлу в наявне меню.
+
+    Некоректні рядки потрапляють у звіт і не зупиняють імпорт. Якщо
+    ``prune`` увімкнено, страви, яких немає у файлі, видаляються з меню;
+    для цього запам'ятовуються назви з файлу, тому пам'ять тоді росте з
+    кількістю страв.
+    """
+    if batch_size <= 0:
+        raise ValueError("Розмір порції повинен бути більше 0.")
+    report = ImportReport(max_errors)
+    seen = set() if prune else None
+    rows = iter_rows(path, fmt)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        dishes = []
+        for line, row in batch:
+            try:
+                dishes.append(_parse_row(row))
+            except ValueError as error:
+                report.add_error(line, str(error))
+        with menu.batch():
+            for dish in dishes:
+                _apply(menu, dish, report)
+                if seen is not None:
+                    seen.add(dish.name)
+    if seen is not None:
+        with menu.batch():
+            for item in menu.get_menu_items():
+                if item.name not in seen:
+                    menu.remove_item(item)
+                    report.removed += 1
+    return report
+
+
+def export_menu(menu: Menu, path: str, fmt: Optional[str] = None) -> int:
+    """Записує страви меню у файл і повертає їх кількість."""
+    fmt = _detect_format(path, fmt)
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file) if fmt == FORMAT_CSV else None
+        if writer is not None:
+            writer.writerow(MENU_FIELDS)
+        for item in menu.get_menu_items():
+            values = (item.name, item.price_text, item.description, item.category)
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                file.write(json.dumps(dict(zip(MENU_FIELDS, values)), ensure_ascii=False) + "\n")
+            written += 1
+    return written
@@ -1,13 +1,211 @@
 # refactored_code.py
 
 from abc import ABC, abstractmethod
-from typing import List
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from enum import IntFlag
+from itertools import count, groupby, islice, product
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import heapq
+import json
+import math
+import multiprocessing
+import os
+import queue
+import re
+import shutil
 import sqlite3
+import tempfile
+import threading
+import time
+import traceback
+import unicodedata
+import weakref
+import zlib
 
 
 # Constants
 ORDER_TYPE_NORMAL = "normal"
 ORDER_TYPE_SPECIAL = "special"
+STATUS_PENDING = "Очікується"
+STATUS_QUEUED = "У черзі"
+STATUS_COOKING = "Готується"
+STATUS_READY = "Готово"
+STATUS_FAILED = "Не вдалося"
+ORDER_STATUSES = (STATUS_PENDING, STATUS_QUEUED, STATUS_COOKING, STATUS_READY, STATUS_FAILED)
+OPEN_STATUSES = (STATUS_PENDING, STATUS_QUEUED, STATUS_COOKING)
+KOPECKS_PER_UAH = 100
+ORDER_FETCH_CHUNK_SIZE = 500
+CLIENT_HISTORY_CACHE_SIZE = 50
+CLIENT_HISTORY_PAGE_SIZE = 100
+AGGREGATE_BUCKET_SECONDS = 3600
+DATABASE_PATH = "../orders.db"
+MEMORY_DATABASE = ":memory:"
+# Кеш підготовлених запитів sqlite3 на з'єднання (за замовчуванням у Python — 128).
+STATEMENT_CACHE_SIZE = 512
+# Через скільки секунд після помилки sink журналу знову пробувати фоновий запис.
+LOG_SINK_RETRY_DELAY = 1.0
+# Скільки секунд сховище збирає переходи статусів у пачку, перш ніж записати їх у фоні.
+STATUS_FLUSH_DELAY = 0.05
+
+
+def to_kopecks(price: float) -> int:
+    """Переводить ціну в гривнях у цілу кількість копійок."""
+    return int(round(price * KOPECKS_PER_UAH))
+
+
+def format_price(kopecks: int) -> str:
+    """Форматує ціну в копійках так, як Python показує число в гривнях: 5500 -> "55", 4550 -> "45.5"."""
+    hryvnias, rest = divmod(kopecks, KOPECKS_PER_UAH)
+    return str(hryvnias) if rest == 0 else repr(kopecks / KOPECKS_PER_UAH)
+
+
+class Histogram:
+    """Гістограма тривалостей з фіксованими логарифмічними межами (від 1 мкс до ~17 с)."""
+    BOUNDS = tuple(2 ** power / 1_000_000 for power in range(25))
+
+    def __init__(self):
+        self._buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """Додає одне значення в секундах."""
+        self._buckets[bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, fraction: float) -> float:
+        """Повертає верхню межу кошика, у який потрапляє вказаний квантиль."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self._buckets):
+            seen += bucket
+            if seen >= rank:
+                return self.BOUNDS[index] if index < len(self.BOUNDS) else self.max
+        return self.max
+
+
+class _Timer:
+    """Контекстний менеджер, що записує тривалість блоку в реєстр метрик."""
+    __slots__ = ("_registry", "_name", "_started")
+
+    def __init__(self, registry: "MetricsRegistry", name: str):
+        self._registry = registry
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._registry.observe(self._name, time.perf_counter() - self._started)
+        return False
+
+
+class _NullTimer:
+    """Таймер, який нічого не робить; використовується, коли метрики вимкнено."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """Реєстр лічильників і гістограм тривалостей етапів обробки замовлення.
+
+    За замовчуванням вимкнений: тоді ``timer`` повертає спільний порожній
+    таймер, а ``increment`` одразу виходить. Хуки ``hook(name, seconds)``
+    викликаються для кожної записаної тривалості.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._hooks: List[Callable[[str, float], None]] = []
+
+    def enable(self) -> None:
+        """Вмикає збір метрик."""
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Вимикає збір метрик."""
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Очищає всі зібрані значення."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def add_hook(self, hook: Callable[[str, float], None]) -> None:
+        """Додає хук, який отримує назву етапу та його тривалість."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[str, float], None]) -> None:
+        """Видаляє хук."""
+        self._hooks.remove(hook)
+
+    def timer(self, name: str):
+        """Повертає контекстний менеджер, що вимірює тривалість етапу."""
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Збільшує лічильник."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Записує тривалість етапу в гістограму та передає її хукам."""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+        for hook in self._hooks:
+            hook(name, seconds)
+
+    def counter(self, name: str) -> int:
+        """Повертає значення лічильника."""
+        return self._counters.get(name, 0)
+
+    def histogram(self, name: str) -> Optional[Histogram]:
+        """Повертає гістограму етапу або None."""
+        return self._histograms.get(name)
+
+    def snapshot(self) -> str:
+        """Повертає текстовий знімок усіх лічильників і тривалостей."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        lines = [f"counter {name} {value}" for name, value in counters]
+        for name, histogram in histograms:
+            lines.append(
+                f"timer {name} count={histogram.count} total={histogram.total:.6f}s "
+                f"avg={histogram.total / histogram.count * 1000:.3f}ms "
+                f"p50<={histogram.quantile(0.5) * 1000:.3f}ms p99<={histogram.quantile(0.99) * 1000:.3f}ms "
+                f"max={histogram.max * 1000:.3f}ms")
+        return "\n".join(lines)
+
+
+METRICS = MetricsRegistry()
 
 
 class OrderNotifier(ABC):
@@ -19,17 +217,50 @@ class OrderNotifier(ABC):
 
 
 class Strava:
-    """Клас, що представляє страву у меню."""
+    """Клас, що представляє страву у меню.
+
+    Ціна зберігається цілим числом копійок, щоб суми замовлень були точними,
+    а показується так, як її задали (40.0 -> "40.0"), як у main.py.
+    """
+    __slots__ = ("_name", "_price", "_price_text", "_description", "_category")
+
     def __init__(self, name: str, price: float, description: str = "", category: str = ""):
-        if not name:
-            raise ValueError("Назва страви повинна бути непорожньою.")
-        if price <= 0:
-            raise ValueError("Ціна повинна бути більше 0.")
+        self.validate(name, price)
+        self._check_text(description, "опис")
+        self._check_text(category, "категорія")
         self._name = name
-        self._price = price
+        self._price = to_kopecks(price)
+        # Текст ціни тримаємо лише тоді, коли він відрізняється від format_price.
+        text = str(price)
+        self._price_text = None if text == format_price(self._price) else text
         self._description = description
         self._category = category
 
+    @classmethod
+    def from_kopecks(cls, name: str, kopecks: int, price_text: Optional[str] = None,
+                     category: str = "") -> "Strava":
+        """Відновлює страву з ціни в копійках і тексту ціни, як їх зберігає база."""
+        dish = cls(name, kopecks / KOPECKS_PER_UAH, category=category)
+        dish._price = kopecks
+        dish._price_text = price_text
+        return dish
+
+    @staticmethod
+    def validate(name: str, price: float) -> None:
+        """Перевіряє назву та ціну страви, кидає ValueError, якщо вони некоректні."""
+        if not isinstance(name, str) or not name:
+            raise ValueError("Назва страви повинна бути непорожнім рядком.")
+        if not math.isfinite(price):
+            raise ValueError("Ціна повинна бути скінченним числом.")
+        if price <= 0 or to_kopecks(price) <= 0:
+            raise ValueError("Ціна повинна бути більше 0.")
+
+    @staticmethod
+    def _check_text(value: str, field: str) -> None:
+        """Перевіряє, що текстове поле страви є рядком."""
+        if not isinstance(value, str):
+            raise ValueError(f"Поле «{field}» страви повинне бути рядком.")
+
     @property
     def name(self):
         """Повертає назву страви."""
@@ -37,47 +268,459 @@ class Strava:
 
     @property
     def price(self):
-        """Повертає ціну страви."""
+        """Повертає ціну страви в гривнях."""
+        return self._price / KOPECKS_PER_UAH
+
+    @property
+    def price_kop(self):
+        """Повертає ціну страви в копійках."""
         return self._price
 
+    @property
+    def price_text(self) -> str:
+        """Повертає ціну так, як її показують у меню та замовленнях."""
+        return self._price_text if self._price_text is not None else format_price(self._price)
+
+    @property
+    def description(self):
+        """Повертає опис страви."""
+        return self._description
+
+    @property
+    def category(self):
+        """Повертає категорію страви."""
+        return self._category
+
     def set_description(self, description: str):
         """Встановлює опис страви."""
+        self._check_text(description, "опис")
         self._description = description
 
     def set_category(self, category: str):
         """Встановлює категорію страви."""
+        self._check_text(category, "категорія")
         self._category = category
 
     def __str__(self):
-        return f"{self._name} - {self._price} грн"
+        return f"{self._name} - {self.price_text} грн"
+
+
+_APOSTROPHES = str.maketrans({"’": "'", "ʼ": "'", "`": "'"})
+_TOKEN_RE = re.compile(r"\w+(?:'\w+)*")
+
+
+def normalize_text(text: str) -> str:
+    """Зводить текст до форми для пошуку: NFKC, casefold та єдиний апостроф."""
+    return unicodedata.normalize("NFKC", text).casefold().translate(_APOSTROPHES)
+
+
+def tokenize(text: str) -> List[str]:
+    """Розбиває текст на нормалізовані слова (апостроф усередині слова зберігається)."""
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+class MenuSearchIndex:
+    """Пошуковий індекс страв: інвертовані індекси слів назви та опису.
+
+    Словник слів зберігається відсортованим, тож слова з потрібним префіксом
+    займають суцільний діапазон, який знаходить bisect, — це заміняє префіксне
+    дерево без окремого вузла на кожну літеру. Списки страв кожного слова
+    (і кожного короткого префікса) впорядковані за ключем ранжування, тож
+    search() переглядає страви від найкращих і зупиняється, щойно набере limit.
+    add() лише дописує страву в кінець списку; список, що втратив порядок,
+    сортується під час першого читання, тож масове додавання не зсуває списки.
+    """
+    WEIGHT_DESCRIPTION = 1
+    WEIGHT_NAME = 2
+    # Збіг з першим словом назви: страва, назва якої починається із запиту, — найвище.
+    WEIGHT_LEADING_WORD = 100
+    EXACT_TOKEN_FACTOR = 2
+    # Префікси до цієї довжини мають готові списки страв: їх діапазон у словнику найширший.
+    SHORT_PREFIX_LENGTH = 2
+
+    def __init__(self):
+        self._dishes: Dict[str, Strava] = {}
+        # Слова страви за полями: опис, назва, перше слово назви — у порядку _weights.
+        self._dish_tokens: Dict[str, Tuple[frozenset, frozenset, frozenset]] = {}
+        self._weights = (self.WEIGHT_DESCRIPTION, self.WEIGHT_NAME, self.WEIGHT_LEADING_WORD)
+        # Для кожного поля: слово (або короткий префікс) -> відсортовані ключі ранжування страв.
+        self._postings: Tuple[Dict[str, List[tuple]], ...] = ({}, {}, {})
+        self._prefix_postings: Tuple[Dict[str, List[tuple]], ...] = ({}, {}, {})
+        # Списки, дописані не в порядку ключів: (id словника списків, слово).
+        self._unsorted: set = set()
+        self._vocabulary: List[str] = []
+
+    @staticmethod
+    def _rank_key(item: Strava) -> tuple:
+        """Ключ ранжування: коротші назви вище, далі абетка; назва в кінці робить ключ унікальним."""
+        return len(item.name), normalize_text(item.name), item.name
+
+    @staticmethod
+    def _field_tokens(item: Strava) -> Tuple[frozenset, frozenset, frozenset]:
+        """Повертає множини слів опису, назви та першого слова назви."""
+        name_tokens = tokenize(item.name)
+        return frozenset(tokenize(item.description)), frozenset(name_tokens), frozenset(name_tokens[:1])
+
+    def _short_prefixes(self, tokens: frozenset) -> set:
+        return {token[:length] for token in tokens
+                for length in range(1, min(len(token), self.SHORT_PREFIX_LENGTH) + 1)}
+
+    def _in_vocabulary(self, token: str) -> bool:
+        return any(token in postings for postings in self._postings)
+
+    def add(self, item: Strava) -> None:
+        """Індексує назву й опис страви."""
+        key = self._rank_key(item)
+        fields = self._field_tokens(item)
+        self._dishes[item.name] = item
+        self._dish_tokens[item.name] = fields
+        for postings, prefix_postings, tokens in zip(self._postings, self._prefix_postings, fields):
+            for token in tokens:
+                if token not in postings and not self._in_vocabulary(token):
+                    insort(self._vocabulary, token)
+                self._append(postings, token, key)
+            for prefix in self._short_prefixes(tokens):
+                self._append(prefix_postings, prefix, key)
+
+    def _append(self, postings: Dict[str, List[tuple]], word: str, key: tuple) -> None:
+        """Дописує ключ у список слова й позначає список, якщо порядок порушено."""
+        keys = postings.get(word)
+        if keys is None:
+            postings[word] = [key]
+            return
+        if key < keys[-1]:
+            self._unsorted.add((id(postings), word))
+        keys.append(key)
+
+    def _sorted(self, postings: Dict[str, List[tuple]], word: str) -> Optional[List[tuple]]:
+        """Повертає список слова, спершу відсортувавши його, якщо він позначений."""
+        keys = postings.get(word)
+        if keys is not None and (id(postings), word) in self._unsorted:
+            self._unsorted.discard((id(postings), word))
+            keys.sort()
+        return keys
+
+    def remove(self, item: Strava) -> None:
+        """Прибирає страву з індексу."""
+        if self._dishes.get(item.name) is not item:
+            return
+        key = self._rank_key(item)
+        del self._dishes[item.name]
+        fields = self._dish_tokens.pop(item.name)
+        for postings, prefix_postings, tokens in zip(self._postings, self._prefix_postings, fields):
+            for token in tokens:
+                if not self._discard(postings, token, key) and not self._in_vocabulary(token):
+                    del self._vocabulary[bisect_left(self._vocabulary, token)]
+            for prefix in self._short_prefixes(tokens):
+                self._discard(prefix_postings, prefix, key)
+
+    def _discard(self, postings: Dict[str, List[tuple]], word: str, key: tuple) -> bool:
+        """Видаляє ключ зі списку слова; повертає False, якщо список спорожнів і слово прибрано."""
+        keys = self._sorted(postings, word)
+        del keys[bisect_left(keys, key)]
+        if keys:
+            return True
+        del postings[word]
+        return False
+
+    def _layers(self, token: str, as_prefix: bool) -> List[Tuple[int, List[List[tuple]]]]:
+        """Повертає списки страв зі словом запиту, згруповані за вагою збігу від більшої до меншої.
+
+        Назва важить більше за опис, повне слово — удвічі більше за префікс.
+        """
+        words = ()
+        if as_prefix and len(token) > self.SHORT_PREFIX_LENGTH:
+            vocabulary = self._vocabulary
+            start = position = bisect_left(vocabulary, token)
+            while position < len(vocabulary) and vocabulary[position].startswith(token):
+                position += 1
+            words = [word for word in vocabulary[start:position] if word != token]
+        layers: Dict[int, List[List[tuple]]] = {}
+        for postings, prefix_postings, weight in zip(self._postings, self._prefix_postings, self._weights):
+            exact = self._sorted(postings, token)
+            if exact:
+                layers.setdefault(weight * self.EXACT_TOKEN_FACTOR, []).append(exact)
+            if not as_prefix:
+                continue
+            if len(token) <= self.SHORT_PREFIX_LENGTH:
+                # Готовий список містить і точні збіги; _combo_matches відкидає їх перевіркою ваги.
+                longer = [self._sorted(prefix_postings, token)]
+            else:
+                longer = [self._sorted(postings, word) for word in words]
+            longer = [keys for keys in longer if keys]
+            if longer:
+                layers.setdefault(weight, []).extend(longer)
+        return sorted(layers.items(), reverse=True)
+
+    def _token_weight(self, fields: Tuple[frozenset, frozenset, frozenset], token: str, as_prefix: bool) -> int:
+        """Повертає вагу найкращого збігу слова запиту зі словами страви (0 — збігу немає)."""
+        best = 0
+        for tokens, weight in zip(fields, self._weights):
+            if token in tokens:
+                best = max(best, weight * self.EXACT_TOKEN_FACTOR)
+            elif as_prefix and any(word.startswith(token) for word in tokens):
+                best = max(best, weight)
+        return best
+
+    def search(self, query: str, limit: int = 10) -> List[Strava]:
+        """Шукає страви за словами запиту, останнє слово — як префікс (для підказок під час введення).
+
+        Страва має містити всі слова запиту. Вище стоять страви, назва яких
+        починається з першого слова запиту, далі — за вагою збігів, довжиною
+        назви та абеткою.
+
+        Кожна страва належить рівно одній комбінації ваг збігів слів запиту.
+        Комбінації перебираються від більшої суми ваг, страви в межах суми —
+        за ключем ранжування, тож пошук зупиняється, щойно набере limit страв.
+        """
+        tokens = tokenize(query)
+        if not tokens or limit <= 0:
+            return []
+        terms = [(token, position == len(tokens) - 1) for position, token in enumerate(tokens)]
+        layers = [self._layers(token, as_prefix) for token, as_prefix in terms]
+        combos = [combo for combo in product(*layers) if self._leading_compatible(terms, combo)]
+        combos.sort(key=lambda combo: -sum(weight for weight, _ in combo))
+        found: List[tuple] = []
+        for _, group in groupby(combos, key=lambda combo: sum(weight for weight, _ in combo)):
+            streams = [self._combo_matches(terms, combo) for combo in group]
+            found += islice(heapq.merge(*streams), limit - len(found))
+            if len(found) >= limit:
+                break
+        return [self._dishes[key[-1]] for key in found]
+
+    def _leading_compatible(self, terms, combo) -> bool:
+        """Перше слово назви одне: два слова запиту збігаються з ним, лише якщо одне — префікс іншого."""
+        leading = [token for (token, _), (weight, _) in zip(terms, combo) if weight >= self.WEIGHT_LEADING_WORD]
+        return all(first.startswith(second) or second.startswith(first)
+                   for first, second in zip(leading, leading[1:]))
+
+    def _combo_matches(self, terms, combo) -> Iterator[tuple]:
+        """Віддає за зростанням ключі страв, у яких кожне слово запиту має саме вагу з combo.
+
+        Кандидатів дає найкоротший список комбінації, решту слів перевіряємо за словами страви.
+        """
+        weights = [weight for weight, _ in combo]
+        shortest = min((lists for _, lists in combo), key=lambda lists: sum(len(keys) for keys in lists))
+        previous = None
+        for key in heapq.merge(*shortest):
+            if key == previous:
+                continue
+            previous = key
+            fields = self._dish_tokens[key[-1]]
+            if all(self._token_weight(fields, token, as_prefix) == weight
+                   for (token, as_prefix), weight in zip(terms, weights)):
+                yield key
+
+
+class MenuSnapshot:
+    """Незмінний знімок меню певної версії.
+
+    Знімок можна читати з будь-якого потоку без блокувань. Страви не
+    копіюються: знімок посилається на ті самі об'єкти Strava, що й меню.
+    """
+    __slots__ = ("_version", "_items", "_by_name", "_by_category")
+
+    def __init__(self, version: int, items: Dict[str, Strava], by_category: Dict[str, Dict[str, Strava]]):
+        self._version = version
+        self._by_name = MappingProxyType(dict(items))
+        self._items = tuple(self._by_name.values())
+        self._by_category = MappingProxyType({category: tuple(bucket.values())
+                                              for category, bucket in by_category.items()})
+
+    @property
+    def version(self) -> int:
+        """Повертає версію меню, з якої зроблено знімок."""
+        return self._version
+
+    @property
+    def items(self) -> tuple:
+        """Повертає страви знімка в порядку додавання."""
+        return self._items
+
+    def get(self, name: str) -> Optional[Strava]:
+        """Повертає страву за назвою або None."""
+        return self._by_name.get(name)
+
+    def by_category(self, category: str) -> tuple:
+        """Повертає страви вказаної категорії в порядку додавання."""
+        return self._by_category.get(category, ())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
 
 
 class Menu:
-    """Клас для представлення меню, що містить список страв."""
+    """Клас для представлення меню, що містить список страв.
+
+    Страви зберігаються в словнику за назвою (у порядку додавання) з
+    додатковим індексом за категорією, тож пошук і видалення виконуються за O(1).
+    Пошуковий індекс за назвою та описом (search()) оновлюється разом із меню.
+
+    Читачі отримують незмінні знімки (snapshot()) з номером версії. Кожна зміна
+    меню збільшує версію; новий знімок будує writer і публікує одним присвоєнням,
+    тож читачі ніколи не чекають і не копіюють меню. Серію змін варто робити
+    в batch(): тоді знімок будується один раз, після останньої зміни.
+    """
     def __init__(self):
-        self._items: List[Strava] = []
+        self._items: Dict[str, Strava] = {}
+        self._by_category: Dict[str, Dict[str, Strava]] = {}
+        self._category_of: Dict[str, str] = {}
+        # RLock: зміни всередині batch() беруть блокування, яке batch() уже тримає.
+        self._lock = threading.RLock()
+        self._version = 0
+        self._batch_depth = 0
+        self._snapshot = MenuSnapshot(0, {}, {})
+        self._search = MenuSearchIndex()
+
+    @property
+    def version(self) -> int:
+        """Повертає версію опублікованого знімка меню."""
+        return self._snapshot.version
+
+    def changed_since(self, version: int) -> bool:
+        """Перевіряє, чи змінювалося меню після вказаної версії."""
+        return self._snapshot.version != version
+
+    def snapshot(self) -> MenuSnapshot:
+        """Повертає незмінний знімок поточної версії меню без блокувань."""
+        return self._snapshot
+
+    @contextmanager
+    def batch(self):
+        """Групує зміни меню: знімок публікується один раз, після виходу з блоку.
+
+        Поки блок виконується, інші writer'и чекають, а читачі бачать попередній знімок.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                self._changed()
+
+    def _changed(self) -> None:
+        """Публікує знімок після зміни, якщо зміна не всередині batch(); викликається під блокуванням."""
+        if self._batch_depth == 0 and self._snapshot.version != self._version:
+            self._snapshot = MenuSnapshot(self._version, self._items, self._by_category)
 
     def add_item(self, item: Strava) -> None:
         """Додає страву до меню."""
-        self._items.append(item)
+        with self._lock:
+            if item.name in self._items:
+                raise ValueError(f"Страва '{item.name}' вже є в меню.")
+            self._items[item.name] = item
+            self._index_category(item, item.category)
+            self._search.add(item)
+            self._version += 1
+            self._changed()
 
     def remove_item(self, item: Strava) -> None:
         """Видаляє страву з меню."""
-        if item in self._items:
-            self._items.remove(item)
+        with self._lock:
+            if self._items.get(item.name) is not item:
+                return
+            del self._items[item.name]
+            self._unindex_category(item)
+            self._search.remove(item)
+            self._version += 1
+            self._changed()
+
+    def replace_item(self, item: Strava) -> None:
+        """Замінює страву з такою самою назвою, зберігаючи її місце в меню."""
+        with self._lock:
+            old = self._items.get(item.name)
+            if old is None:
+                raise ValueError(f"Страви '{item.name}' немає в меню.")
+            self._unindex_category(old)
+            self._search.remove(old)
+            self._items[item.name] = item
+            self._index_category(item, item.category)
+            self._search.add(item)
+            self._version += 1
+            self._changed()
+
+    def get(self, name: str) -> Optional[Strava]:
+        """Повертає страву за назвою або None."""
+        return self._items.get(name)
+
+    def by_category(self, category: str) -> List[Strava]:
+        """Повертає страви вказаної категорії в порядку додавання."""
+        with self._lock:
+            return list(self._by_category.get(category, {}).values())
+
+    def set_item_category(self, item: Strava, category: str) -> None:
+        """Змінює категорію страви в меню, оновлюючи індекс."""
+        Strava._check_text(category, "категорія")
+        with self._lock:
+            if self._items.get(item.name) is not item:
+                raise ValueError(f"Страви '{item.name}' немає в меню.")
+            self._unindex_category(item)
+            item.set_category(category)
+            self._index_category(item, category)
+            self._version += 1
+            self._changed()
+
+    def set_item_description(self, item: Strava, description: str) -> None:
+        """Змінює опис страви в меню, оновлюючи пошуковий індекс."""
+        Strava._check_text(description, "опис")
+        with self._lock:
+            if self._items.get(item.name) is not item:
+                raise ValueError(f"Страви '{item.name}' немає в меню.")
+            self._search.remove(item)
+            item.set_description(description)
+            self._search.add(item)
+            self._version += 1
+            self._changed()
+
+    def search(self, query: str, limit: int = 10) -> List[Strava]:
+        """Повертає до ``limit`` страв, що відповідають запиту (див. MenuSearchIndex.search)."""
+        with self._lock:
+            return self._search.search(query, limit)
+
+    def _index_category(self, item: Strava, category: str) -> None:
+        """Додає страву до індексу категорій."""
+        self._by_category.setdefault(category, {})[item.name] = item
+        self._category_of[item.name] = category
+
+    def _unindex_category(self, item: Strava) -> None:
+        """Прибирає страву з індексу категорій."""
+        category = self._category_of.pop(item.name)
+        bucket = self._by_category[category]
+        del bucket[item.name]
+        if not bucket:
+            del self._by_category[category]
 
     def get_menu_items(self):
-        return self._items  # повертаємо список об'єктів, не рядків
+        """Повертає страви поточного знімка меню (кортеж, тому змінити його неможливо)."""
+        return self.snapshot().items
+
+    def __len__(self):
+        return len(self._items)
 
     def __str__(self):
-        return ", ".join([str(item.name) for item in self._items])
+        return ", ".join([str(item.name) for item in self.snapshot()])
 
 
 class Client:
-    """Клас, що представляє клієнта, який може створювати замовлення."""
-    def __init__(self, name: str):
+    """Клас, що представляє клієнта, який може створювати замовлення.
+
+    У пам'яті тримається лише LRU-кеш останніх замовлень; старіші замовлення
+    читаються з бази даних сторінками за індексом клієнта.
+    """
+    def __init__(self, name: str, history_cache_size: int = CLIENT_HISTORY_CACHE_SIZE):
+        if history_cache_size <= 0:
+            raise ValueError("Розмір кешу історії повинен бути більше 0.")
         self._name = name
-        self._orders: List[Order] = []
+        self._recent: "OrderedDict[int, Order]" = OrderedDict()
+        self._history_cache_size = history_cache_size
+        self._db: Optional["Database"] = None
 
     @property
     def name(self):
@@ -86,24 +729,91 @@ class Client:
 
     def place_order(self, order: "Order", db: "Database", notifier: OrderNotifier) -> None:
         """Розміщує замовлення: зберігає його та повідомляє кухню."""
-        db.save_order(order)
-        notifier.notify(order)
-        self._orders.append(order)
+        with METRICS.timer("order.place"):
+            order.mark_placed()
+            with METRICS.timer("order.persist"):
+                db.save_order(order)
+            with METRICS.timer("order.notify"):
+                notifier.notify(order)
+            self._db = db
+            self._remember(order)
+        METRICS.increment("orders.placed")
 
     def get_orders(self):
-        """Повертає список усіх замовлень клієнта."""
-        return self._orders
+        """Повертає замовлення клієнта, що зараз є в кеші, від старіших до новіших."""
+        return list(self._recent.values())
+
+    def get_order(self, order_id: int, db: Optional["Database"] = None) -> Optional["Order"]:
+        """Повертає замовлення за id з кешу або з бази даних, оновлюючи LRU-кеш."""
+        if order_id in self._recent:
+            self._recent.move_to_end(order_id)
+            return self._recent[order_id]
+        db = db or self._db
+        if db is None:
+            return None
+        order = next(db.iter_client_orders(self, before_id=order_id + 1, limit=1), None)
+        if order is None or order.id != order_id:
+            return None
+        self._remember(order)
+        return order
+
+    def iter_history(self, db: Optional["Database"] = None,
+                     page_size: int = CLIENT_HISTORY_PAGE_SIZE) -> Iterator["Order"]:
+        """Віддає всю історію замовлень клієнта від новіших до старіших.
+
+        Історія читається з бази сторінками по ``page_size`` за id. Кеш лише
+        підставляє вже завантажені об'єкти: у ньому можуть бути і давні
+        замовлення (після get_order), тож межею сторінок він бути не може.
+        Прочитані з бази замовлення в кеш не потрапляють.
+        """
+        db = db or self._db
+        if db is None:
+            yield from (self._recent[order_id] for order_id in sorted(self._recent, reverse=True))
+            return
+        before_id = None
+        while True:
+            page = list(db.iter_client_orders(self, before_id=before_id, limit=page_size))
+            yield from (self._recent.get(order.id, order) for order in page)
+            if len(page) < page_size:
+                return
+            before_id = page[-1].id
+
+    def _remember(self, order: "Order") -> None:
+        """Додає замовлення в LRU-кеш і витісняє найдавніше використане."""
+        self._recent[order.id] = order
+        self._recent.move_to_end(order.id)
+        while len(self._recent) > self._history_cache_size:
+            self._recent.popitem(last=False)
+
+
+class OrderOption(IntFlag):
+    """Опції замовлення, що зберігаються як бітові прапорці."""
+    NONE = 0
+    SPECIAL = 1
 
 
 class Order:
     """Клас, що представляє замовлення клієнта."""
+    __slots__ = ("_client", "_items", "_options", "_status", "_id", "_placed", "_total", "_rendered", "_index",
+                 "__weakref__")
+
     def __init__(self, client: Client, items: List[Strava]):
         if client is None:
             raise TypeError("Клієнт не може бути None")
         self._client = client
-        self._items = items
-        self._options = []
-        self._status = "Очікується"
+        self._items = tuple(items)
+        self._options = OrderOption.NONE
+        self._status = STATUS_PENDING
+        self._id: Optional[int] = None
+        self._placed = False
+        self._total: Optional[int] = None
+        self._rendered: Optional[str] = None
+        self._index: Optional["OrderStatusIndex"] = None
+
+    @property
+    def id(self):
+        """Повертає ідентифікатор замовлення в базі даних (None, доки не збережене)."""
+        return self._id
 
     @property
     def client(self):
@@ -112,40 +822,83 @@ class Order:
 
     @property
     def items(self):
-        """Повертає список страв у замовленні."""
+        """Повертає кортеж страв у замовленні."""
         return self._items
 
+    @property
+    def total_kop(self) -> int:
+        """Повертає суму замовлення в копійках (обчислюється один раз)."""
+        if self._total is None:
+            self._total = sum(item.price_kop for item in self._items)
+        return self._total
+
+    @property
+    def total(self) -> float:
+        """Повертає суму замовлення в гривнях."""
+        return self.total_kop / KOPECKS_PER_UAH
+
+    def add_item(self, item: Strava) -> None:
+        """Додає страву до замовлення, доки воно ще не розміщене."""
+        if self._placed:
+            raise RuntimeError("Замовлення вже розміщене, його склад змінювати не можна.")
+        self._items += (item,)
+        self._total = None
+        self._rendered = None
+
+    def mark_placed(self) -> None:
+        """Фіксує склад замовлення перед розміщенням."""
+        self._placed = True
+
     def add_option(self, option: str):
         """Додає опцію до замовлення (наприклад, "special")."""
-        self._options.append(option)
+        try:
+            self._options |= OrderOption[option.upper()]
+        except KeyError:
+            raise ValueError(f"Невідома опція замовлення: {option}") from None
+
+    def has_option(self, option: OrderOption) -> bool:
+        """Перевіряє, чи має замовлення вказану опцію."""
+        return bool(self._options & option)
 
     def set_status(self, status: str):
-        """Встановлює статус замовлення."""
-        self._status = status
+        """Встановлює статус замовлення.
+
+        Якщо замовлення в індексі статусів, оновлює індекс і ставить зміну в чергу запису до бази.
+        """
+        self._change_status(status, persisted=False)
+
+    def _change_status(self, status: str, persisted: bool) -> None:
+        previous, self._status = self._status, status
+        if self._index is not None and previous != status:
+            self._index._moved(self, previous, persisted)
 
     def get_status(self):
         """Повертає поточний статус замовлення."""
         return self._status
 
     def __str__(self):
-        item_list = ', '.join(f"{item.name} ({item.price} грн)" for item in self._items)
-        return f"Замовлення для {self._client.name}: {item_list}"
+        if self._rendered is None:
+            item_list = ', '.join(f"{item.name} ({item.price_text} грн)" for item in self._items)
+            self._rendered = f"Замовлення для {self._client.name}: {item_list}"
+        return self._rendered
 
 
 class NormalOrder(Order):
     """Звичайне замовлення без додаткових опцій."""
-    pass
+    __slots__ = ()
 
 
 class SpecialOrder(Order):
     """Особливе замовлення з опцією 'special'."""
+    __slots__ = ()
+
     def __init__(self, client: Client, items: List[Strava]):
         super().__init__(client, items)
-        self.add_option("special")
+        self._options |= OrderOption.SPECIAL
 
     @property
     def special(self):
-        return "special" in self._options
+        return self.has_option(OrderOption.SPECIAL)
 
 
 class OrderFactory:
@@ -153,12 +906,173 @@ class OrderFactory:
     @staticmethod
     def create_order(order_type: str, client: Client, items: List[Strava]) -> Order:
         """Створює замовлення відповідно до зазначеного типу."""
-        if order_type == ORDER_TYPE_NORMAL:
-            return NormalOrder(client, items)
-        elif order_type == ORDER_TYPE_SPECIAL:
-            return SpecialOrder(client, items)
+        with METRICS.timer("order.create"):
+            if order_type == ORDER_TYPE_NORMAL:
+                return NormalOrder(client, items)
+            elif order_type == ORDER_TYPE_SPECIAL:
+                return SpecialOrder(client, items)
+            else:
+                raise ValueError("Невідомий тип замовлення")
+
+
+class OpenOrder(NamedTuple):
+    """Запис індексу статусів: відкрите замовлення без самого об'єкта Order."""
+    id: int
+    client: str
+    status: str
+
+
+class OrderStatusIndex:
+    """Індекс відкритих замовлень у пам'яті: статус -> {id: OpenOrder}.
+
+    Індекс тримає невеликі записи OpenOrder, а не самі замовлення, тож відкрите
+    замовлення лишається в індексі, навіть коли об'єкт Order уже ніхто не використовує.
+    Готові замовлення з індексу видаляються. Замовлення, додане через track(), саме
+    повідомляє індекс про зміну статусу, тому індекс актуальний і для переходів,
+    які робить KitchenScheduler.
+
+    Переходи, які ще не записані в базу, індекс накопичує як id -> (клієнт, статус)
+    і повідомляє про них on_pending; сховище записує їх пачкою (OrderStore.flush_status).
+    """
+    def __init__(self, on_pending: Optional[Callable[[], None]] = None):
+        self._lock = threading.Lock()
+        self._by_status: Dict[str, Dict[int, OpenOrder]] = {status: {} for status in OPEN_STATUSES}
+        # Живі об'єкти Order індекс знає лише для того, щоб transition_status оновив і їх.
+        self._live: "weakref.WeakValueDictionary[int, Order]" = weakref.WeakValueDictionary()
+        self._pending: Dict[int, Tuple[str, str]] = {}
+        self._on_pending = on_pending
+
+    def track(self, order: Order) -> None:
+        """Додає збережене замовлення до індексу."""
+        if order.id is None:
+            raise ValueError("Замовлення ще не збережене, індексувати його неможливо.")
+        with self._lock:
+            order._index = self
+            self._add(order)
+
+    def _add(self, order: Order) -> None:
+        bucket = self._by_status.get(order.get_status())
+        if bucket is None:
+            order._index = None
+            self._live.pop(order.id, None)
         else:
-            raise ValueError("Невідомий тип замовлення")
+            bucket[order.id] = OpenOrder(order.id, order.client.name, order.get_status())
+            self._live[order.id] = order
+
+    def _moved(self, order: Order, previous: str, persisted: bool) -> None:
+        """Переносить замовлення між статусами; викликається з Order.set_status."""
+        with self._lock:
+            bucket = self._by_status.get(previous)
+            if bucket is not None:
+                bucket.pop(order.id, None)
+            if persisted:
+                self._pending.pop(order.id, None)
+            else:
+                self._pending[order.id] = (order.client.name, order.get_status())
+            self._add(order)
+        if not persisted and self._on_pending is not None:
+            self._on_pending()
+
+    def _transitioned(self, from_status: str, to_status: str) -> None:
+        """Переносить усі записи зі статусу from_status у to_status, уже записаний у базу."""
+        with self._lock:
+            moved = self._by_status.get(from_status)
+            if not moved:
+                return
+            self._by_status[from_status] = {}
+            target = self._by_status.get(to_status)
+            for order_id, record in moved.items():
+                if target is not None:
+                    target[order_id] = record._replace(status=to_status)
+                order = self._live.get(order_id) if target is not None else self._live.pop(order_id, None)
+                if order is not None:
+                    order._status = to_status
+                    if target is None:
+                        order._index = None
+
+    def pending_status(self) -> Dict[int, Tuple[str, str]]:
+        """Повертає знімок переходів, ще не записаних у базу: id -> (клієнт, статус)."""
+        with self._lock:
+            return dict(self._pending)
+
+    def _persisted(self, written: Dict[int, Tuple[str, str]]) -> None:
+        """Знімає з черги записані переходи, якщо замовлення відтоді не змінило статус."""
+        with self._lock:
+            for order_id, change in written.items():
+                if self._pending.get(order_id) == change:
+                    del self._pending[order_id]
+
+    def orders(self, *statuses: str) -> List[OpenOrder]:
+        """Повертає записи замовлень з указаними статусами (за замовчуванням — усі відкриті).
+
+        У межах статусу замовлення йдуть у порядку, в якому отримали цей статус.
+        """
+        with self._lock:
+            return [order for status in statuses or OPEN_STATUSES if status in self._by_status
+                    for order in self._by_status[status].values()]
+
+    def counts(self) -> Dict[str, int]:
+        """Повертає кількість відкритих замовлень за статусами."""
+        with self._lock:
+            return {status: len(orders) for status, orders in self._by_status.items()}
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(orders) for orders in self._by_status.values())
+
+
+class StatusFlusher:
+    """Фоновий потік, що записує переходи статусів пачками.
+
+    schedule() будить потік; той чекає ``delay`` секунд, збираючи інші переходи,
+    і викликає ``flush`` власника. Так переходи, які робить кухня, потрапляють
+    у базу без транзакції на кожен перехід і без запису під час читання.
+    """
+    def __init__(self, flush: Callable[[], int], delay: float = STATUS_FLUSH_DELAY):
+        if delay < 0:
+            raise ValueError("Затримка не може бути від'ємною.")
+        self._flush = flush
+        self._delay = delay
+        self._wake = threading.Condition()
+        self._requested = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self) -> None:
+        """Просить записати переходи; потік запускається під час першого виклику."""
+        with self._wake:
+            if self._closed:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="status-flush", daemon=True)
+                self._thread.start()
+            self._requested = True
+            self._wake.notify()
+
+    def _run(self):
+        while True:
+            with self._wake:
+                self._wake.wait_for(lambda: self._requested or self._closed)
+                # Затримка збирає в пачку переходи, що надійдуть слідом.
+                self._wake.wait_for(lambda: self._closed, timeout=self._delay)
+                if self._closed:
+                    return
+                self._requested = False
+            try:
+                self._flush()
+            except Exception:
+                METRICS.increment("db.status_flush_errors")
+                with self._wake:
+                    self._requested = True
+
+    def close(self) -> None:
+        """Зупиняє потік; решту переходів власник записує сам під час close()."""
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
 
 
 class Kitchen:
@@ -166,70 +1080,1889 @@ class Kitchen:
     def update(self, order: Order):
         """Оновлює стан замовлення при надходженні на кухню."""
         print(f"Нове замовлення на кухні: {order}")
-        order.set_status("Готується")
+        order.set_status(STATUS_COOKING)
+
+
+class SchedulerStats(NamedTuple):
+    """Знімок стану планувальника кухні."""
+    queue_depth: int
+    busy_stations: int
+    completed: int
+    failed: int
+    avg_wait: float
+    p95_wait: float
+    max_wait: float
+
+
+class CookFailure(NamedTuple):
+    """Замовлення, яке станція не змогла приготувати, і виняток від cook."""
+    order_id: Optional[int]
+    error: str
+    traceback: str
+
+
+class KitchenScheduler:
+    """Планувальник кухні з пріоритетною чергою та кількома паралельними станціями.
+
+    Підписується на KitchenNotifier так само, як Kitchen. Особливі замовлення
+    обслуговуються раніше за звичайні, а в межах пріоритету — в порядку
+    надходження. Статус замовлення проходить "У черзі" -> "Готується" -> "Готово";
+    якщо ``cook`` кидає виняток, замовлення отримує статус "Не вдалося",
+    а виняток зберігається у failures().
+
+    Станції працюють у фонових (daemon) потоках: якщо close() не викликали,
+    програма все одно завершиться, а замовлення з черги не будуть приготовані.
+    """
+    PRIORITY_SPECIAL = 0
+    PRIORITY_NORMAL = 1
+    _PRIORITY_STOP = 2
+    WAIT_SAMPLE_SIZE = 1000
+    FAILURE_SAMPLE_SIZE = 100
+
+    def __init__(self, stations: int = 2, cook: Optional[Callable[[Order], None]] = None):
+        if stations <= 0:
+            raise ValueError("Кількість станцій повинна бути більше 0.")
+        self._stations = stations
+        self._cook = cook
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._sequence = count()
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_times: "deque[float]" = deque(maxlen=self.WAIT_SAMPLE_SIZE)
+        self._failures: "deque[CookFailure]" = deque(maxlen=self.FAILURE_SAMPLE_SIZE)
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run_station, name=f"station-{i}", daemon=True)
+                         for i in range(stations)]
+        for thread in self._threads:
+            thread.start()
+
+    def update(self, order: Order):
+        """Ставить замовлення в чергу кухні."""
+        if self._closed:
+            raise RuntimeError("Планувальник уже зупинено.")
+        priority = self.PRIORITY_SPECIAL if order.has_option(OrderOption.SPECIAL) else self.PRIORITY_NORMAL
+        order.set_status(STATUS_QUEUED)
+        self._queue.put((priority, next(self._sequence), time.monotonic(), order))
+
+    def queue_depth(self) -> int:
+        """Повертає кількість замовлень, що чекають на вільну станцію."""
+        return self._queue.qsize()
+
+    def stats(self) -> SchedulerStats:
+        """Повертає глибину черги, зайнятість станцій і час очікування замовлень."""
+        with self._lock:
+            waits = sorted(self._wait_times)
+            busy, completed, failed = self._busy, self._completed, self._failed
+        if waits:
+            avg_wait = sum(waits) / len(waits)
+            p95_wait = waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+            max_wait = waits[-1]
+        else:
+            avg_wait = p95_wait = max_wait = 0.0
+        return SchedulerStats(self.queue_depth(), busy, completed, failed, avg_wait, p95_wait, max_wait)
+
+    def failures(self) -> List[CookFailure]:
+        """Повертає останні невдачі приготування (не більше FAILURE_SAMPLE_SIZE)."""
+        with self._lock:
+            return list(self._failures)
+
+    def close(self) -> None:
+        """Доготовлює всі замовлення з черги та зупиняє станції."""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in range(self._stations):
+            self._queue.put((self._PRIORITY_STOP, next(self._sequence), 0.0, None))
+        for thread in self._threads:
+            thread.join()
+
+    def _run_station(self):
+        """Цикл однієї станції: бере замовлення з найвищим пріоритетом і готує його."""
+        while True:
+            _, _, enqueued_at, order = self._queue.get()
+            if order is None:
+                return
+            with self._lock:
+                self._busy += 1
+                self._wait_times.append(time.monotonic() - enqueued_at)
+            order.set_status(STATUS_COOKING)
+            try:
+                if self._cook is not None:
+                    self._cook(order)
+            except Exception as error:
+                order.set_status(STATUS_FAILED)
+                with self._lock:
+                    self._failed += 1
+                    self._failures.append(CookFailure(order.id, repr(error), traceback.format_exc()))
+            else:
+                order.set_status(STATUS_READY)
+                with self._lock:
+                    self._completed += 1
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+
+EVENT_SUBSCRIBED = "Subscribed"
+EVENT_UNSUBSCRIBED = "Unsubscribed"
+EVENT_ORDER_NOTIFIED = "Order Notified"
+EVENT_SUBSCRIBER_TIMEOUT = "Subscriber timed out"
+EVENT_SUBSCRIBER_FAILED = "Subscriber failed"
+
+
+class LogRecord(NamedTuple):
+    """Структурований запис журналу оповіщувача."""
+    event: str
+    order_id: Optional[int]
+    timestamp: float
+    detail: Optional[str] = None
+
+    def format(self) -> str:
+        """Повертає запис у вигляді рядка журналу."""
+        parts = []
+        if self.order_id is not None:
+            parts.append(f"#{self.order_id}")
+        if self.detail:
+            parts.append(self.detail)
+        return f"{self.event}: {' '.join(parts)}" if parts else self.event
+
+
+class JsonLinesLogSink:
+    """Дописує записи журналу у файл JSON Lines."""
+    def __init__(self, path: str):
+        self._path = path
+
+    def write(self, records: List[LogRecord]) -> None:
+        """Записує пачку записів у кінець файлу."""
+        with open(self._path, "a", encoding="utf-8") as file:
+            for record in records:
+                file.write(json.dumps(record._asdict(), ensure_ascii=False) + "\n")
+
+
+class SqliteLogSink:
+    """Зберігає записи журналу в таблицю notifier_log бази SQLite."""
+    def __init__(self, path: str):
+        # З'єднання спільне для потоків, тому кожен запис іде під блокуванням.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS notifier_log (
+                event TEXT NOT NULL,
+                order_id INTEGER,
+                timestamp REAL NOT NULL,
+                detail TEXT
+            )
+        """)
+        self._conn.commit()
+
+    def write(self, records: List[LogRecord]) -> None:
+        """Записує пачку записів однією транзакцією."""
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO notifier_log (event, order_id, timestamp, detail) VALUES (?, ?, ?, ?)",
+                                   records)
+
+
+_LOG_WRITER: Optional[ThreadPoolExecutor] = None
+_LOG_WRITER_LOCK = threading.Lock()
+
+
+def _log_writer() -> ThreadPoolExecutor:
+    """Повертає спільний фоновий потік, який пише пачки журналів у sink."""
+    global _LOG_WRITER
+    with _LOG_WRITER_LOCK:
+        if _LOG_WRITER is None:
+            _LOG_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-log")
+        return _LOG_WRITER
+
+
+class EventLog:
+    """Кільцевий буфер записів журналу фіксованої місткості.
+
+    Записи зберігаються як кортежі й форматуються лише під час читання.
+    Якщо задано ``sink``, записи додатково скидаються в нього пачками у
+    фоновому потоці, тож append не чекає на sink і не отримує його помилок.
+    Пачка, яку sink не прийняв, повертається в чергу на повтор; черга не
+    більша за ``capacity``, найстаріші записи понад неї відкидаються й
+    рахуються в ``dropped``.
+    """
+    def __init__(self, capacity: int = 1000, sink=None, sink_batch_size: int = 100):
+        if capacity <= 0:
+            raise ValueError("Місткість журналу повинна бути більше 0.")
+        self._records: "deque[LogRecord]" = deque(maxlen=capacity)
+        self._sink = sink
+        self._sink_batch_size = sink_batch_size
+        self._pending: "deque[LogRecord]" = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        # Серіалізує виклики sink: фоновий запис і flush() не пишуть одночасно.
+        self._write_lock = threading.Lock()
+        self._writing = False
+        self._retry_at = 0.0
+        self.dropped = 0
+        self.sink_errors = 0
+        self.last_sink_error: Optional[BaseException] = None
+
+    def append(self, event: str, order_id: Optional[int] = None, detail: Optional[str] = None) -> None:
+        """Додає запис; найстаріший запис витісняється, якщо буфер заповнений."""
+        record = LogRecord(event, order_id, time.time(), detail)
+        self._records.append(record)
+        if self._sink is None:
+            return
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(record)
+            if (self._writing or len(self._pending) < self._sink_batch_size
+                    or time.monotonic() < self._retry_at):
+                return
+            self._writing = True
+        _log_writer().submit(self._drain)
+
+    def _drain(self) -> None:
+        """Фоново пише повні пачки, доки вони є або доки sink не відмовить."""
+        try:
+            while True:
+                with self._lock:
+                    if len(self._pending) < self._sink_batch_size:
+                        return
+                if not self._write_pending():
+                    return
+        finally:
+            with self._lock:
+                self._writing = False
+
+    def _write_pending(self) -> bool:
+        """Пише в sink усі записи з черги; у разі помилки повертає їх у чергу."""
+        with self._write_lock:
+            with self._lock:
+                batch = list(self._pending)
+                self._pending.clear()
+            if not batch:
+                return True
+            try:
+                self._sink.write(batch)
+            except Exception as error:
+                with self._lock:
+                    self.sink_errors += 1
+                    self.last_sink_error = error
+                    self._retry_at = time.monotonic() + LOG_SINK_RETRY_DELAY
+                    room = self._pending.maxlen - len(self._pending)
+                    kept = batch[max(0, len(batch) - room):]
+                    self.dropped += len(batch) - len(kept)
+                    self._pending.extendleft(reversed(kept))
+                return False
+            return True
+
+    def flush(self) -> bool:
+        """Скидає в sink записи, що ще не були записані, у потоці, що викликає.
+
+        Повертає False, якщо sink кинув виняток (записи лишаються в черзі).
+        """
+        if self._sink is None:
+            return True
+        return self._write_pending()
+
+    def records(self) -> List[LogRecord]:
+        """Повертає копію записів, що зараз у буфері."""
+        return list(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+
+class OrderSlice:
+    """Частина замовлення для однієї станції: лише страви її категорій.
+
+    Поводиться як Order для підписників (id, client, items, has_option,
+    статус), а статус змінює в цілому замовленні.
+    """
+    __slots__ = ("_order", "_items")
+
+    def __init__(self, order: Order, items: Iterable[Strava]):
+        self._order = order
+        self._items = tuple(items)
+
+    @property
+    def order(self) -> Order:
+        """Повертає повне замовлення."""
+        return self._order
+
+    @property
+    def id(self):
+        return self._order.id
+
+    @property
+    def client(self):
+        return self._order.client
+
+    @property
+    def items(self):
+        """Повертає страви, що стосуються станції."""
+        return self._items
+
+    @property
+    def total_kop(self) -> int:
+        return sum(item.price_kop for item in self._items)
+
+    def has_option(self, option: OrderOption) -> bool:
+        return self._order.has_option(option)
+
+    def set_status(self, status: str):
+        self._order.set_status(status)
+
+    def get_status(self):
+        return self._order.get_status()
+
+    def __str__(self):
+        item_list = ', '.join(f"{item.name} ({item.price_text} грн)" for item in self._items)
+        return f"Замовлення для {self._order.client.name}: {item_list}"
+
+
+class Subscription(NamedTuple):
+    """Підписка на оповіщення: None у фільтрі означає «усі».
+
+    ``name`` — стабільне ім'я підписника в метриках notify.subscriber.<name>.
+    """
+    subscriber: object
+    categories: Optional[frozenset]
+    order_types: Optional[frozenset]
+    name: str = ""
+
+
+def order_type_of(order: Order) -> str:
+    """Повертає тип замовлення (ORDER_TYPE_NORMAL або ORDER_TYPE_SPECIAL)."""
+    return ORDER_TYPE_SPECIAL if order.has_option(OrderOption.SPECIAL) else ORDER_TYPE_NORMAL
 
 
 class KitchenNotifier(OrderNotifier):
-    """Клас-оповіщувач, який інформує кухню про нові замовлення."""
-    def __init__(self):
-        self._subscribers = []
-        self._logs = []
+    """Клас-оповіщувач, який інформує кухню про нові замовлення.
 
-    def subscribe(self, observer: Kitchen):
-        """Додає кухню до списку підписників."""
-        self._subscribers.append(observer)
-        self._log(f"Subscribed: {observer}")
+    Підписник може обмежитися категоріями страв та/або типами замовлень.
+    Підписники тримаються в індексах за категорією й типом, тож розсилка
+    перебирає лише станції, яких стосується замовлення. Станція з фільтром
+    категорій отримує OrderSlice лише з її стравами, інші — повне замовлення.
+    """
+    def __init__(self, log_capacity: int = 1000, log_sink=None):
+        self._subscribers: Dict[object, Subscription] = {}
+        self._broadcast: Dict[object, None] = {}
+        self._by_category: Dict[str, Dict[object, None]] = {}
+        self._by_order_type: Dict[str, Dict[object, None]] = {}
+        self._subscribers_lock = threading.Lock()
+        # Скільки підписників кожного класу вже отримали ім'я для метрик.
+        self._registrations: Dict[type, Iterator[int]] = {}
+        self._events = EventLog(log_capacity, log_sink)
+
+    @property
+    def logs(self) -> List[str]:
+        """Повертає записи журналу у вигляді рядків."""
+        return [record.format() for record in self._events.records()]
+
+    @property
+    def log_records(self) -> List[LogRecord]:
+        """Повертає структуровані записи журналу."""
+        return self._events.records()
+
+    def subscribe(self, observer: Kitchen, categories: Optional[Iterable[str]] = None,
+                  order_types: Optional[Iterable[str]] = None):
+        """Додає кухню до списку підписників.
+
+        ``categories`` обмежує підписку стравами цих категорій, ``order_types`` —
+        замовленнями цих типів; без фільтрів кухня отримує всі замовлення.
+        Час доставки кожному підписнику пишеться в метрику notify.subscriber.<ім'я>:
+        ім'я береться з атрибута ``name`` підписника, інакше це клас і номер
+        реєстрації (Kitchen.0, Kitchen.1, ...).
+        """
+        subscription = Subscription(observer, None if categories is None else frozenset(categories),
+                                    None if order_types is None else frozenset(order_types))
+        unknown = (subscription.order_types or frozenset()) - {ORDER_TYPE_NORMAL, ORDER_TYPE_SPECIAL}
+        if unknown:
+            raise ValueError(f"Невідомий тип замовлення: {', '.join(sorted(unknown))}")
+        with self._subscribers_lock:
+            previous = self._subscribers.pop(observer, None)
+            if previous is not None:
+                self._unindex(previous)
+                name = previous.name
+            else:
+                name = getattr(observer, "name", None)
+                if not isinstance(name, str) or not name:
+                    numbers = self._registrations.setdefault(type(observer), count())
+                    name = f"{type(observer).__name__}.{next(numbers)}"
+            subscription = subscription._replace(name=name)
+            self._subscribers[observer] = subscription
+            index, keys = self._index_of(subscription)
+            if index is None:
+                self._broadcast[observer] = None
+            for key in keys:
+                index.setdefault(key, {})[observer] = None
+        self._log(EVENT_SUBSCRIBED, detail=str(observer))
 
     def unsubscribe(self, observer: Kitchen):
         """Видаляє кухню зі списку підписників."""
-        self._subscribers.remove(observer)
-        self._log(f"Unsubscribed: {observer}")
+        with self._subscribers_lock:
+            subscription = self._subscribers.pop(observer, None)
+            if subscription is None:
+                raise ValueError("Кухня не підписана на оповіщення.")
+            self._unindex(subscription)
+        self._log(EVENT_UNSUBSCRIBED, detail=str(observer))
+
+    def _index_of(self, subscription: Subscription):
+        """Повертає індекс підписки та її ключі в ньому (None — підписка на все)."""
+        if subscription.categories is not None:
+            return self._by_category, subscription.categories
+        if subscription.order_types is not None:
+            return self._by_order_type, subscription.order_types
+        return None, ()
+
+    def _unindex(self, subscription: Subscription) -> None:
+        """Прибирає підписку з індексів."""
+        index, keys = self._index_of(subscription)
+        if index is None:
+            del self._broadcast[subscription.subscriber]
+        for key in keys:
+            bucket = index[key]
+            del bucket[subscription.subscriber]
+            if not bucket:
+                del index[key]
+
+    def _routes(self, order: Order) -> List[tuple]:
+        """Повертає пари (підписник, що йому надіслати) для замовлення."""
+        order_type = order_type_of(order)
+        categories = {item.category for item in order.items}
+        with self._subscribers_lock:
+            routes = [(subscriber, order) for subscriber in self._broadcast]
+            routes += [(subscriber, order) for subscriber in self._by_order_type.get(order_type, ())]
+            matched: Dict[object, None] = {}
+            for category in categories:
+                matched.update(self._by_category.get(category, {}))
+            subscriptions = [self._subscribers[subscriber] for subscriber in matched]
+        for subscription in subscriptions:
+            if subscription.order_types is not None and order_type not in subscription.order_types:
+                continue
+            items = [item for item in order.items if item.category in subscription.categories]
+            routes.append((subscription.subscriber, OrderSlice(order, items)))
+        return routes
 
     def notify(self, order: Order):
-        """Надсилає повідомлення всім підписникам про нове замовлення."""
-        for subscriber in self._subscribers:
+        """Надсилає замовлення (або його частину) підписникам, яких воно стосується."""
+        routes = self._routes(order)
+        if METRICS.enabled:
+            for subscriber, payload in routes:
+                self._timed_update(subscriber, payload)
+        else:
+            for subscriber, payload in routes:
+                subscriber.update(payload)
+        self._log(EVENT_ORDER_NOTIFIED, order, order.client.name)
+
+    def _timed_update(self, subscriber, order: Order):
+        """Викликає update підписника, вимірюючи тривалість під його ім'ям, якщо метрики ввімкнено."""
+        if not METRICS.enabled:
+            subscriber.update(order)
+            return
+        subscription = self._subscribers.get(subscriber)
+        name = subscription.name if subscription is not None else type(subscriber).__name__
+        with METRICS.timer(f"notify.subscriber.{name}"):
             subscriber.update(order)
-        self._log(f"Order Notified: {order}")
 
-    def _log(self, message: str):
-        """Логує повідомлення."""
-        self._logs.append(message)
+    def flush_logs(self) -> bool:
+        """Скидає накопичені записи журналу в sink; повертає False, якщо sink відмовив."""
+        return self._events.flush()
 
+    def _log(self, event: str, order: Optional[Order] = None, detail: Optional[str] = None):
+        """Логує подію."""
+        self._events.append(event, order.id if order is not None else None, detail)
 
-class Database:
-    """Singleton-клас для збереження замовлень у базу даних SQLite."""
-    _instance = None
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(Database, cls).__new__(cls)
-            cls._instance._init_connection()
-        return cls._instance
+class NotifierOverloadedError(RuntimeError):
+    """Черга асинхронного оповіщувача переповнена."""
+
+
+class _Delivery:
+    """Замовлення в роботі асинхронного оповіщувача: скільком чергам його ще не віддано."""
+    __slots__ = ("order", "remaining")
+
+    def __init__(self, order: Order, remaining: int):
+        self.order = order
+        self.remaining = remaining
+
+
+class _DeliveryLane:
+    """Черга доставки одного підписника асинхронного оповіщувача."""
+    __slots__ = ("pending", "started")
+
+    def __init__(self):
+        self.pending: "deque[tuple]" = deque()
+        self.started: Optional[float] = None
+
+
+class AsyncKitchenNotifier(KitchenNotifier):
+    """Оповіщувач, який доставляє замовлення підписникам у фонових потоках.
+
+    ``notify`` лише кладе замовлення в чергу, тому час розміщення замовлення
+    не залежить від кількості та швидкості підписників.
+
+    Кожен підписник має власну чергу доставки, і в роботі в нього щонайбільше
+    одна доставка, тож повільний або завислий підписник займає не більше
+    одного з ``workers`` потоків і не затримує інших. Поки доставка триває
+    довше за ``subscriber_timeout``, черга цього підписника скидається, а нові
+    замовлення йому не надсилаються — усе це логується як таймаут.
+
+    ``max_queue_size`` обмежує кількість замовлень, які ще не доставлені всім
+    підписникам, разом із тими, що чекають у чергах підписників. Коли ліміт
+    вичерпано, ``notify`` кидає NotifierOverloadedError, тож повільний
+    підписник зупиняє прийом нових замовлень, а не накопичує їх без меж.
+    """
+    def __init__(self, max_queue_size: int = 1000, workers: int = 4,
+                 subscriber_timeout: float = 1.0, enqueue_timeout: float = 0.0,
+                 log_capacity: int = 1000, log_sink=None):
+        super().__init__(log_capacity, log_sink)
+        if max_queue_size <= 0:
+            raise ValueError("Розмір черги повинен бути більше 0.")
+        # Межу тримає лічильник _backlog, тож сама черга до диспетчера не обмежена.
+        self._queue: "queue.Queue" = queue.Queue()
+        self._max_backlog = max_queue_size
+        self._backlog = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notifier")
+        self._subscriber_timeout = subscriber_timeout
+        self._enqueue_timeout = enqueue_timeout
+        # Підписник -> його черга; черга існує, доки в підписника є недоставлені замовлення.
+        self._lanes: Dict[object, _DeliveryLane] = {}
+        self._lanes_lock = threading.Lock()
+        # Захищає _backlog і _closed; на ній notify чекає на вільне місце.
+        self._space = threading.Condition()
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="notifier-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def notify(self, order: Order):
+        """Ставить замовлення в чергу на доставку.
+
+        Якщо ліміт ``max_queue_size`` вичерпано довше за ``enqueue_timeout``,
+        кидає NotifierOverloadedError.
+        """
+        with self._space:
+            if self._closed:
+                raise RuntimeError("Оповіщувач уже зупинено.")
+            if not self._space.wait_for(lambda: self._closed or self._backlog < self._max_backlog,
+                                        timeout=self._enqueue_timeout):
+                raise NotifierOverloadedError("Черга сповіщень переповнена")
+            if self._closed:
+                raise RuntimeError("Оповіщувач уже зупинено.")
+            self._backlog += 1
+            self._queue.put_nowait(order)
+
+    def pending(self) -> int:
+        """Повертає кількість замовлень, які ще не доставлені всім підписникам."""
+        with self._space:
+            return self._backlog
+
+    def close(self, timeout: float = 30.0) -> bool:
+        """Припиняє приймати замовлення, доставляє всі з черги та зупиняє потоки.
+
+        Чекає на доставку не довше ``timeout`` секунд; після цього недоставлені
+        замовлення скасовуються, а завислі доставки лишаються у своїх потоках.
+        Повертає True, якщо всі замовлення доставлено.
+        """
+        deadline = time.monotonic() + timeout
+        with self._space:
+            if self._closed:
+                return self._backlog == 0
+            self._closed = True
+            self._queue.put_nowait(None)
+            self._space.notify_all()
+        self._dispatcher.join(timeout)
+        with self._space:
+            delivered = self._space.wait_for(lambda: self._backlog == 0,
+                                             timeout=max(0.0, deadline - time.monotonic()))
+        self._executor.shutdown(wait=delivered, cancel_futures=not delivered)
+        self.flush_logs()
+        return delivered
+
+    def _dispatch(self):
+        """Цикл фонового потоку: бере замовлення з черги та розкладає по чергах підписників."""
+        while True:
+            order = self._queue.get()
+            if order is None:
+                return
+            routes = self._routes(order)
+            # Зайва одиниця тримає замовлення в ліміті, доки його не розкладено по всіх чергах.
+            delivery = _Delivery(order, len(routes) + 1)
+            try:
+                for subscriber, payload in routes:
+                    self._enqueue(subscriber, payload, delivery)
+                self._log(EVENT_ORDER_NOTIFIED, order, order.client.name)
+            finally:
+                self._release(delivery)
+
+    def _release(self, delivery: _Delivery) -> None:
+        """Позначає одну доставку замовлення завершеною; остання звільняє місце в ліміті."""
+        with self._space:
+            delivery.remaining -= 1
+            if delivery.remaining == 0:
+                self._backlog -= 1
+                self._space.notify_all()
+
+    def _enqueue(self, subscriber, payload, delivery: _Delivery) -> None:
+        """Додає замовлення в чергу підписника і запускає доставку, якщо вона не йде.
+
+        Якщо поточна доставка підписнику триває довше за таймаут, скидає і це
+        замовлення, і всю його чергу.
+        """
+        start, dropped = False, []
+        with self._lanes_lock:
+            lane = self._lanes.get(subscriber)
+            if (lane is not None and lane.started is not None
+                    and time.monotonic() - lane.started > self._subscriber_timeout):
+                dropped = [delivery] + [queued for _, queued in lane.pending]
+                lane.pending.clear()
+            else:
+                start = lane is None
+                if start:
+                    lane = self._lanes[subscriber] = _DeliveryLane()
+                lane.pending.append((payload, delivery))
+        for skipped in dropped:
+            self._log(EVENT_SUBSCRIBER_TIMEOUT, skipped.order, str(subscriber))
+            self._release(skipped)
+        if start:
+            self._executor.submit(self._deliver_next, subscriber, lane)
+
+    def _deliver_next(self, subscriber, lane: _DeliveryLane):
+        """Доставляє підписнику наступне замовлення з його черги.
+
+        Якщо в черзі ще є замовлення, доставка ставиться в пул знову, а не йде
+        в циклі, тож підписники з чергами по черзі ділять потоки пулу.
+        """
+        with self._lanes_lock:
+            payload, delivery = lane.pending.popleft()
+            lane.started = time.monotonic()
+        try:
+            self._timed_update(subscriber, payload)
+        except Exception as error:
+            self._log(EVENT_SUBSCRIBER_FAILED, delivery.order, f"{subscriber}: {error!r}")
+        with self._lanes_lock:
+            elapsed = time.monotonic() - lane.started
+            lane.started = None
+            more = bool(lane.pending)
+            if not more:
+                del self._lanes[subscriber]
+        if elapsed > self._subscriber_timeout:
+            self._log(EVENT_SUBSCRIBER_TIMEOUT, delivery.order, str(subscriber))
+        if more:
+            self._executor.submit(self._deliver_next, subscriber, lane)
+        self._release(delivery)
+
+
+class GroupCommitter:
+    """Збирає замовлення з різних потоків у спільні транзакції (group commit).
+
+    Замовлення накопичуються, доки не мине ``max_delay`` секунд від першого
+    замовлення в пачці або доки пачка не досягне ``max_batch_size``. Кожен
+    виклик ``submit`` отримує ``Future``, який завершується після коміту.
+    Поки group commit увімкнено, сховище комітить із synchronous не нижче FULL,
+    тож завершений Future означає, що пачка записана на диск.
+    """
+    def __init__(self, db: "Database", max_batch_size: int = 64, max_delay: float = 0.005):
+        if max_batch_size <= 0:
+            raise ValueError("Розмір пачки повинен бути більше 0.")
+        if max_delay < 0:
+            raise ValueError("Затримка не може бути від'ємною.")
+        self._db = db
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._state_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, order: "Order") -> Future:
+        """Ставить замовлення в чергу; Future завершиться, коли воно буде збережене."""
+        future: Future = Future()
+        with self._state_lock:
+            if self._closed:
+                raise RuntimeError("Group commit вже зупинено.")
+            self._queue.put((order, future))
+        return future
+
+    def close(self) -> None:
+        """Зберігає всі замовлення з черги та зупиняє фоновий потік."""
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        """Цикл фонового потоку: формує пачки та комітить їх."""
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            batch = [entry]
+            deadline = time.monotonic() + self._max_delay
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        """Зберігає пачку однією транзакцією та повідомляє кожного відправника."""
+        try:
+            self._db.save_orders(order for order, _ in batch)
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+        else:
+            for _, future in batch:
+                future.set_result(None)
+
+
+def sales_bucket(timestamp: float) -> int:
+    """Повертає початок часового кошика агрегатів, у який потрапляє момент часу."""
+    return int(timestamp // AGGREGATE_BUCKET_SECONDS) * AGGREGATE_BUCKET_SECONDS
+
+
+class SalesDelta:
+    """Накопичує приріст агрегатів продажів у межах однієї транзакції запису."""
+    def __init__(self):
+        self._dishes: Dict[tuple, List[int]] = {}
+        self._categories: Dict[tuple, List[int]] = {}
+        self._clients: Dict[tuple, List[int]] = {}
+
+    @staticmethod
+    def _bump(totals: Dict[tuple, List[int]], key: tuple, amount: int) -> None:
+        """Додає одиницю кількості та суму до рядка агрегату."""
+        entry = totals.get(key)
+        if entry is None:
+            totals[key] = [1, amount]
+        else:
+            entry[0] += 1
+            entry[1] += amount
+
+    def add_item(self, bucket: int, dish_id: int, category: str, price: int) -> None:
+        """Враховує одну продану позицію."""
+        self._bump(self._dishes, (bucket, dish_id), price)
+        self._bump(self._categories, (bucket, category), price)
+
+    def add_order(self, bucket: int, client: str, total: int) -> None:
+        """Враховує одне замовлення клієнта."""
+        self._bump(self._clients, (bucket, client), total)
+
+    def apply(self, cursor: sqlite3.Cursor) -> None:
+        """Додає накопичений приріст до таблиць агрегатів."""
+        for table, key_column, count_column, totals in (
+                ("sales_by_dish", "dish_id", "quantity", self._dishes),
+                ("sales_by_category", "category", "quantity", self._categories),
+                ("sales_by_client", "client", "orders", self._clients)):
+            cursor.executemany(f"""
+                INSERT INTO {table} (bucket, {key_column}, {count_column}, revenue) VALUES (?, ?, ?, ?)
+                ON CONFLICT(bucket, {key_column}) DO UPDATE SET
+                    {count_column} = {count_column} + excluded.{count_column},
+                    revenue = revenue + excluded.revenue
+            """, [(*key, count, revenue) for key, (count, revenue) in totals.items()])
+
+
+class OrderRecord(NamedTuple):
+    """Замовлення, прочитане з бази даних."""
+    id: int
+    client: str
+    items: str
+    created_at: Optional[float]
+    status: str = STATUS_PENDING
+
+
+class _ThreadConnection:
+    """Власник з'єднання потоку в режимі ``thread``; живе, доки живе потік."""
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+class ConnectionPool:
+    """Пул з'єднань SQLite у режимі WAL.
+
+    У режимі ``thread`` кожен потік отримує власне з'єднання, яке закривається,
+    коли потік завершується; у режимі ``bounded`` потоки ділять не більше
+    ``size`` з'єднань і чекають на вільне.
+    """
+    MODE_THREAD = "thread"
+    MODE_BOUNDED = "bounded"
+    SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+    def __init__(self, path: str, mode: str = MODE_BOUNDED, size: int = 5,
+                 synchronous: str = "NORMAL", timeout: float = 5.0,
+                 cached_statements: int = STATEMENT_CACHE_SIZE):
+        if mode not in (self.MODE_THREAD, self.MODE_BOUNDED):
+            raise ValueError("Невідомий режим пулу з'єднань")
+        if size <= 0:
+            raise ValueError("Розмір пулу повинен бути більше 0.")
+        if synchronous.upper() not in self.SYNCHRONOUS_LEVELS:
+            raise ValueError("Невідомий рівень synchronous")
+        if cached_statements < 0:
+            raise ValueError("Розмір кешу запитів не може бути від'ємним.")
+        self._path = path
+        self._in_memory = path == MEMORY_DATABASE
+        # Каталог тимчасового файлу бази для ":memory:"; створюється з першим з'єднанням.
+        self._scratch: Optional[str] = None
+        self._cached_statements = cached_statements
+        self._mode = mode
+        self._size = size
+        self._synchronous = synchronous.upper()
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._all: List[sqlite3.Connection] = []
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Відкриває нове з'єднання та налаштовує журнал WAL.
+
+        Спільна база ":memory:" у SQLite (VFS memdb) не підтримує WAL, і відкритий
+        курсор читання блокував би запис. Тому ":memory:" — це тимчасовий файл у
+        режимі WAL без fsync, який видаляється під час close().
+        """
+        with self._lock:
+            if self._in_memory and self._scratch is None:
+                self._scratch = tempfile.mkdtemp(prefix="orders-")
+            target = os.path.join(self._scratch, "orders.db") if self._in_memory else self._path
+        conn = sqlite3.connect(target, timeout=self._timeout, check_same_thread=False,
+                               cached_statements=self._cached_statements)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {'OFF' if self._in_memory else self._synchronous}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Видає з'єднання на час блоку with."""
+        if self._mode == self.MODE_THREAD:
+            holder = getattr(self._local, "holder", None)
+            if holder is None:
+                holder = self._local.holder = _ThreadConnection(self._connect())
+                # threading.local звільняє holder, коли потік завершується.
+                weakref.finalize(holder, self._discard, holder.conn)
+            yield holder.conn
+            return
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        """Закриває з'єднання завершеного потоку й прибирає його з пулу."""
+        with self._lock:
+            if conn in self._all:
+                self._all.remove(conn)
+        conn.close()
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Бере вільне з'єднання або відкриває нове, якщо ліміт пулу не вичерпано."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = len(self._all) < self._size
+        if can_open:
+            return self._connect()
+        try:
+            return self._idle.get(timeout=self._timeout)
+        except queue.Empty:
+            raise RuntimeError("Немає вільних з'єднань у пулі") from None
+
+    @contextmanager
+    def durable(self, conn: sqlite3.Connection):
+        """Піднімає synchronous з'єднання щонайменше до FULL на час блоку with.
+
+        У WAL із synchronous=NORMAL коміт не чекає fsync, тож після збою живлення
+        останні транзакції можуть зникнути. Для тимчасової бази ":memory:" нічого не змінює.
+        """
+        levels = self.SYNCHRONOUS_LEVELS
+        if self._in_memory or levels.index(self._synchronous) >= levels.index("FULL"):
+            yield conn
+            return
+        conn.execute("PRAGMA synchronous = FULL")
+        try:
+            yield conn
+        finally:
+            conn.execute(f"PRAGMA synchronous = {self._synchronous}")
+
+    def close(self) -> None:
+        """Закриває всі відкриті з'єднання."""
+        with self._lock:
+            connections, self._all = self._all, []
+            scratch, self._scratch = self._scratch, None
+        # Поза блокуванням: звільнені власники з'єднань викликають _discard, який бере self._lock.
+        self._local = threading.local()
+        for conn in connections:
+            conn.close()
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+class OrderStore:
+    """Сховище замовлень в одному файлі SQLite (або в тимчасовій базі, якщо path=":memory:").
+
+    З'єднання відкривається лише під час першого запиту, тоді ж перевіряється схема.
+    ``status_flush_delay=None`` вимикає фоновий запис переходів статусів (див. flush_status).
+    """
+    SCHEMA_VERSION = 5
+    _LEGACY_ITEM_RE = re.compile(r"(.+?) \((\d+(?:\.\d+)?) грн\)(?:, |$)")
+
+    def __init__(self, path: str, pool_mode: str = ConnectionPool.MODE_BOUNDED, pool_size: int = 5,
+                 synchronous: str = "NORMAL", cached_statements: int = STATEMENT_CACHE_SIZE,
+                 status_flush_delay: Optional[float] = STATUS_FLUSH_DELAY):
+        self._init_connection(path, pool_mode, pool_size, synchronous, cached_statements, status_flush_delay)
+
+    def _init_connection(self, path: str, pool_mode: str, pool_size: int, synchronous: str,
+                         cached_statements: int = STATEMENT_CACHE_SIZE,
+                         status_flush_delay: Optional[float] = STATUS_FLUSH_DELAY):
+        """Налаштовує пул з'єднань до бази даних, не відкриваючи жодного з'єднання."""
+        self._path = path
+        self._pool = ConnectionPool(path, mode=pool_mode, size=pool_size, synchronous=synchronous,
+                                    cached_statements=cached_statements)
+        # SQLite допускає лише одного writer'а; серіалізуємо записи в процесі,
+        # щоб вони чекали на блокуванні Python, а не отримували "database is locked".
+        self._write_lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._group_committer: Optional[GroupCommitter] = None
+        self._status_flusher = None if status_flush_delay is None else StatusFlusher(self.flush_status,
+                                                                                   status_flush_delay)
+        self._status_index = OrderStatusIndex(None if self._status_flusher is None
+                                              else self._status_flusher.schedule)
+
+    @property
+    def path(self) -> str:
+        return self._path
 
-    def _init_connection(self):
-        """Ініціалізує підключення до бази даних."""
-        self._conn = sqlite3.connect("../orders.db")
-        self._cursor = self._conn.cursor()
-        self._create_table()
+    @property
+    def status_index(self) -> OrderStatusIndex:
+        """Індекс відкритих замовлень, збережених через це сховище."""
+        return self._status_index
+
+    def close(self) -> None:
+        """Зберігає замовлення з черги group commit і переходи статусів, потім закриває з'єднання."""
+        self.disable_group_commit()
+        if self._status_flusher is not None:
+            self._status_flusher.close()
+        self.flush_status()
+        self._pool.close()
+
+    def _ensure_schema(self) -> None:
+        """Один раз на екземпляр перевіряє схему й створює її, якщо файл ще не готовий."""
+        with self._schema_lock:
+            if not self._schema_ready:
+                self._create_schema()
+                self._schema_ready = True
+
+    @contextmanager
+    def _connection(self):
+        """Видає з'єднання для читання, за потреби спершу підготувавши схему."""
+        if not self._schema_ready:
+            self._ensure_schema()
+        with self._pool.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def _transaction(self):
+        """Відкриває транзакцію запису (BEGIN IMMEDIATE) і комітить її в кінці блоку."""
+        if not self._schema_ready:
+            self._ensure_schema()
+        with self._write_transaction() as cursor:
+            yield cursor
+
+    @contextmanager
+    def _write_transaction(self):
+        """Транзакція запису без перевірки схеми; використовується й для її створення.
+
+        Поки увімкнено group commit, коміт іде з synchronous=FULL (див. GroupCommitter).
+        """
+        with self._write_lock, self._pool.connection() as conn, \
+                (self._pool.durable(conn) if self._group_committer is not None else nullcontext()):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn.cursor()
+                with METRICS.timer("db.commit"):
+                    conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _create_schema(self):
+        """Створює нормалізовану схему та мігрує стару таблицю orders за потреби.
 
-    def _create_table(self):
-        """Створює таблицю замовлень, якщо вона ще не існує."""
-        self._cursor.execute("""
+        Актуальну схему видно з user_version без блокування запису, тож DDL
+        виконується лише один раз для кожного файлу.
+        """
+        with self._pool.connection() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= self.SCHEMA_VERSION:
+                return
+        with self._write_transaction() as cursor:
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version >= self.SCHEMA_VERSION:
+                return
+            columns = [row[1] for row in cursor.execute("PRAGMA table_info(orders)").fetchall()]
+            if "items" in columns:
+                cursor.execute("ALTER TABLE orders RENAME TO orders_v1")
+            self._create_tables(cursor)
+            if "items" in columns:
+                self._migrate_legacy_orders(cursor)
+            if version < 3:
+                self._rebuild_aggregates(cursor)
+            if version < 4:
+                self._add_status_column(cursor)
+            if version < 5:
+                self._add_price_text_column(cursor)
+            cursor.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    @staticmethod
+    def _create_tables(cursor: sqlite3.Cursor):
+        """Створює таблиці страв, замовлень і позицій замовлень з індексами."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS dishes (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                price INTEGER NOT NULL,
+                category TEXT NOT NULL DEFAULT ''
+            )
+        """)
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS orders (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                client TEXT,
-                items TEXT
+                client TEXT NOT NULL,
+                created_at REAL,
+                special INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'Очікується'
             )
         """)
-        self._conn.commit()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS order_items (
+                order_id INTEGER NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                dish_id INTEGER NOT NULL REFERENCES dishes(id),
+                price INTEGER NOT NULL,
+                price_text TEXT,
+                PRIMARY KEY (order_id, position)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_client ON orders(client)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_dish ON order_items(dish_id)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sales_by_dish (
+                bucket INTEGER NOT NULL,
+                dish_id INTEGER NOT NULL REFERENCES dishes(id),
+                quantity INTEGER NOT NULL,
+                revenue INTEGER NOT NULL,
+                PRIMARY KEY (bucket, dish_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sales_by_category (
+                bucket INTEGER NOT NULL,
+                category TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                revenue INTEGER NOT NULL,
+                PRIMARY KEY (bucket, category)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sales_by_client (
+                bucket INTEGER NOT NULL,
+                client TEXT NOT NULL,
+                orders INTEGER NOT NULL,
+                revenue INTEGER NOT NULL,
+                PRIMARY KEY (bucket, client)
+            ) WITHOUT ROWID
+        """)
+
+    @staticmethod
+    def _add_status_column(cursor: sqlite3.Cursor):
+        """Додає до orders колонку статусу (схема 4) та індекс за статусом.
+
+        Статус наявних замовлень невідомий, тому вони отримують "Очікується".
+        """
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(orders)").fetchall()]
+        if "status" not in columns:
+            cursor.execute(f"ALTER TABLE orders ADD COLUMN status TEXT NOT NULL DEFAULT '{STATUS_PENDING}'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status, id)")
+
+    @staticmethod
+    def _add_price_text_column(cursor: sqlite3.Cursor):
+        """Додає до order_items текст ціни (схема 5), з яким страву показують у замовленні.
+
+        NULL означає, що ціну показують як format_price(price) — так і для старих рядків.
+        """
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(order_items)").fetchall()]
+        if "price_text" not in columns:
+            cursor.execute("ALTER TABLE order_items ADD COLUMN price_text TEXT")
+
+    @staticmethod
+    def _migrate_legacy_orders(cursor: sqlite3.Cursor):
+        """Переносить замовлення зі старого рядкового формату items у нові таблиці.
+
+        Час створення старих замовлень невідомий, тому created_at лишається NULL.
+        Якщо склад хоч одного замовлення не вдається розібрати повністю, міграція
+        скасовується з RuntimeError, а файл лишається у старому форматі.
+        """
+        legacy = cursor.execute("SELECT id, client, items FROM orders_v1 ORDER BY id").fetchall()
+        parsed = [(order_id, client, OrderStore._parse_legacy_items(items or ""))
+                  for order_id, client, items in legacy]
+        broken = [order_id for order_id, _, items in parsed if items is None]
+        if broken:
+            shown = ", ".join(map(str, broken[:10])) + (", ..." if len(broken) > 10 else "")
+            raise RuntimeError(f"Не вдалося розібрати склад {len(broken)} старих замовлень (id: {shown}); "
+                               "міграцію скасовано.")
+        for order_id, client, items in parsed:
+            cursor.execute("INSERT INTO orders (id, client, created_at, special) VALUES (?, ?, NULL, 0)",
+                           (order_id, client or ""))
+            cursor.executemany(
+                "INSERT INTO order_items (order_id, position, dish_id, price, price_text) VALUES (?, ?, ?, ?, ?)",
+                [(order_id, position, OrderStore._dish_id(cursor, name, price, ""), price, text)
+                 for position, (name, price, text) in enumerate(items)])
+        cursor.execute("DROP TABLE orders_v1")
+
+    @staticmethod
+    def _parse_legacy_items(items: str) -> Optional[List[tuple]]:
+        """Розбирає рядок "Назва (ціна грн), ..." на (назва, ціна в копійках, текст ціни).
+
+        Текст ціни лишається None, якщо він збігається з format_price.
+        Повертає None, якщо частину рядка не вдалося розпізнати.
+        """
+        parsed, end = [], 0
+        for match in OrderStore._LEGACY_ITEM_RE.finditer(items):
+            if match.start() != end:
+                return None
+            price, text = to_kopecks(float(match.group(2))), match.group(2)
+            parsed.append((match.group(1), price, None if text == format_price(price) else text))
+            end = match.end()
+        return parsed if end == len(items) else None
+
+    @staticmethod
+    def _dish_id(cursor: sqlite3.Cursor, name: str, price: int, category: str) -> int:
+        """Повертає id страви, додаючи її або оновлюючи поточну ціну й категорію."""
+        return OrderStore._upsert_dish(cursor, name, price, category)[0]
+
+    @staticmethod
+    def _upsert_dish(cursor: sqlite3.Cursor, name: str, price: int, category: str):
+        """Додає або оновлює страву й повертає її (id, категорію).
+
+        Незмінену страву лише читає за індексом назви, не переписуючи її рядок.
+        """
+        row = cursor.execute("SELECT id, price, category FROM dishes WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[1] == price and (not category or row[2] == category):
+            return row[0], row[2]
+        return cursor.execute("""
+            INSERT INTO dishes (name, price, category) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                price = excluded.price,
+                category = COALESCE(NULLIF(excluded.category, ''), dishes.category)
+            RETURNING id, category
+        """, (name, price, category)).fetchone()
+
+    def _insert_order(self, cursor: sqlite3.Cursor, order: Order, created_at: float,
+                      sales: "SalesDelta", order_id: Optional[int] = None) -> int:
+        """Вставляє замовлення та його позиції в поточну транзакцію й додає їх до агрегатів.
+
+        Якщо ``order_id`` не задано, id призначає SQLite.
+        """
+        cursor.execute("INSERT INTO orders (id, client, created_at, special, status) VALUES (?, ?, ?, ?, ?)",
+                       (order_id, order.client.name, created_at, int(order.has_option(OrderOption.SPECIAL)),
+                        order.get_status()))
+        order_id = cursor.lastrowid
+        bucket = sales_bucket(created_at)
+        rows = []
+        for position, item in enumerate(order.items):
+            dish_id, category = self._upsert_dish(cursor, item.name, item.price_kop, item.category)
+            rows.append((order_id, position, dish_id, item.price_kop, item._price_text))
+            sales.add_item(bucket, dish_id, category, item.price_kop)
+        sales.add_order(bucket, order.client.name, order.total_kop)
+        cursor.executemany(
+            "INSERT INTO order_items (order_id, position, dish_id, price, price_text) VALUES (?, ?, ?, ?, ?)", rows)
+        return order_id
+
+    @staticmethod
+    def _rebuild_aggregates(cursor: sqlite3.Cursor):
+        """Перераховує таблиці агрегатів продажів із сирих замовлень.
+
+        Категорія береться з поточного запису страви в таблиці dishes.
+        """
+        bucket = f"COALESCE(CAST(o.created_at / {AGGREGATE_BUCKET_SECONDS} AS INTEGER) * {AGGREGATE_BUCKET_SECONDS}, 0)"
+        for table in ("sales_by_dish", "sales_by_category", "sales_by_client"):
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"""
+            INSERT INTO sales_by_dish (bucket, dish_id, quantity, revenue)
+            SELECT {bucket}, oi.dish_id, COUNT(*), SUM(oi.price)
+            FROM order_items oi JOIN orders o ON o.id = oi.order_id
+            GROUP BY 1, 2
+        """)
+        cursor.execute("""
+            INSERT INTO sales_by_category (bucket, category, quantity, revenue)
+            SELECT s.bucket, d.category, SUM(s.quantity), SUM(s.revenue)
+            FROM sales_by_dish s JOIN dishes d ON d.id = s.dish_id
+            GROUP BY 1, 2
+        """)
+        cursor.execute(f"""
+            INSERT INTO sales_by_client (bucket, client, orders, revenue)
+            SELECT {bucket}, o.client, COUNT(*),
+                   SUM((SELECT COALESCE(SUM(oi.price), 0) FROM order_items oi WHERE oi.order_id = o.id))
+            FROM orders o
+            GROUP BY 1, 2
+        """)
+
+    def rebuild_aggregates(self) -> None:
+        """Перераховує агрегати продажів з усіх збережених замовлень однією транзакцією."""
+        with self._transaction() as cursor:
+            self._rebuild_aggregates(cursor)
 
     def save_order(self, order: Order):
-        """Зберігає замовлення у базі даних."""
-        items_str = ", ".join(f"{item.name} ({item.price} грн)" for item in order.items)
-        self._cursor.execute("INSERT INTO orders (client, items) VALUES (?, ?)", (order.client.name, items_str))
-        self._conn.commit()
+        """Зберігає замовлення у базі даних.
+
+        У режимі group commit чекає, доки пачка з цим замовленням не буде закомічена.
+        """
+        if self._group_committer is not None:
+            self._group_committer.submit(order).result()
+            return
+        self.save_orders([order])
+
+    def save_orders(self, orders: Iterable[Order], created_at: Optional[float] = None,
+                    keep_ids: bool = False) -> int:
+        """Зберігає кілька замовлень однією транзакцією та повертає їх кількість.
+
+        ``keep_ids`` зберігає замовлення з уже призначеними id (використовується шардами).
+        """
+        orders = list(orders)
+        if not orders:
+            return 0
+        with METRICS.timer("db.save_orders"), self._transaction() as cursor:
+            written = self._write_pending_status(cursor)
+            created_at = time.time() if created_at is None else created_at
+            sales = SalesDelta()
+            ids = [self._insert_order(cursor, order, created_at, sales, order.id if keep_ids else None)
+                   for order in orders]
+            sales.apply(cursor)
+        self._status_index._persisted(written)
+        METRICS.increment("db.orders_saved", len(orders))
+        for order, order_id in zip(orders, ids):
+            order._id = order_id
+            self._status_index.track(order)
+        return len(orders)
+
+    @staticmethod
+    def _check_status(status: str) -> None:
+        if status not in ORDER_STATUSES:
+            raise ValueError(f"Невідомий статус замовлення: {status}")
+
+    @staticmethod
+    def _update_status(cursor, rows: Iterable[Tuple[str, int]]) -> None:
+        cursor.executemany("UPDATE orders SET status = ? WHERE id = ?", rows)
+
+    def _write_pending_status(self, cursor) -> Dict[int, Tuple[str, str]]:
+        """Записує в транзакції переходи з черги індексу й повертає записане."""
+        pending = self._status_index.pending_status()
+        if pending:
+            self._update_status(cursor, [(status, order_id) for order_id, (_, status) in pending.items()])
+        return pending
+
+    def _write_status(self, rows: Iterable[Tuple[str, int]]) -> None:
+        """Записує пари (статус, id замовлення) однією транзакцією, не чіпаючи об'єкти Order."""
+        with METRICS.timer("db.set_status"), self._transaction() as cursor:
+            self._update_status(cursor, rows)
+
+    def flush_status(self) -> int:
+        """Записує в базу переходи статусів, зроблені через Order.set_status.
+
+        Kitchen і KitchenScheduler змінюють лише об'єкти Order; індекс накопичує ці
+        переходи, а сховище записує їх однією транзакцією — у фоновому потоці
+        StatusFlusher, на початку наступного запису (save_orders, set_status,
+        transition_status) і під час close(). Читання нічого не записує, тож хто
+        хоче бачити в базі щойно зроблені переходи, викликає flush_status() сам.
+        Повертає кількість записаних переходів.
+        """
+        if not self._status_index.pending_status():
+            return 0
+        with METRICS.timer("db.set_status"), self._transaction() as cursor:
+            written = self._write_pending_status(cursor)
+        self._status_index._persisted(written)
+        return len(written)
+
+    def set_status(self, orders: Iterable[Order], status: str) -> int:
+        """Переводить збережені замовлення в новий статус однією транзакцією.
+
+        Оновлює і базу, і самі об'єкти Order (а з ними індекс статусів).
+        Повертає кількість оновлених рядків.
+        """
+        self._check_status(status)
+        orders = list(orders)
+        if any(order.id is None for order in orders):
+            raise ValueError("Замовлення ще не збережене, змінити його статус у базі неможливо.")
+        if not orders:
+            return 0
+        with METRICS.timer("db.set_status"), self._transaction() as cursor:
+            written = self._write_pending_status(cursor)
+            self._update_status(cursor, [(status, order.id) for order in orders])
+            updated = cursor.rowcount
+        self._status_index._persisted(written)
+        for order in orders:
+            order._change_status(status, persisted=True)
+        return updated
+
+    def transition_status(self, from_status: str, to_status: str) -> int:
+        """Переводить усі замовлення зі статусу from_status у to_status однією транзакцією.
+
+        Запит іде за індексом статусу; індекс відкритих замовлень і живі об'єкти Order теж оновлюються.
+        """
+        self._check_status(from_status)
+        self._check_status(to_status)
+        with METRICS.timer("db.set_status"), self._transaction() as cursor:
+            written = self._write_pending_status(cursor)
+            cursor.execute("UPDATE orders SET status = ? WHERE status = ?", (to_status, from_status))
+            updated = cursor.rowcount
+        self._status_index._persisted(written)
+        self._status_index._transitioned(from_status, to_status)
+        return updated
+
+    def enable_group_commit(self, max_batch_size: int = 64, max_delay: float = 0.005) -> None:
+        """Вмикає режим group commit для save_order."""
+        if self._group_committer is not None:
+            raise RuntimeError("Group commit вже увімкнено.")
+        self._group_committer = GroupCommitter(self, max_batch_size, max_delay)
+
+    def disable_group_commit(self) -> None:
+        """Зберігає замовлення, що очікують, і вимикає режим group commit."""
+        committer, self._group_committer = self._group_committer, None
+        if committer is not None:
+            committer.close()
+
+    @staticmethod
+    def _time_conditions(since: Optional[float], until: Optional[float], column: str = "created_at"):
+        """Повертає умови WHERE та параметри для фільтра за проміжком часу."""
+        conditions, params = [], []
+        if since is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append(f"{column} < ?")
+            params.append(until)
+        return conditions, params
+
+    def _fetch_in_chunks(self, sql: str, params, chunk_size: int):
+        """Виконує запит і віддає рядки, читаючи їх через fetchmany порціями."""
+        with self._connection() as conn:
+            yield from self._read_chunks(conn.execute(sql, params), chunk_size)
+
+    @staticmethod
+    def _read_chunks(cursor: sqlite3.Cursor, chunk_size: int):
+        """Віддає рядки курсора, читаючи їх через fetchmany, і закриває курсор."""
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _orders_sql(conditions) -> str:
+        """Повертає запит замовлень з позиціями за умовами на таблицю orders."""
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return f"""
+            SELECT o.id, o.client, o.created_at, o.status, d.name, oi.price, oi.price_text
+            FROM orders o
+            LEFT JOIN order_items oi ON oi.order_id = o.id
+            LEFT JOIN dishes d ON d.id = oi.dish_id
+            {where}
+            ORDER BY o.id, oi.position
+        """
+
+    def _query_orders(self, conditions, params, limit: Optional[int], chunk_size: int) -> Iterator[OrderRecord]:
+        """Віддає OrderRecord для замовлень, що задовольняють умови на таблицю orders."""
+        if chunk_size <= 0:
+            raise ValueError("Розмір порції повинен бути більше 0.")
+        # Умови побудовані так, що SQLite читає orders у порядку id і не сортує
+        # результат у тимчасовому B-дереві, тому limit застосовується вже під час читання.
+        rows = self._fetch_in_chunks(self._orders_sql(conditions), params, chunk_size)
+        return islice(self._records(rows), limit)
+
+    @staticmethod
+    def _records(rows) -> Iterator[OrderRecord]:
+        """Групує рядки запиту _orders_sql у OrderRecord."""
+        return (
+            OrderRecord(order_id, client, ", ".join(f"{name} ({format_price(price) if text is None else text} грн)"
+                                                    for *_, name, price, text in items if name is not None),
+                        created_at, status)
+            for (order_id, client, created_at, status), items in groupby(rows, key=lambda row: row[:4])
+        )
+
+    def _query_statuses(self, statuses: List[str], conditions, params, limit: Optional[int],
+                        chunk_size: int) -> Iterator[OrderRecord]:
+        """Віддає замовлення кількох статусів у порядку id, зливаючи запит на кожен статус.
+
+        ``o.status IN (...)`` з кількома значеннями змушує SQLite сортувати результат
+        у тимчасовому B-дереві; запит з одним статусом читає індекс (status, id) уже
+        в порядку id. Усі запити йдуть одним з'єднанням.
+        """
+        sql = self._orders_sql(conditions + ["o.status = ?"])
+        with self._connection() as conn:
+            streams = [self._records(self._read_chunks(conn.execute(sql, params + [status]), chunk_size))
+                       for status in statuses]
+            yield from islice(heapq.merge(*streams, key=lambda record: record.id), limit)
+
+    def iter_orders(self, client: Optional[str] = None, since: Optional[float] = None,
+                    until: Optional[float] = None, after_id: Optional[int] = None,
+                    limit: Optional[int] = None, dish: Optional[str] = None,
+                    statuses: Optional[Iterable[str]] = None,
+                    chunk_size: int = ORDER_FETCH_CHUNK_SIZE) -> Iterator[OrderRecord]:
+        """Поступово віддає збережені замовлення в порядку id.
+
+        Рядки читаються порціями по ``chunk_size``, тож пам'ять не залежить від
+        розміру таблиці. ``after_id`` і ``limit`` дають keyset-пагінацію: щоб
+        отримати наступну сторінку, передайте id останнього замовлення.
+        ``dish`` лишає тільки замовлення, що містять страву з такою назвою,
+        ``statuses`` — лише замовлення з указаними статусами (за індексом статусу).
+        Лише читає: переходи статусів, ще не записані з черги, у записах не видно.
+        """
+        if statuses is not None:
+            statuses = list(dict.fromkeys(statuses))
+            if len(statuses) > 1:
+                if chunk_size <= 0:
+                    raise ValueError("Розмір порції повинен бути більше 0.")
+                conditions, params = self._order_conditions(client, since, until, after_id, dish)
+                return self._query_statuses(statuses, conditions, params, limit, chunk_size)
+        conditions, params = self._order_conditions(client, since, until, after_id, dish, statuses)
+        return self._query_orders(conditions, params, limit, chunk_size)
+
+    @staticmethod
+    def _order_conditions(client: Optional[str] = None, since: Optional[float] = None,
+                          until: Optional[float] = None, after_id: Optional[int] = None,
+                          dish: Optional[str] = None, statuses: Optional[Iterable[str]] = None):
+        """Повертає умови WHERE та параметри для iter_orders."""
+        conditions, params = [], []
+        if since is not None or until is not None:
+            # Проміжок часу спершу переводиться в проміжок id за індексом created_at,
+            # а сам фільтр за часом іде без індексу (+). Інакше SQLite обирає індекс
+            # created_at і сортує весь проміжок за id у тимчасовому B-дереві.
+            window, bounds = OrderStore._time_conditions(since, until)
+            window = f"FROM orders INDEXED BY idx_orders_created_at WHERE {' AND '.join(window)}"
+            conditions.append(f"o.id BETWEEN (SELECT MIN(id) {window}) AND (SELECT MAX(id) {window})")
+            conditions.extend(OrderStore._time_conditions(since, until, "+o.created_at")[0])
+            params.extend(bounds * 3)
+        if client is not None:
+            conditions.append("o.client = ?")
+            params.append(client)
+        if after_id is not None:
+            conditions.append("o.id > ?")
+            params.append(after_id)
+        if dish is not None:
+            conditions.append("""o.id IN (
+                SELECT oi.order_id FROM order_items oi
+                JOIN dishes d ON d.id = oi.dish_id
+                WHERE d.name = ?
+            )""")
+            params.append(dish)
+        if statuses is not None:
+            statuses = list(statuses)
+            conditions.append(f"o.status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        return conditions, params
+
+    def iter_client_orders(self, client: Client, before_id: Optional[int] = None, limit: Optional[int] = None,
+                           chunk_size: int = ORDER_FETCH_CHUNK_SIZE) -> Iterator[Order]:
+        """Відновлює збережені замовлення клієнта як об'єкти Order, від новіших до старіших.
+
+        ``before_id`` і ``limit`` дають keyset-пагінацію назад у часі за індексом клієнта.
+        """
+        conditions, params = ["o.client = ?"], [client.name]
+        if before_id is not None:
+            conditions.append("o.id < ?")
+            params.append(before_id)
+        rows = self._fetch_in_chunks(f"""
+            SELECT o.id, o.special, o.status, d.name, oi.price, d.category, oi.price_text
+            FROM orders o
+            LEFT JOIN order_items oi ON oi.order_id = o.id
+            LEFT JOIN dishes d ON d.id = oi.dish_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY o.id DESC, oi.position
+        """, params, chunk_size)
+        orders = (self._restore_order(client, order_id, special, (row[3:] for row in items), status)
+                  for (order_id, special, status), items in groupby(rows, key=lambda row: row[:3]))
+        return islice(orders, limit)
+
+    @staticmethod
+    def _restore_order(client: Client, order_id: int, special: int, items, status: str = STATUS_PENDING) -> Order:
+        """Створює розміщене замовлення з позицій (назва, ціна в копійках, категорія, текст ціни)."""
+        items = [Strava.from_kopecks(name, price, text, category)
+                 for name, price, category, text in items if name is not None]
+        order = (SpecialOrder if special else NormalOrder)(client, items)
+        order._id = order_id
+        order._status = status
+        order.mark_placed()
+        return order
 
     def get_all_orders(self):
         """Повертає всі збережені замовлення."""
-        self._cursor.execute("SELECT client, items FROM orders")
-        return self._cursor.fetchall()
+        return [(record.client, record.items) for record in self.iter_orders()]
+
+    def get_orders_with_dish(self, dish_name: str):
+        """Повертає замовлення, що містять страву з указаною назвою."""
+        return [(record.client, record.items) for record in self.iter_orders(dish=dish_name)]
+
+    def size_bytes(self) -> int:
+        """Повертає розмір бази (page_count * page_size), враховуючи сторінки, що ще лежать у WAL."""
+        with self._connection() as conn:
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            return page_count * conn.execute("PRAGMA page_size").fetchone()[0]
+
+    def iter_order_items(self, after_id: Optional[int] = None,
+                         chunk_size: int = ORDER_FETCH_CHUNK_SIZE) -> Iterator[tuple]:
+        """Поступово віддає позиції замовлень у порядку id замовлення.
+
+        Кожен рядок — (id замовлення, клієнт, created_at, special, назва страви,
+        категорія, ціна в копійках). Замовлення без позицій дає один рядок,
+        де назва, категорія й ціна — None.
+        """
+        conditions, params = [], []
+        if after_id is not None:
+            conditions.append("o.id > ?")
+            params.append(after_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._fetch_in_chunks(f"""
+            SELECT o.id, o.client, o.created_at, o.special, d.name, d.category, oi.price
+            FROM orders o
+            LEFT JOIN order_items oi ON oi.order_id = o.id
+            LEFT JOIN dishes d ON d.id = oi.dish_id
+            {where}
+            ORDER BY o.id, oi.position
+        """, params, chunk_size)
+
+    def last_order_id(self) -> int:
+        """Повертає найбільший id збереженого замовлення або 0, якщо замовлень немає."""
+        with self._connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0]
+
+    def _read_aggregates(self, sql: str, since: Optional[float], until: Optional[float], params=()):
+        """Читає рядки таблиці агрегатів за проміжок часу, округлений до меж кошиків."""
+        conditions, bounds = self._time_conditions(
+            None if since is None else sales_bucket(since),
+            None if until is None else until, "s.bucket")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._connection() as conn:
+            return conn.execute(sql.format(where=where), [*bounds, *params]).fetchall()
+
+    def get_revenue_by_dish(self, since: Optional[float] = None, until: Optional[float] = None):
+        """Повертає (назва, кількість, виручка в грн) по стравах за проміжок часу.
+
+        Дані беруться з агрегатів, тому межі проміжку округлюються до годинних кошиків.
+        """
+        rows = self._read_aggregates("""
+            SELECT d.name, SUM(s.quantity), SUM(s.revenue)
+            FROM sales_by_dish s JOIN dishes d ON d.id = s.dish_id
+            {where}
+            GROUP BY s.dish_id
+            ORDER BY SUM(s.revenue) DESC, d.name
+        """, since, until)
+        return [(name, quantity, revenue / KOPECKS_PER_UAH) for name, quantity, revenue in rows]
+
+    def get_revenue_by_category(self, since: Optional[float] = None, until: Optional[float] = None):
+        """Повертає (категорія, кількість, виручка в грн) за проміжок часу."""
+        rows = self._read_aggregates("""
+            SELECT s.category, SUM(s.quantity), SUM(s.revenue)
+            FROM sales_by_category s
+            {where}
+            GROUP BY s.category
+            ORDER BY SUM(s.revenue) DESC, s.category
+        """, since, until)
+        return [(category, quantity, revenue / KOPECKS_PER_UAH) for category, quantity, revenue in rows]
+
+    def get_top_clients(self, since: Optional[float] = None, until: Optional[float] = None, limit: int = 10):
+        """Повертає (клієнт, кількість замовлень, виручка в грн) для найкращих клієнтів."""
+        rows = self._read_aggregates("""
+            SELECT s.client, SUM(s.orders), SUM(s.revenue)
+            FROM sales_by_client s
+            {where}
+            GROUP BY s.client
+            ORDER BY SUM(s.revenue) DESC, s.client
+            LIMIT ?
+        """, since, until, (limit,))
+        return [(client, orders, revenue / KOPECKS_PER_UAH) for client, orders, revenue in rows]
+
+
+class Database(OrderStore):
+    """Singleton-клас для збереження замовлень у базу даних SQLite.
+
+    Шлях і параметри пулу задаються через configure() до першого створення;
+    reset() закриває екземпляр, щоб наступний Database() створив новий.
+    """
+    _instance = None
+    _DEFAULT_SETTINGS = {"path": DATABASE_PATH, "pool_mode": ConnectionPool.MODE_BOUNDED, "pool_size": 5,
+                         "synchronous": "NORMAL", "cached_statements": STATEMENT_CACHE_SIZE}
+    _settings = dict(_DEFAULT_SETTINGS)
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super(Database, cls).__new__(cls)
+            instance._init_connection(**cls._settings)
+            cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        # Підключення налаштовується один раз у __new__ і відкривається під час першого запиту.
+        pass
+
+    @classmethod
+    def configure(cls, path: Optional[str] = None, pool_mode: Optional[str] = None,
+                  pool_size: Optional[int] = None, synchronous: Optional[str] = None,
+                  cached_statements: Optional[int] = None) -> None:
+        """Задає шлях до бази та параметри пулу; викликається до першого створення Database.
+
+        ``path=":memory:"`` дає порожню тимчасову базу, яку reset() видаляє.
+        """
+        if cls._instance is not None:
+            raise RuntimeError("Database вже створено, налаштування змінити неможливо.")
+        updates = {"path": path, "pool_mode": pool_mode, "pool_size": pool_size, "synchronous": synchronous,
+                   "cached_statements": cached_statements}
+        cls._settings = {**cls._settings, **{key: value for key, value in updates.items() if value is not None}}
+
+    @classmethod
+    def reset(cls) -> None:
+        """Закриває поточний екземпляр і повертає налаштування за замовчуванням."""
+        instance, cls._instance = cls._instance, None
+        cls._settings = dict(cls._DEFAULT_SETTINGS)
+        if instance is not None:
+            instance.close()
+
+
+# Кеш сховищ шардів у процесі-воркері: з'єднання відкриваються один раз на процес.
+_SHARD_STORES: Dict[str, OrderStore] = {}
+
+
+def _ingest_shard(path: str, payload, created_at: float) -> int:
+    """Зберігає пачку замовлень у файл шарду; виконується в процесі-воркері.
+
+    ``payload`` — список (id, клієнт, special, статус, позиції), де позиції —
+    кортежі (назва, ціна в копійках, категорія, текст ціни).
+    """
+    store = _SHARD_STORES.get(path)
+    if store is None:
+        store = _SHARD_STORES[path] = OrderStore(path)
+    clients: Dict[str, Client] = {}
+    orders = []
+    for order_id, name, special, status, items in payload:
+        client = clients.get(name)
+        if client is None:
+            client = clients[name] = Client(name)
+        orders.append(OrderStore._restore_order(client, order_id, special, items, status))
+    return store.save_orders(orders, created_at=created_at, keep_ids=True)
+
+
+class ShardedOrderStore:
+    """Сховище замовлень, розподілене між кількома файлами SQLite.
+
+    Замовлення розподіляються між шардами за хешем імені клієнта, тож усі
+    замовлення клієнта лежать в одному файлі. Кожен шард має власний
+    процес-writer, тож пачки одного шарду ніколи не пишуться паралельно.
+    Id замовлень глобальні: їх видає спільний лічильник у файлі SEQUENCE_FILE
+    того ж каталогу, тому кілька сховищ на одному каталозі не повторюють id,
+    а злиття шардів за id дає той самий порядок, що й один файл.
+    """
+    SHARD_FILE = "orders_shard_{}.db"
+    SEQUENCE_FILE = "orders_sequence.db"
+
+    def __init__(self, directory: str, shards: int = 4, status_flush_delay: Optional[float] = STATUS_FLUSH_DELAY):
+        if shards <= 0:
+            raise ValueError("Кількість шардів повинна бути більше 0.")
+        os.makedirs(directory, exist_ok=True)
+        self._paths = [os.path.join(directory, self.SHARD_FILE.format(i)) for i in range(shards)]
+        self._stores = [OrderStore(path) for path in self._paths]
+        # last_order_id готує схему кожного шарду до запуску воркерів, тож вони не конкурують за DDL.
+        first_free = max(store.last_order_id() for store in self._stores) + 1
+        self._id_lock = threading.Lock()
+        self._sequence = self._open_sequence(os.path.join(directory, self.SEQUENCE_FILE), first_free)
+        self._status_flusher = None if status_flush_delay is None else StatusFlusher(self.flush_status,
+                                                                                   status_flush_delay)
+        self._status_index = OrderStatusIndex(None if self._status_flusher is None
+                                              else self._status_flusher.schedule)
+        # spawn, а не fork: дочірні процеси не повинні успадковувати відкриті з'єднання SQLite.
+        context = multiprocessing.get_context("spawn")
+        self._executors = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in self._paths]
+
+    @staticmethod
+    def _open_sequence(path: str, first_free: int) -> sqlite3.Connection:
+        """Відкриває спільний лічильник id; новий лічильник починається з first_free."""
+        conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("CREATE TABLE IF NOT EXISTS sequence (next_id INTEGER NOT NULL)")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM sequence").fetchone() is None:
+                conn.execute("INSERT INTO sequence (next_id) VALUES (?)", (first_free,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            conn.close()
+            raise
+        return conn
+
+    def _allocate_ids(self, count: int) -> int:
+        """Резервує count послідовних id у спільному лічильнику й повертає перший з них."""
+        with self._id_lock:
+            self._sequence.execute("BEGIN IMMEDIATE")
+            try:
+                first_id = self._sequence.execute("UPDATE sequence SET next_id = next_id + ? RETURNING next_id - ?",
+                                                  (count, count)).fetchone()[0]
+                self._sequence.execute("COMMIT")
+            except Exception:
+                self._sequence.execute("ROLLBACK")
+                raise
+        return first_id
+
+    @property
+    def shard_count(self) -> int:
+        return len(self._stores)
+
+    def shard_of(self, client: str) -> int:
+        """Повертає номер шарду для клієнта (стабільний між запусками, на відміну від hash())."""
+        return zlib.crc32(client.encode("utf-8")) % len(self._stores)
+
+    def ingest(self, orders: Iterable[Order]) -> int:
+        """Призначає замовленням id і паралельно зберігає їх у шарди.
+
+        Повертає кількість збережених замовлень.
+        """
+        orders = list(orders)
+        if not orders:
+            return 0
+        first_id = self._allocate_ids(len(orders))
+        created_at = time.time()
+        payloads: Dict[int, list] = {}
+        for order_id, order in enumerate(orders, start=first_id):
+            order._id = order_id
+            items = [(item.name, item.price_kop, item.category, item._price_text) for item in order.items]
+            payloads.setdefault(self.shard_of(order.client.name), []).append(
+                (order_id, order.client.name, int(order.has_option(OrderOption.SPECIAL)), order.get_status(), items))
+        futures = [self._executors[shard].submit(_ingest_shard, self._paths[shard], payload, created_at)
+                   for shard, payload in payloads.items()]
+        saved = sum(future.result() for future in futures)
+        for order in orders:
+            self._status_index.track(order)
+        return saved
+
+    def save_order(self, order: Order):
+        """Зберігає одне замовлення; для пропускної здатності краще ingest пачками."""
+        self.ingest([order])
+
+    def save_orders(self, orders: Iterable[Order]) -> int:
+        return self.ingest(orders)
+
+    def iter_orders(self, client: Optional[str] = None, since: Optional[float] = None,
+                    until: Optional[float] = None, after_id: Optional[int] = None,
+                    limit: Optional[int] = None, dish: Optional[str] = None,
+                    statuses: Optional[Iterable[str]] = None,
+                    chunk_size: int = ORDER_FETCH_CHUNK_SIZE) -> Iterator[OrderRecord]:
+        """Зливає замовлення всіх шардів у порядку id; параметри як у OrderStore.iter_orders."""
+        statuses = None if statuses is None else list(statuses)
+        if client is not None:
+            return self._stores[self.shard_of(client)].iter_orders(
+                client, since, until, after_id, limit, dish, statuses, chunk_size)
+        streams = [store.iter_orders(None, since, until, after_id, limit, dish, statuses, chunk_size)
+                   for store in self._stores]
+        return islice(heapq.merge(*streams, key=lambda record: record.id), limit)
+
+    @property
+    def status_index(self) -> OrderStatusIndex:
+        """Індекс відкритих замовлень, збережених через ingest у цьому процесі."""
+        return self._status_index
+
+    def flush_status(self) -> int:
+        """Записує переходи статусів з індексу: одна транзакція на кожен зачеплений шард."""
+        pending = self._status_index.pending_status()
+        by_shard: Dict[int, List[Tuple[str, int]]] = {}
+        for order_id, (client, status) in pending.items():
+            by_shard.setdefault(self.shard_of(client), []).append((status, order_id))
+        for shard, rows in by_shard.items():
+            self._stores[shard]._write_status(rows)
+        self._status_index._persisted(pending)
+        return len(pending)
+
+    def set_status(self, orders: Iterable[Order], status: str) -> int:
+        """Переводить замовлення в новий статус: одна транзакція на кожен зачеплений шард."""
+        self.flush_status()
+        by_shard: Dict[int, List[Order]] = {}
+        for order in orders:
+            by_shard.setdefault(self.shard_of(order.client.name), []).append(order)
+        return sum(self._stores[shard].set_status(batch, status) for shard, batch in by_shard.items())
+
+    def iter_client_orders(self, client: Client, before_id: Optional[int] = None, limit: Optional[int] = None,
+                           chunk_size: int = ORDER_FETCH_CHUNK_SIZE) -> Iterator[Order]:
+        return self._stores[self.shard_of(client.name)].iter_client_orders(client, before_id, limit, chunk_size)
+
+    def get_all_orders(self):
+        """Повертає всі збережені замовлення всіх шардів."""
+        return [(record.client, record.items) for record in self.iter_orders()]
+
+    def get_orders_with_dish(self, dish_name: str):
+        """Повертає замовлення всіх шардів, що містять страву з указаною назвою."""
+        return [(record.client, record.items) for record in self.iter_orders(dish=dish_name)]
+
+    def iter_order_items(self, after_id: Optional[int] = None,
+                         chunk_size: int = ORDER_FETCH_CHUNK_SIZE) -> Iterator[tuple]:
+        """Зливає позиції замовлень усіх шардів у порядку id замовлення."""
+        return heapq.merge(*(store.iter_order_items(after_id, chunk_size) for store in self._stores),
+                           key=lambda row: row[0])
+
+    def last_order_id(self) -> int:
+        return max(store.last_order_id() for store in self._stores)
+
+    @staticmethod
+    def _merge_aggregates(results, limit: Optional[int] = None):
+        """Сумує рядки (ключ, кількість, виручка в грн) з шардів і сортує як OrderStore."""
+        totals: Dict[str, List[int]] = {}
+        for rows in results:
+            for key, quantity, revenue in rows:
+                total = totals.setdefault(key, [0, 0])
+                total[0] += quantity
+                total[1] += to_kopecks(revenue)
+        merged = sorted(totals.items(), key=lambda item: (-item[1][1], item[0]))
+        return [(key, quantity, revenue / KOPECKS_PER_UAH) for key, (quantity, revenue) in merged[:limit]]
+
+    def get_revenue_by_dish(self, since: Optional[float] = None, until: Optional[float] = None):
+        return self._merge_aggregates(store.get_revenue_by_dish(since, until) for store in self._stores)
+
+    def get_revenue_by_category(self, since: Optional[float] = None, until: Optional[float] = None):
+        return self._merge_aggregates(store.get_revenue_by_category(since, until) for store in self._stores)
+
+    def get_top_clients(self, since: Optional[float] = None, until: Optional[float] = None, limit: int = 10):
+        return self._merge_aggregates((store.get_top_clients(since, until, limit) for store in self._stores),
+                                      limit)
+
+    def rebuild_aggregates(self) -> None:
+        """Перераховує агрегати продажів у кожному шарді."""
+        for store in self._stores:
+            store.rebuild_aggregates()
+
+    def close(self) -> None:
+        """Зупиняє процеси шардів, записує переходи статусів і закриває з'єднання."""
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+        self._sequence.close()
+        if self._status_flusher is not None:
+            self._status_flusher.close()
+        self.flush_status()
+        for store in self._stores:
+            store.close()
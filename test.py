@@ -1,6 +1,21 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 from original_code import D as OriginalClient, B as OriginalStrava, F as OriginalOrderFactory, C as OriginalMenu, G as OriginalNotifier, H as OriginalKitchen, I as OriginalDatabase
 from refactored_code import Client as RefactoredClient, Strava as RefactoredStrava, OrderFactory as RefactoredOrderFactory, Menu as RefactoredMenu, KitchenNotifier as RefactoredNotifier, Kitchen as RefactoredKitchen, Database as RefactoredDatabase
+import loadgen
+import menu_io
+try:
+    import analytics
+except ImportError:  # NumPy не встановлено
+    analytics = None
+from refactored_code import AsyncKitchenNotifier, NotifierOverloadedError, EventLog, KitchenScheduler, MetricsRegistry, METRICS
+from refactored_code import OrderStore, ShardedOrderStore, OpenOrder, OPEN_STATUSES, STATUS_PENDING, STATUS_COOKING, STATUS_READY, STATUS_FAILED
 
 
 def prepare_order_system(ClientClass, StravaClass, OrderFactoryClass, MenuClass, NotifierClass, KitchenClass, DatabaseClass):
@@ -41,6 +56,13 @@ def prepare_order_system(ClientClass, StravaClass, OrderFactoryClass, MenuClass,
     return client, menu, db, notifier, kitchen, order
 
 
+def use_memory_database(test_case):
+    """Налаштовує Database на порожню базу в пам'яті до кінця тесту."""
+    RefactoredDatabase.reset()
+    RefactoredDatabase.configure(path=":memory:")
+    test_case.addCleanup(RefactoredDatabase.reset)
+
+
 def generate_tests(ClientClass, StravaClass, OrderFactoryClass, MenuClass, NotifierClass, KitchenClass, DatabaseClass):
 
     class CommonTests(unittest.TestCase):
@@ -183,5 +205,1136 @@ RefactoredTests = generate_tests(
     RefactoredMenu, RefactoredNotifier, RefactoredKitchen, RefactoredDatabase
 )
 
+class RefactoredDatabaseTests(unittest.TestCase):
+
+    def setUp(self):
+        use_memory_database(self)
+        self.db = RefactoredDatabase()
+        self.client = RefactoredClient("Петро")
+        self.items = [RefactoredStrava("Борщ", 55)]
+
+    def test_save_orders_in_one_batch(self):
+        orders = [RefactoredOrderFactory.create_order("normal", self.client, self.items) for _ in range(3)]
+        self.assertEqual(self.db.save_orders(orders), 3)
+        self.assertEqual(self.db.get_all_orders(), [("Петро", "Борщ (55 грн)")] * 3)
+
+    def test_group_commit_waits_for_durability(self):
+        self.db.enable_group_commit(max_batch_size=4, max_delay=0.01)
+        try:
+            threads = [
+                threading.Thread(target=self.db.save_order,
+                                 args=(RefactoredOrderFactory.create_order("normal", self.client, self.items),))
+                for _ in range(10)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(self.db.get_all_orders()), 10)
+        finally:
+            self.db.disable_group_commit()
+
+    def test_group_commit_syncs_each_commit_to_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = OrderStore(os.path.join(directory, "orders.db"))
+
+            def synchronous():
+                with store._transaction() as cursor:
+                    return cursor.execute("PRAGMA synchronous").fetchone()[0]
+
+            self.assertEqual(synchronous(), 1)
+            store.enable_group_commit()
+            self.assertEqual(synchronous(), 2)
+            store.disable_group_commit()
+            self.assertEqual(synchronous(), 1)
+            store.close()
+
+    def test_unchanged_dish_is_not_rewritten(self):
+        with self.db._transaction() as cursor:
+            dish_id, _ = OrderStore._upsert_dish(cursor, "Борщ", 5500, "Перші страви")
+            changes = cursor.connection.total_changes
+            self.assertEqual(OrderStore._upsert_dish(cursor, "Борщ", 5500, ""), (dish_id, "Перші страви"))
+            self.assertEqual(cursor.connection.total_changes, changes)
+            self.assertEqual(OrderStore._upsert_dish(cursor, "Борщ", 6000, ""), (dish_id, "Перші страви"))
+            self.assertEqual(cursor.connection.total_changes, changes + 1)
+
+    def test_orders_with_dish_and_revenue(self):
+        dish = RefactoredStrava("Печеня", 120.5)
+        self.db.save_order(RefactoredOrderFactory.create_order("normal", self.client, self.items))
+        order = RefactoredOrderFactory.create_order("normal", self.client, [dish, dish])
+        self.db.save_order(order)
+        self.assertIsNotNone(order.id)
+        self.assertEqual(self.db.get_orders_with_dish("Печеня"),
+                         [("Петро", "Печеня (120.5 грн), Печеня (120.5 грн)")])
+        self.assertEqual(self.db.get_revenue_by_dish(), [("Печеня", 2, 241.0), ("Борщ", 1, 55.0)])
+
+    def test_aggregates_match_rebuild(self):
+        client = RefactoredClient("Андрій")
+        dishes = [RefactoredStrava("Сирники", 65, category="Сніданки"), RefactoredStrava("Кава", 40)]
+        self.db.save_orders(RefactoredOrderFactory.create_order("normal", client, dishes) for _ in range(3))
+        since = time.time() - 1
+        self.assertEqual(self.db.get_top_clients(since=since), [("Андрій", 3, 315.0)])
+        incremental = (self.db.get_revenue_by_dish(), self.db.get_revenue_by_category(), self.db.get_top_clients())
+        self.db.rebuild_aggregates()
+        rebuilt = (self.db.get_revenue_by_dish(), self.db.get_revenue_by_category(), self.db.get_top_clients())
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(self.db.get_revenue_by_category(since=since), [("Сніданки", 3, 195.0), ("", 3, 120.0)])
+
+    def test_iter_orders_keyset_pagination(self):
+        client = RefactoredClient("Ганна")
+        orders = [RefactoredOrderFactory.create_order("normal", client, self.items) for _ in range(5)]
+        self.db.save_orders(orders)
+        first_page = list(self.db.iter_orders(client="Ганна", after_id=orders[0].id - 1, limit=3, chunk_size=2))
+        second_page = list(self.db.iter_orders(client="Ганна", after_id=first_page[-1].id, limit=3))
+        self.assertEqual([record.id for record in first_page + second_page], [order.id for order in orders])
+        self.assertTrue(all(record.items == "Борщ (55 грн)" for record in first_page))
+
+    def test_time_range_is_read_in_id_order_without_sorting(self):
+        batches = [[RefactoredOrderFactory.create_order("normal", self.client, self.items) for _ in range(2)]
+                   for _ in range(3)]
+        for batch, created_at in zip(batches, (300.0, 100.0, 200.0)):
+            self.db.save_orders(batch, created_at=created_at)
+        records = list(self.db.iter_orders(since=150, until=350, chunk_size=1))
+        self.assertEqual([record.id for record in records], [order.id for order in batches[0] + batches[2]])
+        self.assertEqual(list(self.db.iter_orders(since=400)), [])
+        conditions, params = self.db._order_conditions(since=150, until=350)
+        with self.db._connection() as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN " + self.db._orders_sql(conditions), params).fetchall()
+        self.assertFalse(any("TEMP B-TREE" in row[-1] for row in plan), plan)
+
+    def test_concurrent_reads_and_writes(self):
+        errors = []
+
+        def write():
+            try:
+                for _ in range(20):
+                    self.db.save_order(RefactoredOrderFactory.create_order("normal", self.client, self.items))
+            except Exception as error:
+                errors.append(error)
+
+        def read():
+            try:
+                for _ in range(5):
+                    list(self.db.iter_orders(client="Петро"))
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=target) for target in (write, write, read, read)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class LegacyMigrationTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "orders.db")
+        # Файл у форматі першої версії: склад замовлення зберігався одним рядком.
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, client TEXT, items TEXT)")
+        conn.executemany("INSERT INTO orders (client, items) VALUES (?, ?)", [
+            ("Іван", "Кава (40.0 грн), Суп (50.5 грн)"),
+            ("Олена", "Кава (40.0 грн)"),
+            ("Петро", ""),
+        ])
+        conn.commit()
+        conn.close()
+
+    def test_legacy_orders_are_normalized(self):
+        store = OrderStore(self.path)
+        self.addCleanup(store.close)
+        self.assertEqual([(record.id, record.client, record.items) for record in store.iter_orders()], [
+            (1, "Іван", "Кава (40.0 грн), Суп (50.5 грн)"),
+            (2, "Олена", "Кава (40.0 грн)"),
+            (3, "Петро", ""),
+        ])
+        self.assertEqual(store.get_revenue_by_dish(), [("Кава", 2, 80.0), ("Суп", 1, 50.5)])
+        order = RefactoredOrderFactory.create_order("normal", RefactoredClient("Іван"), [RefactoredStrava("Чай", 15)])
+        store.save_order(order)
+        self.assertEqual(order.id, 4)
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute("SELECT name, price FROM dishes ORDER BY name").fetchall(),
+                         [("Кава", 4000), ("Суп", 5050), ("Чай", 1500)])
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], OrderStore.SCHEMA_VERSION)
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        self.assertNotIn("orders_v1", tables)
+        self.assertEqual([row[1] for row in conn.execute("PRAGMA table_info(orders)")],
+                         ["id", "client", "created_at", "special", "status"])
+
+    def test_unparsed_legacy_items_abort_migration(self):
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        with conn:
+            conn.execute("INSERT INTO orders (client, items) VALUES (?, ?)", ("Ганна", "Кава (40.0 грн), щось"))
+        store = OrderStore(self.path)
+        self.addCleanup(store.close)
+        with self.assertRaisesRegex(RuntimeError, r"1 старих замовлень \(id: 4\)"):
+            store.last_order_id()
+        self.assertEqual([row[1] for row in conn.execute("PRAGMA table_info(orders)")], ["id", "client", "items"])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0], 4)
+
+
+class DatabaseConfigurationTests(unittest.TestCase):
+
+    def setUp(self):
+        RefactoredDatabase.reset()
+
+    def tearDown(self):
+        RefactoredDatabase.reset()
+
+    def test_memory_database_is_shared_between_connections(self):
+        RefactoredDatabase.configure(path=":memory:", pool_size=2)
+        db = RefactoredDatabase()
+        client = RefactoredClient("Ольга")
+        db.save_orders(RefactoredOrderFactory.create_order("normal", client, [RefactoredStrava("Борщ", 55)])
+                       for _ in range(3))
+        first = db.iter_orders(chunk_size=1)
+        next(first)
+        # Поки перше з'єднання зайняте ітератором, друге бачить ту саму базу.
+        self.assertEqual(db.get_all_orders(), [("Ольга", "Борщ (55 грн)")] * 3)
+        # Запис не чекає, доки ітератор дочитає: база в режимі WAL, як і файлова.
+        started = time.perf_counter()
+        db.save_order(RefactoredOrderFactory.create_order("normal", client, [RefactoredStrava("Суп", 50)]))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(len(list(first)), 2)
+        self.assertEqual(db.get_top_clients(), [("Ольга", 4, 215.0)])
+        with db._connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            path = conn.execute("PRAGMA database_list").fetchone()[2]
+        RefactoredDatabase.reset()
+        self.assertFalse(os.path.exists(path))
+
+    def test_reset_gives_fresh_instance_and_configure_is_locked(self):
+        RefactoredDatabase.configure(path=":memory:")
+        db = RefactoredDatabase()
+        db.save_order(RefactoredOrderFactory.create_order("normal", RefactoredClient("Ольга"), [RefactoredStrava("Суп", 50)]))
+        with self.assertRaises(RuntimeError):
+            RefactoredDatabase.configure(path=":memory:")
+        RefactoredDatabase.reset()
+        RefactoredDatabase.configure(path=":memory:")
+        self.assertIsNot(RefactoredDatabase(), db)
+        self.assertEqual(RefactoredDatabase().get_all_orders(), [])
+
+    def test_thread_mode_closes_connections_of_finished_threads(self):
+        RefactoredDatabase.configure(path=":memory:", pool_mode="thread")
+        db = RefactoredDatabase()
+        db.save_order(RefactoredOrderFactory.create_order("normal", RefactoredClient("Ольга"), [RefactoredStrava("Суп", 50)]))
+        for _ in range(20):
+            thread = threading.Thread(target=db.get_all_orders)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(db._pool._all), 1)
+        self.assertEqual(db.get_all_orders(), [("Ольга", "Суп (50 грн)")])
+
+    def test_connection_opens_lazily(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "orders.db")
+            RefactoredDatabase.configure(path=path, cached_statements=64)
+            db = RefactoredDatabase()
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(db.last_order_id(), 0)
+            self.assertTrue(os.path.exists(path))
+            RefactoredDatabase.reset()
+
+
+class OrderStatusTests(unittest.TestCase):
+
+    def setUp(self):
+        self.store = OrderStore(":memory:")
+        self.client = RefactoredClient("Марко")
+        self.orders = [RefactoredOrderFactory.create_order("normal", self.client, [RefactoredStrava("Суп", 50)])
+                       for _ in range(5)]
+        self.store.save_orders(self.orders)
+
+    def tearDown(self):
+        self.store.close()
+
+    def statuses(self):
+        return [record.status for record in self.store.iter_orders()]
+
+    def test_bulk_status_is_persisted_and_indexed(self):
+        self.assertEqual(self.store.set_status(self.orders[:3], STATUS_READY), 3)
+        self.assertEqual(self.statuses(), [STATUS_READY] * 3 + [STATUS_PENDING] * 2)
+        self.assertEqual(self.store.status_index.orders(),
+                         [OpenOrder(order.id, "Марко", STATUS_PENDING) for order in self.orders[3:]])
+        open_ids = [record.id for record in self.store.iter_orders(statuses=[STATUS_PENDING, STATUS_COOKING])]
+        self.assertEqual(open_ids, [order.id for order in self.orders[3:]])
+        restored = list(self.store.iter_client_orders(self.client))
+        self.assertEqual([order.get_status() for order in restored], [STATUS_PENDING] * 2 + [STATUS_READY] * 3)
+        with self.assertRaises(ValueError):
+            self.store.set_status(self.orders, "Загублено")
+
+    def test_transition_updates_database_and_memory(self):
+        self.assertEqual(self.store.transition_status(STATUS_PENDING, STATUS_COOKING), 5)
+        self.assertEqual(self.statuses(), [STATUS_COOKING] * 5)
+        self.assertEqual(self.store.status_index.counts()[STATUS_COOKING], 5)
+        self.assertTrue(all(order.get_status() == STATUS_COOKING for order in self.orders))
+
+    def test_index_follows_kitchen_transitions(self):
+        scheduler = KitchenScheduler(stations=2)
+        for order in self.orders:
+            scheduler.update(order)
+        scheduler.close()
+        self.assertEqual(len(self.store.status_index), 0)
+        self.store.flush_status()
+        self.assertEqual(self.statuses(), [STATUS_READY] * 5)
+        restored = list(self.store.iter_client_orders(self.client))
+        self.assertEqual([order.get_status() for order in restored], [STATUS_READY] * 5)
+
+    def test_kitchen_transitions_are_written_in_batches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "orders.db")
+            store = OrderStore(path, status_flush_delay=None)
+            orders = [RefactoredOrderFactory.create_order("normal", self.client, [RefactoredStrava("Суп", 50)])
+                      for _ in range(3)]
+            store.save_orders(orders)
+            reader = sqlite3.connect(path)
+            self.addCleanup(reader.close)
+
+            def stored():
+                return [row[0] for row in reader.execute("SELECT status FROM orders ORDER BY id")]
+
+            orders[0].set_status(STATUS_COOKING)
+            self.assertEqual(stored(), [STATUS_PENDING] * 3)
+            store.save_order(RefactoredOrderFactory.create_order("normal", self.client, [RefactoredStrava("Чай", 15)]))
+            self.assertEqual(stored(), [STATUS_COOKING] + [STATUS_PENDING] * 3)
+            orders[1].set_status(STATUS_COOKING)
+            orders[1].set_status(STATUS_READY)
+            self.assertEqual(store.flush_status(), 1)
+            self.assertEqual(store.flush_status(), 0)
+            self.assertEqual(stored(), [STATUS_COOKING, STATUS_READY] + [STATUS_PENDING] * 2)
+            orders[2].set_status(STATUS_COOKING)
+            store.close()
+            self.assertEqual(stored(), [STATUS_COOKING, STATUS_READY, STATUS_COOKING, STATUS_PENDING])
+
+    def test_reads_do_not_write_pending_transitions(self):
+        store = OrderStore(":memory:", status_flush_delay=None)
+        self.addCleanup(store.close)
+        orders = [RefactoredOrderFactory.create_order("normal", self.client, [RefactoredStrava("Суп", 50)])
+                  for _ in range(2)]
+        store.save_orders(orders)
+        orders[0].set_status(STATUS_COOKING)
+        self.assertEqual([record.status for record in store.iter_orders()], [STATUS_PENDING] * 2)
+        self.assertEqual(len(list(store.iter_client_orders(self.client))), 2)
+        self.assertEqual(store.status_index.pending_status(), {orders[0].id: ("Марко", STATUS_COOKING)})
+
+    def test_background_flush_writes_kitchen_transitions(self):
+        store = OrderStore(":memory:", status_flush_delay=0)
+        self.addCleanup(store.close)
+        order = RefactoredOrderFactory.create_order("normal", self.client, [RefactoredStrava("Суп", 50)])
+        store.save_order(order)
+        order.set_status(STATUS_COOKING)
+        deadline = time.monotonic() + 10
+        while store.status_index.pending_status() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([record.status for record in store.iter_orders()], [STATUS_COOKING])
+
+    def test_open_orders_of_several_statuses_come_in_id_order(self):
+        for order, status in zip(self.orders, [STATUS_COOKING, STATUS_PENDING, STATUS_READY, STATUS_COOKING]):
+            order.set_status(status)
+        self.store.flush_status()
+        records = list(self.store.iter_orders(statuses=OPEN_STATUSES))
+        self.assertEqual([record.id for record in records], [self.orders[i].id for i in (0, 1, 3, 4)])
+        self.assertEqual([record.status for record in records],
+                         [STATUS_COOKING, STATUS_PENDING, STATUS_COOKING, STATUS_PENDING])
+        page = self.store.iter_orders(statuses=OPEN_STATUSES, after_id=self.orders[0].id, limit=2)
+        self.assertEqual([record.id for record in page], [self.orders[1].id, self.orders[3].id])
+
+    def test_schema_upgrade_adds_status_column(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "orders.db")
+            store = OrderStore(path)
+            store.save_order(RefactoredOrderFactory.create_order("normal", self.client, [RefactoredStrava("Суп", 50)]))
+            store.close()
+            with sqlite3.connect(path) as conn:
+                conn.execute("DROP INDEX idx_orders_status")
+                conn.execute("ALTER TABLE orders DROP COLUMN status")
+                conn.execute("PRAGMA user_version = 3")
+            conn.close()
+            store = OrderStore(path)
+            self.assertEqual([record.status for record in store.iter_orders()], [STATUS_PENDING])
+            store.close()
+
+
+@unittest.skipIf(analytics is None, "потрібен NumPy")
+class ColumnarAnalyticsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = OrderStore(":memory:")
+        self.cache = os.path.join(self.directory.name, "cache")
+        self.clients = [RefactoredClient(f"Клієнт {i}") for i in range(4)]
+        self.dishes = [RefactoredStrava("Суп", 50, category="Перші страви"), RefactoredStrava("Каша", 30.5),
+                       RefactoredStrava("Чай", 10, category="Напої")]
+        self.save(40)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def save(self, count):
+        self.store.save_orders(
+            RefactoredOrderFactory.create_order("special" if i % 3 == 0 else "normal", self.clients[i % 4],
+                                                self.dishes[i % 3:]) for i in range(count))
+
+    def test_group_by_matches_database_aggregates(self):
+        columns = analytics.OrderColumns.from_store(self.store, chunk_size=7)
+        self.assertEqual(columns.revenue_by_dish(), self.store.get_revenue_by_dish())
+        self.assertEqual(columns.revenue_by_category(), self.store.get_revenue_by_category())
+        self.assertEqual(columns.top_clients(limit=2), self.store.get_top_clients(limit=2))
+        self.assertEqual(columns.order_total_percentiles([0, 100]), {0: 10.0, 100: 90.5})
+        self.assertEqual(sum(orders for _, orders, _ in columns.histogram()), 40)
+
+    def test_cache_is_memory_mapped_and_refreshed_incrementally(self):
+        first = analytics.load_or_refresh(self.store, self.cache)
+        self.assertEqual(first.last_order_id, 40)
+        self.save(5)
+        refreshed = analytics.load_or_refresh(self.store, self.cache)
+        self.assertEqual(refreshed.last_order_id, 45)
+        self.assertIsInstance(refreshed.column("price"), analytics.np.memmap)
+        self.assertEqual(refreshed.top_clients(), self.store.get_top_clients())
+        self.assertEqual(len(analytics.OrderColumns.load(self.cache)), len(refreshed))
+
+    def test_refresh_appends_to_column_files(self):
+        rows = len(analytics.load_or_refresh(self.store, self.cache))
+        path = os.path.join(self.cache, "price.npy")
+        inode, size = os.stat(path).st_ino, os.path.getsize(path)
+        with open(path, "ab") as file:
+            file.write(b"\0" * 24)
+        self.assertEqual(len(analytics.OrderColumns.load(self.cache)), rows)
+        self.save(5)
+        columns = analytics.load_or_refresh(self.store, self.cache)
+        self.assertEqual(os.stat(path).st_ino, inode)
+        self.assertEqual(os.path.getsize(path), size + (len(columns) - rows) * 8)
+        self.assertEqual(columns.top_clients(), self.store.get_top_clients())
+        columns.save(self.cache)
+        self.assertEqual(len(analytics.OrderColumns.load(self.cache)), len(columns))
+
+    def test_refresh_picks_up_orders_committed_out_of_id_order(self):
+        late, early = ([RefactoredOrderFactory.create_order("normal", self.clients[0], self.dishes[:1])
+                        for _ in range(2)] for _ in range(2))
+        for order_id, order in enumerate(late + early, start=41):
+            order._id = order_id
+        self.store.save_orders(early, keep_ids=True)
+        self.assertEqual(analytics.load_or_refresh(self.store, self.cache).last_order_id, 44)
+        self.store.save_orders(late, keep_ids=True)
+        columns = analytics.load_or_refresh(self.store, self.cache)
+        self.assertEqual(sorted(set(columns.column("order_id").tolist())), list(range(1, 45)))
+        self.assertEqual(columns.top_clients(), self.store.get_top_clients())
+        self.assertEqual(columns.refresh(self.store), 0)
+
+
+class LoadGeneratorTests(unittest.TestCase):
+
+    def test_schedule_follows_rush_hour_curve(self):
+        schedule = loadgen.build_schedule(loadgen.random.Random(3), duration=100, base_rate=2, peak_rate=20,
+                                          clients=50, dishes=10, special_ratio=0.25, max_items=3)
+        edges = sum(1 for arrival in schedule if arrival.at < 20 or arrival.at >= 80)
+        peak = sum(1 for arrival in schedule if 40 <= arrival.at < 60)
+        self.assertGreater(peak, 2 * edges)
+        self.assertEqual([arrival.at for arrival in schedule], sorted(arrival.at for arrival in schedule))
+        self.assertTrue(all(1 <= len(arrival.dishes) <= 3 for arrival in schedule))
+        self.assertTrue(any(arrival.order_type == "special" for arrival in schedule))
+
+    def test_run_reports_throughput_and_growth(self):
+        report = loadgen.run_load(":memory:", duration=1, peak_rate=400, clients=50, dishes=12, concurrency=4)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(report["completed"], report["offered"])
+        self.assertEqual(report["db_orders_added"], report["completed"])
+        self.assertGreater(report["db_growth_bytes"], 0)
+        self.assertLessEqual(report["latency"]["p50_ms"], report["latency"]["max_ms"])
+
+
+class ShardedOrderStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.single = OrderStore(os.path.join(self.directory.name, "single.db"))
+        self.sharded = ShardedOrderStore(os.path.join(self.directory.name, "shards"), shards=3)
+
+    def tearDown(self):
+        self.sharded.close()
+        self.single.close()
+        self.directory.cleanup()
+
+    def make_orders(self):
+        dishes = [RefactoredStrava("Суп", 50, category="Перші страви"), RefactoredStrava("Вареники", 60.5),
+                  RefactoredStrava("Узвар", 20, category="Напої")]
+        clients = [RefactoredClient(f"Клієнт {i}") for i in range(7)]
+        return [RefactoredOrderFactory.create_order("special" if i % 4 == 0 else "normal", clients[i % 7],
+                                                    dishes[i % 3:] + dishes[:1])
+                for i in range(40)]
+
+    def test_matches_single_file(self):
+        for batch in (self.make_orders()[:25], self.make_orders()[25:]):
+            self.single.save_orders(batch)
+            self.assertEqual(self.sharded.ingest(batch), len(batch))
+        self.assertEqual(self.sharded.get_all_orders(), self.single.get_all_orders())
+        page = [record[:3] for record in self.sharded.iter_orders(after_id=10, limit=7)]
+        self.assertEqual(page, [record[:3] for record in self.single.iter_orders(after_id=10, limit=7)])
+        self.assertEqual([order_id for order_id, *_ in page], list(range(11, 18)))
+        self.assertEqual(self.sharded.get_orders_with_dish("Узвар"), self.single.get_orders_with_dish("Узвар"))
+        self.assertEqual(self.sharded.get_revenue_by_dish(), self.single.get_revenue_by_dish())
+        self.assertEqual(self.sharded.get_revenue_by_category(), self.single.get_revenue_by_category())
+        self.assertEqual(self.sharded.get_top_clients(limit=3), self.single.get_top_clients(limit=3))
+
+    def test_stores_on_one_directory_do_not_reuse_ids(self):
+        other = ShardedOrderStore(os.path.join(self.directory.name, "shards"), shards=3)
+        self.addCleanup(other.close)
+        orders = self.make_orders()
+        self.sharded.ingest(orders[:10])
+        other.ingest(orders[10:30])
+        self.sharded.ingest(orders[30:])
+        self.assertEqual(sorted(order.id for order in orders), list(range(1, 41)))
+        self.assertEqual([record.id for record in other.iter_orders()], list(range(1, 41)))
+        self.assertEqual(len(self.sharded._executors), 3)
+
+    def test_client_history_is_routed_to_one_shard(self):
+        self.sharded.ingest(self.make_orders())
+        client = RefactoredClient("Клієнт 3")
+        history = list(self.sharded.iter_client_orders(client))
+        self.assertEqual(len(history), 6)
+        self.assertEqual([order.id for order in history], sorted((order.id for order in history), reverse=True))
+
+
+class IndexedMenuTests(unittest.TestCase):
+
+    def setUp(self):
+        self.menu = RefactoredMenu()
+        self.soup = RefactoredStrava("Суп", 50, category="Перші страви")
+        self.borscht = RefactoredStrava("Борщ", 55, category="Перші страви")
+        self.salad = RefactoredStrava("Олів'є", 45, category="Салати")
+        for item in (self.soup, self.borscht, self.salad):
+            self.menu.add_item(item)
+
+    def test_lookup_by_name_and_category(self):
+        self.assertIs(self.menu.get("Борщ"), self.borscht)
+        self.assertIsNone(self.menu.get("Піца"))
+        self.assertEqual(self.menu.by_category("Перші страви"), [self.soup, self.borscht])
+        self.assertEqual(self.menu.by_category("Десерти"), [])
+
+    def test_rejects_duplicate_names(self):
+        with self.assertRaises(ValueError):
+            self.menu.add_item(RefactoredStrava("Суп", 70))
+
+    def test_remove_and_recategorize_keep_indexes(self):
+        self.menu.remove_item(self.soup)
+        self.menu.set_item_category(self.salad, "Перші страви")
+        self.assertEqual(self.menu.by_category("Перші страви"), [self.borscht, self.salad])
+        self.assertEqual(self.menu.by_category("Салати"), [])
+        self.assertEqual(self.menu.get_menu_items(), (self.borscht, self.salad))
+
+    def test_snapshots_are_versioned_and_immutable(self):
+        snapshot = self.menu.snapshot()
+        self.assertIs(self.menu.snapshot(), snapshot)
+        self.assertFalse(self.menu.changed_since(snapshot.version))
+        self.menu.remove_item(self.soup)
+        self.menu.add_item(RefactoredStrava("Узвар", 20, category="Напої"))
+        self.assertTrue(self.menu.changed_since(snapshot.version))
+        self.assertEqual(snapshot.items, (self.soup, self.borscht, self.salad))
+        self.assertIs(snapshot.get("Суп"), self.soup)
+        fresh = self.menu.snapshot()
+        self.assertEqual(fresh.version, snapshot.version + 2)
+        self.assertNotIn("Суп", fresh)
+        self.assertEqual([item.name for item in fresh.by_category("Напої")], ["Узвар"])
+        with self.assertRaises(TypeError):
+            fresh._by_name["Суп"] = self.soup
+
+    def test_batch_publishes_one_snapshot(self):
+        before = self.menu.snapshot()
+        with self.menu.batch():
+            self.menu.add_item(RefactoredStrava("Узвар", 20, category="Напої"))
+            self.menu.remove_item(self.soup)
+            self.assertIs(self.menu.snapshot(), before)
+            self.assertFalse(self.menu.changed_since(before.version))
+        after = self.menu.snapshot()
+        self.assertEqual(after.version, before.version + 2)
+        self.assertEqual([item.name for item in after], ["Борщ", "Олів'є", "Узвар"])
+        self.assertIs(self.menu.snapshot(), after)
+
+    def test_concurrent_readers_see_consistent_snapshots(self):
+        errors = []
+
+        def write():
+            for i in range(300):
+                dish = RefactoredStrava(f"Страва {i}", 10, category="Гарячі")
+                self.menu.add_item(dish)
+                self.menu.remove_item(dish)
+
+        def read():
+            try:
+                for _ in range(300):
+                    snapshot = self.menu.snapshot()
+                    self.assertEqual(len(snapshot.items), len(list(snapshot)))
+                    self.assertEqual(len(snapshot.by_category("Гарячі")), len(snapshot) - 3)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=target) for target in (write, read, read)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.menu), 3)
+
+
+class MenuSearchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.menu = RefactoredMenu()
+        self.dishes = [
+            RefactoredStrava("Борщ український", 55, description="Буряк, капуста, сметана"),
+            RefactoredStrava("Вареники з вишнею", 60, description="Тісто та вишня"),
+            RefactoredStrava("Салат Олів'є", 45, description="Картопля, ковбаса, горошок"),
+            RefactoredStrava("Пампушки", 20, description="До борщу, з часником"),
+            RefactoredStrava("Борщ зелений", 50, description="Щавель, яйце"),
+        ]
+        for dish in self.dishes:
+            self.menu.add_item(dish)
+
+    def names(self, query, limit=10):
+        return [dish.name for dish in self.menu.search(query, limit)]
+
+    def test_prefix_search_is_case_insensitive_and_ranked(self):
+        self.assertEqual(self.names("БОР"), ["Борщ зелений", "Борщ український", "Пампушки"])
+        self.assertEqual(self.names("бор", limit=1), ["Борщ зелений"])
+        self.assertEqual(self.names("вишн"), ["Вареники з вишнею"])
+        self.assertEqual(self.names("олів’є"), ["Салат Олів'є"])
+        self.assertEqual(self.names(""), [])
+
+    def test_all_query_words_must_match(self):
+        self.assertEqual(self.names("борщ укр"), ["Борщ український"])
+        self.assertEqual(self.names("капуста смет"), ["Борщ український"])
+        self.assertEqual(self.names("піца"), [])
+
+    def test_index_follows_menu_changes(self):
+        self.menu.remove_item(self.dishes[0])
+        self.assertEqual(self.names("укр"), [])
+        self.menu.replace_item(RefactoredStrava("Пампушки", 25, description="З маком"))
+        self.assertEqual(self.names("часник"), [])
+        self.assertEqual(self.names("мак"), ["Пампушки"])
+        self.menu.set_item_description(self.dishes[1], "Тісто та картопля")
+        self.assertEqual(self.names("картоп"), ["Салат Олів'є", "Вареники з вишнею"])
+
+    def test_top_results_match_full_ranking_for_common_words(self):
+        menu = RefactoredMenu()
+        with menu.batch():
+            for i in range(300):
+                words = [("Домашній", "Зелений", "Борщ")[i % 3], ("борщ", "суп", "домашній", "бульйон")[i % 4]]
+                menu.add_item(RefactoredStrava(f"{' '.join(words)} {i}", 50,
+                                               description=("з капустою", "домашній з буряком", "")[i % 3]))
+        for query in ("б", "бор", "домашній б", "з к", "суп дом"):
+            full = [dish.name for dish in menu.search(query, limit=300)]
+            self.assertTrue(full)
+            for limit in (1, 5, 20):
+                self.assertEqual([dish.name for dish in menu.search(query, limit)], full[:limit])
+
+
+class CompactModelTests(unittest.TestCase):
+
+    def test_prices_are_stored_in_kopecks(self):
+        dish = RefactoredStrava("Узвар", 0.1)
+        self.assertEqual(dish.price_kop, 10)
+        self.assertEqual(sum(RefactoredStrava("Узвар", 0.1).price_kop for _ in range(3)), 30)
+        self.assertEqual(str(RefactoredStrava("Пляцок", 45.5)), "Пляцок - 45.5 грн")
+
+    def test_prices_render_like_original(self):
+        use_memory_database(self)
+        db = RefactoredDatabase()
+        prices = [55, 45.5, 40.0, 0.1, 120.25]
+        client, original_client = RefactoredClient("Іра"), OriginalClient("Іра")
+        for price in prices:
+            self.assertEqual(str(RefactoredStrava("Пляцок", price)), str(OriginalStrava("Пляцок", price)))
+        order = RefactoredOrderFactory.create_order("normal", client, [RefactoredStrava("Пляцок", p) for p in prices])
+        original = OriginalOrderFactory.f("normal", original_client, [OriginalStrava("Пляцок", p) for p in prices])
+        self.assertEqual(str(order), str(original))
+        db.save_order(order)
+        self.assertEqual(db.get_all_orders(), [("Іра", str(original).split(": ", 1)[1])])
+        self.assertEqual(str(next(db.iter_client_orders(client))), str(original))
+
+    def test_objects_have_no_instance_dict(self):
+        order = RefactoredOrderFactory.create_order("special", RefactoredClient("Іра"), [RefactoredStrava("Суп", 50)])
+        self.assertFalse(hasattr(order, "__dict__"))
+        self.assertFalse(hasattr(order.items[0], "__dict__"))
+        self.assertTrue(order.special)
+        with self.assertRaises(ValueError):
+            order.add_option("unknown")
+
+
+class OrderTotalsTests(unittest.TestCase):
+
+    def setUp(self):
+        use_memory_database(self)
+
+    def test_total_and_rendering_follow_items_until_placed(self):
+        client = RefactoredClient("Марко")
+        order = RefactoredOrderFactory.create_order("normal", client, [RefactoredStrava("Суп", 50.25)])
+        self.assertEqual(order.total_kop, 5025)
+        order.add_item(RefactoredStrava("Компот", 20))
+        self.assertEqual(order.total, 70.25)
+        self.assertEqual(str(order), "Замовлення для Марко: Суп (50.25 грн), Компот (20 грн)")
+        client.place_order(order, RefactoredDatabase(), RefactoredNotifier())
+        with self.assertRaises(RuntimeError):
+            order.add_item(RefactoredStrava("Чай", 15))
+        self.assertIs(str(order), str(order))
+
+
+class KitchenSchedulerTests(unittest.TestCase):
+
+    def test_special_orders_jump_the_queue(self):
+        release = threading.Event()
+        cooked = []
+
+        def cook(order):
+            release.wait()
+            cooked.append(order)
+
+        scheduler = KitchenScheduler(stations=1, cook=cook)
+        client = RefactoredClient("Тарас")
+        items = [RefactoredStrava("Суп", 50)]
+        blocker = RefactoredOrderFactory.create_order("normal", client, items)
+        scheduler.update(blocker)
+        while scheduler.queue_depth():
+            time.sleep(0.001)
+        normal = RefactoredOrderFactory.create_order("normal", client, items)
+        special = RefactoredOrderFactory.create_order("special", client, items)
+        scheduler.update(normal)
+        scheduler.update(special)
+        self.assertEqual(scheduler.queue_depth(), 2)
+        self.assertEqual(normal.get_status(), "У черзі")
+        release.set()
+        scheduler.close()
+        self.assertEqual(cooked, [blocker, special, normal])
+        self.assertEqual(normal.get_status(), "Готово")
+        stats = scheduler.stats()
+        self.assertEqual((stats.completed, stats.queue_depth, stats.busy_stations), (3, 0, 0))
+        self.assertGreater(stats.max_wait, 0)
+
+    def test_failed_cook_marks_order_failed(self):
+        store = OrderStore(":memory:")
+        self.addCleanup(store.close)
+        client = RefactoredClient("Тарас")
+        burnt, fine = (RefactoredOrderFactory.create_order("normal", client, [RefactoredStrava(name, 50)])
+                       for name in ("Пиріг", "Суп"))
+        store.save_orders([burnt, fine])
+
+        def cook(order):
+            if order is burnt:
+                raise RuntimeError("піч зламалася")
+
+        scheduler = KitchenScheduler(stations=1, cook=cook)
+        scheduler.update(burnt)
+        scheduler.update(fine)
+        scheduler.close()
+        self.assertEqual((burnt.get_status(), fine.get_status()), (STATUS_FAILED, STATUS_READY))
+        self.assertEqual((scheduler.stats().completed, scheduler.stats().failed), (1, 1))
+        [failure] = scheduler.failures()
+        self.assertEqual((failure.order_id, failure.error), (burnt.id, "RuntimeError('піч зламалася')"))
+        self.assertIn("піч зламалася", failure.traceback)
+        self.assertEqual(store.status_index.orders(), [])
+        store.flush_status()
+        self.assertEqual([record.status for record in store.iter_orders()], [STATUS_FAILED, STATUS_READY])
+
+    def test_unclosed_scheduler_does_not_block_exit(self):
+        script = "from refactored_code import KitchenScheduler; KitchenScheduler(stations=2)"
+        result = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                timeout=10)
+        self.assertEqual(result.returncode, 0)
+
+
+class ClientHistoryTests(unittest.TestCase):
+
+    def setUp(self):
+        use_memory_database(self)
+
+    def test_history_is_cached_then_loaded_from_database(self):
+        db = RefactoredDatabase()
+        client = RefactoredClient("Степан", history_cache_size=2)
+        orders = [RefactoredOrderFactory.create_order("special" if i == 0 else "normal", client,
+                                                      [RefactoredStrava("Суп", 50 + i)])
+                  for i in range(5)]
+        for order in orders:
+            client.place_order(order, db, RefactoredNotifier())
+        self.assertEqual(client.get_orders(), orders[-2:])
+        history = list(client.iter_history(page_size=2))
+        self.assertEqual([order.id for order in history], [order.id for order in reversed(orders)])
+        self.assertEqual(str(history[-1]), str(orders[0]))
+        self.assertTrue(history[-1].special)
+        self.assertEqual(len(client.get_orders()), 2)
+
+    def test_get_order_loads_into_lru_cache(self):
+        db = RefactoredDatabase()
+        client = RefactoredClient("Віра", history_cache_size=1)
+        first, second = (RefactoredOrderFactory.create_order("normal", client, [RefactoredStrava("Чай", 15)])
+                         for _ in range(2))
+        client.place_order(first, db, RefactoredNotifier())
+        client.place_order(second, db, RefactoredNotifier())
+        restored = client.get_order(first.id)
+        self.assertEqual(restored.id, first.id)
+        self.assertEqual(client.get_orders(), [restored])
+
+    def test_history_is_complete_after_old_order_is_cached(self):
+        db = RefactoredDatabase()
+        client = RefactoredClient("Лариса", history_cache_size=5)
+        orders = [RefactoredOrderFactory.create_order("normal", client, [RefactoredStrava("Чай", 15)])
+                  for _ in range(10)]
+        for order in orders:
+            client.place_order(order, db, RefactoredNotifier())
+        self.assertEqual(client.get_order(orders[0].id).id, orders[0].id)
+        history = list(client.iter_history(page_size=3))
+        self.assertEqual([order.id for order in history], [order.id for order in reversed(orders)])
+        self.assertIs(history[0], orders[-1])
+
+    def test_status_index_keeps_open_orders_nobody_holds(self):
+        db = RefactoredDatabase()
+        client = RefactoredClient("Назар", history_cache_size=5)
+        for _ in range(200):
+            order = RefactoredOrderFactory.create_order("normal", client, [RefactoredStrava("Чай", 15)])
+            client.place_order(order, db, RefactoredNotifier())
+            order.set_status(STATUS_COOKING)
+        del order
+        self.assertEqual(db.status_index.counts()[STATUS_COOKING], 200)
+        self.assertEqual(db.transition_status(STATUS_COOKING, STATUS_READY), 200)
+        self.assertEqual(len(db.status_index), 0)
+        self.assertEqual({order.get_status() for order in client.get_orders()}, {STATUS_READY})
+        self.assertEqual({record.status for record in db.iter_orders()}, {STATUS_READY})
+
+
+class MenuImportExportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+        return path
+
+    def test_csv_import_applies_diff_and_reports_bad_rows(self):
+        menu = RefactoredMenu()
+        menu.add_item(RefactoredStrava("Суп", 50, category="Перші страви"))
+        menu.add_item(RefactoredStrava("Чай", 15))
+        path = self.write("menu.csv", "name,price,description,category\n"
+                                      "Суп,55,,Перші страви\n"
+                                      "Чай,15,,\n"
+                                      ",10,,\n"
+                                      "Вареники,60,З картоплею,Основні\n"
+                                      "Компот,-1,,\n")
+        report = menu_io.import_menu(menu, path, batch_size=2)
+        self.assertEqual((report.added, report.updated, report.unchanged, report.error_count), (1, 1, 1, 2))
+        self.assertEqual([error.line for error in report.errors], [4, 6])
+        self.assertEqual(menu.get("Суп").price_kop, 5500)
+        self.assertEqual([item.name for item in menu.get_menu_items()], ["Суп", "Чай", "Вареники"])
+
+    def test_jsonl_reports_non_finite_prices_and_wrong_types(self):
+        menu = RefactoredMenu()
+        path = self.write("menu.jsonl", '{"name": "Суп", "price": "inf"}\n'
+                                        '{"name": "Каша", "price": "nan"}\n'
+                                        '{"name": 123, "price": 10}\n'
+                                        '{"name": "Чай", "price": 10, "description": 7}\n'
+                                        '{"name": "Узвар", "price": 20, "category": ["Напої"]}\n'
+                                        '{"name": "Компот", "price": 25}\n')
+        report = menu_io.import_menu(menu, path)
+        self.assertEqual((report.added, report.error_count), (1, 5))
+        self.assertEqual([error.line for error in report.errors], [1, 2, 3, 4, 5])
+        self.assertEqual([item.name for item in menu.get_menu_items()], ["Компот"])
+        with self.assertRaises(ValueError):
+            RefactoredStrava("Суп", float("inf"))
+        with self.assertRaises(ValueError):
+            menu.set_item_description(menu.get("Компот"), 7)
+        self.assertEqual([item.name for item in menu.search("компот")], ["Компот"])
+
+    def test_jsonl_round_trip_with_prune(self):
+        source = RefactoredMenu()
+        source.add_item(RefactoredStrava("Борщ", 55.5, "З пампушками", "Перші страви"))
+        path = os.path.join(self.directory.name, "menu.jsonl")
+        self.assertEqual(menu_io.export_menu(source, path), 1)
+        target = RefactoredMenu()
+        target.add_item(RefactoredStrava("Старе", 10))
+        report = menu_io.import_menu(target, path, prune=True)
+        self.assertEqual((report.added, report.removed), (1, 1))
+        dish = target.get("Борщ")
+        self.assertEqual((dish.price_kop, dish.description, dish.category), (5550, "З пампушками", "Перші страви"))
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        use_memory_database(self)
+
+    def tearDown(self):
+        METRICS.disable()
+        METRICS.reset()
+
+    def test_disabled_registry_records_nothing(self):
+        registry = MetricsRegistry()
+        with registry.timer("stage"):
+            registry.increment("calls")
+        self.assertEqual(registry.snapshot(), "")
+
+    def test_place_order_records_each_stage(self):
+        # Схема створюється окремим комітом, тож готуємо її до ввімкнення метрик.
+        RefactoredDatabase().last_order_id()
+        METRICS.enable()
+        client, *_ = prepare_order_system(RefactoredClient, RefactoredStrava, RefactoredOrderFactory, RefactoredMenu,
+                                          RefactoredNotifier, RefactoredKitchen, RefactoredDatabase)
+        for stage in ("order.create", "order.place", "order.persist", "db.commit", "order.notify",
+                      "notify.subscriber.Kitchen.0"):
+            self.assertEqual(METRICS.histogram(stage).count, 1, stage)
+        self.assertEqual(METRICS.counter("orders.placed"), 1)
+        self.assertIn("timer db.commit count=1", METRICS.snapshot())
+
+    def test_each_subscriber_is_timed_separately(self):
+        notifier = RefactoredNotifier()
+        grill = SlowKitchen(0)
+        grill.name = "гриль"
+        first, second = SlowKitchen(0), SlowKitchen(0)
+        for kitchen in (first, second, grill):
+            notifier.subscribe(kitchen)
+        notifier.subscribe(first, categories=["Супи"])
+        METRICS.enable()
+        order = RefactoredOrderFactory.create_order("normal", RefactoredClient("Ліна"), [RefactoredStrava("Суп", 50, category="Супи")])
+        notifier.notify(order)
+        async_notifier = AsyncKitchenNotifier()
+        pass_window = SlowKitchen(0)
+        pass_window.name = "роздача"
+        async_notifier.subscribe(pass_window)
+        async_notifier.notify(order)
+        async_notifier.close()
+        for name in ("SlowKitchen.0", "SlowKitchen.1", "гриль", "роздача"):
+            self.assertEqual(METRICS.histogram(f"notify.subscriber.{name}").count, 1, name)
+        self.assertIsNone(METRICS.histogram("notify.subscriber.SlowKitchen"))
+
+
+class SlowKitchen:
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.orders = []
+
+    def update(self, order):
+        time.sleep(self.delay)
+        self.orders.append(order)
+
+
+class RoutedNotifierTests(unittest.TestCase):
+
+    def setUp(self):
+        self.notifier = RefactoredNotifier()
+        self.grill = SlowKitchen(0)
+        self.salads = SlowKitchen(0)
+        self.special_desk = SlowKitchen(0)
+        self.everything = SlowKitchen(0)
+        self.notifier.subscribe(self.grill, categories=["Гриль"])
+        self.notifier.subscribe(self.salads, categories=["Салати"], order_types=["normal"])
+        self.notifier.subscribe(self.special_desk, order_types=["special"])
+        self.notifier.subscribe(self.everything)
+        self.steak = RefactoredStrava("Стейк", 300, category="Гриль")
+        self.salad = RefactoredStrava("Цезар", 150, category="Салати")
+        self.client = RefactoredClient("Тарас")
+
+    def test_stations_receive_only_their_slice(self):
+        order = RefactoredOrderFactory.create_order("normal", self.client, [self.salad, self.steak, self.salad])
+        self.notifier.notify(order)
+        self.assertEqual([ticket.items for ticket in self.grill.orders], [(self.steak,)])
+        self.assertEqual([ticket.items for ticket in self.salads.orders], [(self.salad, self.salad)])
+        self.assertIs(self.grill.orders[0].order, order)
+        self.assertEqual(self.special_desk.orders, [])
+        self.assertEqual(self.everything.orders, [order])
+        self.assertEqual(str(self.grill.orders[0]), "Замовлення для Тарас: Стейк (300 грн)")
+
+    def test_order_type_filter_and_unrelated_orders(self):
+        special = RefactoredOrderFactory.create_order("special", self.client, [self.salad])
+        self.notifier.notify(special)
+        self.assertEqual(self.grill.orders, [])
+        self.assertEqual(self.salads.orders, [])
+        self.assertEqual(self.special_desk.orders, [special])
+
+    def test_unsubscribe_and_resubscribe(self):
+        self.notifier.unsubscribe(self.grill)
+        self.notifier.subscribe(self.salads, categories=["Гриль"])
+        self.notifier.notify(RefactoredOrderFactory.create_order("normal", self.client, [self.steak, self.salad]))
+        self.assertEqual(self.grill.orders, [])
+        self.assertEqual([ticket.items for ticket in self.salads.orders], [(self.steak,)])
+        with self.assertRaises(ValueError):
+            self.notifier.unsubscribe(self.grill)
+        with self.assertRaises(ValueError):
+            self.notifier.subscribe(self.grill, order_types=["takeaway"])
+
+    def test_slice_status_updates_whole_order(self):
+        scheduler = KitchenScheduler(stations=1)
+        self.notifier.subscribe(scheduler, categories=["Гриль"])
+        order = RefactoredOrderFactory.create_order("normal", self.client, [self.steak])
+        self.notifier.notify(order)
+        scheduler.close()
+        self.assertEqual(order.get_status(), STATUS_READY)
+
+
+class AsyncNotifierTests(unittest.TestCase):
+
+    def setUp(self):
+        self.client = RefactoredClient("Олена")
+        self.items = [RefactoredStrava("Салат", 40)]
+
+    def test_notify_does_not_wait_for_subscribers(self):
+        notifier = AsyncKitchenNotifier(subscriber_timeout=1.0)
+        kitchen = SlowKitchen(0.05)
+        for _ in range(5):
+            notifier.subscribe(SlowKitchen(0.05))
+        notifier.subscribe(kitchen)
+        order = RefactoredOrderFactory.create_order("normal", self.client, self.items)
+        started = time.perf_counter()
+        notifier.notify(order)
+        self.assertLess(time.perf_counter() - started, 0.05)
+        notifier.close()
+        self.assertEqual(kitchen.orders, [order])
+
+    def test_slow_subscriber_backlog_is_bounded(self):
+        notifier = AsyncKitchenNotifier(max_queue_size=10, workers=2, subscriber_timeout=1.0)
+        kitchen = SlowKitchen(0.02)
+        notifier.subscribe(kitchen)
+        accepted, backlog = 0, []
+        with self.assertRaises(NotifierOverloadedError):
+            for _ in range(200):
+                notifier.notify(RefactoredOrderFactory.create_order("normal", self.client, self.items))
+                accepted += 1
+                backlog.append(notifier.pending())
+                time.sleep(0.002)
+        self.assertLessEqual(max(backlog), 10)
+        started = time.perf_counter()
+        self.assertTrue(notifier.close())
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(len(kitchen.orders), accepted)
+
+    def test_close_gives_up_on_stuck_subscriber(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        class StuckKitchen:
+            def update(self, order):
+                release.wait()
+
+        notifier = AsyncKitchenNotifier(subscriber_timeout=0.01)
+        notifier.subscribe(StuckKitchen())
+        for _ in range(3):
+            notifier.notify(RefactoredOrderFactory.create_order("normal", self.client, self.items))
+        started = time.perf_counter()
+        self.assertFalse(notifier.close(timeout=0.1))
+        self.assertLess(time.perf_counter() - started, 1)
+        with self.assertRaises(RuntimeError):
+            notifier.notify(RefactoredOrderFactory.create_order("normal", self.client, self.items))
+
+    def test_stuck_subscriber_does_not_starve_others(self):
+        release = threading.Event()
+
+        class StuckKitchen:
+            def update(self, order):
+                release.wait()
+
+        notifier = AsyncKitchenNotifier(workers=2, subscriber_timeout=0.05)
+        stuck, fast = StuckKitchen(), SlowKitchen(0)
+        notifier.subscribe(stuck)
+        notifier.subscribe(fast)
+        orders = [RefactoredOrderFactory.create_order("normal", self.client, self.items) for _ in range(10)]
+        try:
+            for order in orders:
+                notifier.notify(order)
+                time.sleep(0.01)
+            deadline = time.monotonic() + 2
+            while len(fast.orders) < len(orders) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(fast.orders, orders)
+        finally:
+            release.set()
+            notifier.close()
+        timeouts = [record.detail for record in notifier.log_records if record.event == "Subscriber timed out"]
+        self.assertTrue(timeouts)
+        self.assertTrue(all(detail == str(stuck) for detail in timeouts))
+
+
+class ListSink:
+
+    def __init__(self):
+        self.batches = []
+        self.threads = []
+
+    def write(self, records):
+        self.threads.append(threading.current_thread().name)
+        self.batches.append(list(records))
+
+
+class FailingSink(ListSink):
+
+    def __init__(self):
+        super().__init__()
+        self.failing = True
+
+    def write(self, records):
+        if self.failing:
+            raise OSError("диск заповнений")
+        super().write(records)
+
+
+class EventLogTests(unittest.TestCase):
+
+    def test_ring_buffer_keeps_latest_records(self):
+        log = EventLog(capacity=3)
+        for order_id in range(10):
+            log.append("Order Notified", order_id)
+        self.assertEqual([record.order_id for record in log.records()], [7, 8, 9])
+        self.assertEqual(log.records()[0].format(), "Order Notified: #7")
+
+    def test_sink_receives_batches(self):
+        sink = ListSink()
+        log = EventLog(capacity=8, sink=sink, sink_batch_size=4)
+        for order_id in range(6):
+            log.append("Order Notified", order_id)
+        deadline = time.monotonic() + 2
+        while not sink.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(log.flush())
+        self.assertEqual([record.order_id for batch in sink.batches for record in batch], list(range(6)))
+        self.assertNotIn(threading.current_thread().name, sink.threads[:1])
+
+    def test_failing_sink_keeps_records_and_counts_drops(self):
+        sink = FailingSink()
+        log = EventLog(capacity=5, sink=sink, sink_batch_size=100)
+        log.append("Order Notified", 0)
+        self.assertFalse(log.flush())
+        for order_id in range(1, 7):
+            log.append("Order Notified", order_id)
+        self.assertEqual((log.sink_errors, log.dropped), (1, 2))
+        self.assertIsInstance(log.last_sink_error, OSError)
+        sink.failing = False
+        self.assertTrue(log.flush())
+        self.assertEqual([record.order_id for batch in sink.batches for record in batch], [2, 3, 4, 5, 6])
+
+    def test_failing_sink_does_not_break_notifiers(self):
+        client = RefactoredClient("Олена")
+        kitchen = SlowKitchen(0)
+        notifier = RefactoredNotifier(log_sink=FailingSink())
+        notifier.subscribe(kitchen)
+        use_memory_database(self)
+        # 100 записів — повна пачка, яку раніше notify писав у sink сам.
+        for _ in range(100):
+            order = RefactoredOrderFactory.create_order("normal", client, [RefactoredStrava("Салат", 40)])
+            client.place_order(order, RefactoredDatabase(), notifier)
+        self.assertFalse(notifier.flush_logs())
+        async_notifier = AsyncKitchenNotifier(log_sink=FailingSink())
+        async_notifier.subscribe(kitchen)
+        for _ in range(3):
+            async_notifier.notify(order)
+        self.assertTrue(async_notifier.close(timeout=2))
+        self.assertEqual(len(kitchen.orders), 103)
+
+
 if __name__ == '__main__':
     unittest.main()